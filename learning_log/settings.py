@@ -10,12 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -50,8 +50,12 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Inactive unless SHARD_COUNT > 0
+    'learning_logs.sharding.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Inactive unless PERFORMANCE_MONITORING['ENABLED'] is True
+    'learning_logs.middleware.PerformanceMiddleware',
 ]
 
 ROOT_URLCONF = 'learning_log.urls'
@@ -77,11 +81,84 @@ WSGI_APPLICATION = 'learning_log.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Seconds a connection is kept open between requests. WSGI workers reuse their thread's
+# connection; under ASGI sync code runs in changing threads, each keeping its own, so
+# asgi.py defaults this to 0. Set DJANGO_CONN_MAX_AGE to override it per deployment.
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests, re-checking them before reuse
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN so busy_timeout applies instead of failing mid-transaction
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Same file opened read-only, for report queries (see learning_logs.db)
+    'analytics': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    },
+    # Holds the cache table (see CACHES), so cache writes don't queue behind data writes
+    'cache': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'cache.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    },
+}
+
+# Per-user sharding (see learning_logs.sharding): with SHARD_COUNT > 0, users'
+# diaries, finances, attachments and access logs are spread over shard_<n>
+# files, each with its own write lock. Run migrate_shards after changing it.
+SHARD_COUNT = 0
+for shard in range(SHARD_COUNT):
+    DATABASES[f'shard_{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_shard_{shard}.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
     }
+
+DATABASE_ROUTERS = [
+    'learning_logs.db.CacheRouter',
+    'learning_logs.sharding.ShardRouter',
+    'learning_logs.db.AnalyticsRouter',
+]
+CACHE_DATABASE = 'cache'
+ANALYTICS_DATABASE = 'analytics'
+
+# Financial summaries, calendar grids, drafts, watermarks and shard assignments are cached and
+# invalidated through the cache, so every server process must share it (checked at startup).
+# 'manage.py migrate' creates the table in the cache database; on an existing deployment run
+# 'manage.py createcachetable --database cache' once. The test suite runs in one process and
+# uses local memory (learning_log.test_settings).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_entries',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Applied to every new SQLite connection by learning_logs.db
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # ms to wait for the write lock
+    'synchronous': 'NORMAL',  # safe with WAL; fsync at checkpoints only
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # negative means KiB, i.e. ~20 MB per connection
+    'temp_store': 'MEMORY',
 }
 
 
@@ -135,3 +212,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'users:login'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_REDIRECT_URL = 'learning_logs:dashboard'
+
+# Full-text search backend for diary entries: 'auto' (FTS5 when available) or 'python'
+ENTRY_SEARCH_BACKEND = 'auto'
+
+# Audit log events are buffered in-process and written in batches when requests finish
+ACCESS_LOG_BUFFER = {
+    'ENABLED': True,
+    'MAX_EVENTS': 100,  # flush once this many events are pending
+    'MAX_AGE': 5.0,  # ...or once the oldest pending event is this many seconds old
+}
+
+# Raw AccessLog rows older than this are rolled up, archived and deleted by prune_access_logs
+ACCESS_LOG_RETENTION_DAYS = 90
+ACCESS_LOG_ARCHIVE_DIR = BASE_DIR / 'access_log_archive'
+
+# Per-request SQL/template timing, Server-Timing headers and slow request logging
+PERFORMANCE_MONITORING = {
+    'ENABLED': False,
+    'SLOW_REQUEST_MS': 500,
+    'DUPLICATE_QUERY_THRESHOLD': 3,  # same SQL this many times in one request looks like N+1
+}
+
+# Entry drafts are buffered in the cache and written to the database at most this often
+ENTRY_DRAFTS = {
+    'PERSIST_INTERVAL': 30,  # seconds
+}
+
+# Entry attachments are stored content-addressed here, outside MEDIA_ROOT, and only
+# served through the authenticated vault download view
+MEDIA_VAULT_ROOT = BASE_DIR / 'media_vault'
+MEDIA_VAULT_MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # bytes
+
+# Resized previews of image and PDF attachments, rendered in a process pool after upload
+MEDIA_DERIVATIVES = {
+    'WIDTHS': (320, 640, 1280),
+    'WORKERS': 2,
+    'ASYNC': True,  # False renders them inline, in the request
+}
+
+# Profile pictures are square-cropped, re-encoded and stored at these pixel sizes
+AVATARS = {
+    'SIZES': (32, 64, 160, 320),
+    'MAX_SIZE': 512,  # the master copy kept in Profile.image
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,  # bytes
+}
+
+# dashboard, expenses, calendar_data and export_data answer repeat requests with 304 Not Modified
+# until the user's data watermark moves (see learning_logs.watermarks)
+CONDITIONAL_RESPONSES = {
+    'ENABLED': True,
+    'VERSION': '1',  # change when a deploy alters those pages
+}
+
+# Server-Sent Events at /events/ (ASGI only): reminders and calendar changes pushed to open pages
+LIVE_EVENTS = {
+    'HEARTBEAT': 15,  # seconds between keep-alive comments on an idle stream
+    'QUEUE_SIZE': 32,  # events buffered per stream before a slow client is told to resync
+    'REPLAY_SIZE': 50,  # recent events per user replayed to a client reconnecting with Last-Event-ID
+    # host:port of the run_event_broker command, needed once events are published from several processes
+    'BROKER': None,
+    # Shared by run_event_broker and the server processes; set it (e.g. from the environment) with BROKER
+    'BROKER_SECRET': os.environ.get('DJANGO_EVENT_BROKER_SECRET'),
+}
@@ -0,0 +1,26 @@
+"""
+Settings for the test suite:
+
+    python manage.py test --settings=learning_log.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# The suite runs in a single process, so a local-memory cache is shared by everything it tests
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+SILENCED_SYSTEM_CHECKS = ['learning_logs.E001']
+
+# Two shard files for the sharding tests, which put them to use with override_settings(SHARD_COUNT=2)
+DATABASES = {
+    **DATABASES,  # noqa: F405
+    **{f'shard_{shard}': {**DATABASES['default'], 'NAME': BASE_DIR / f'db_shard_{shard}.sqlite3'}  # noqa: F405
+       for shard in range(2)},
+}
+
+# Tests see each event as soon as it is logged; AccessLogBufferTests turn buffering back on
+ACCESS_LOG_BUFFER = {**ACCESS_LOG_BUFFER, 'ENABLED': False}  # noqa: F405
+
+# Previews are rendered inline instead of in a process pool
+MEDIA_DERIVATIVES = {**MEDIA_DERIVATIVES, 'ASYNC': False}  # noqa: F405
@@ -0,0 +1,145 @@
+"""JSON bodies of the async calendar and draft API.
+
+The api/v2/ endpoints are async views: under ASGI they wait on the cache
+and the database without holding a worker thread, which suits the chatty
+calendar navigation, drag-and-drop and autosave calls. Their request and
+response bodies are described by the JSON Schemas in SCHEMAS (served at
+api/v2/schema/). validate() checks a document against the subset of JSON
+Schema these schemas use, and parse_body() applies it to a request body.
+"""
+import json
+import re
+
+from .models import Entry
+
+DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+
+SCHEMAS = {
+    'calendar_month.response': {
+        'type': 'object',
+        'required': ['year', 'month', 'html'],
+        'properties': {
+            'year': {'type': 'integer', 'minimum': 1, 'maximum': 9999},
+            'month': {'type': 'integer', 'minimum': 1, 'maximum': 12},
+            'html': {'type': 'string'},
+        },
+    },
+    'entry_date.request': {
+        'type': 'object',
+        'required': ['entry_id', 'date'],
+        'additionalProperties': False,
+        'properties': {
+            'entry_id': {'type': 'integer', 'minimum': 1},
+            'date': {'type': 'string', 'pattern': DATE_PATTERN},
+        },
+    },
+    'entry_date.response': {
+        'type': 'object',
+        'required': ['status', 'cells'],
+        'properties': {
+            'status': {'enum': ['success']},
+            # Re-rendered <td> of each day the entry left or landed on, keyed by ISO date
+            'cells': {'type': 'object', 'additionalProperties': {'type': 'string'}},
+        },
+    },
+    'autosave.request': {
+        'type': 'object',
+        'required': ['revision', 'changes'],
+        'additionalProperties': False,
+        'properties': {
+            'draft_key': {'type': 'string', 'pattern': r'^(new|entry-\d+)$'},
+            'revision': {'type': 'integer', 'minimum': 1},
+            'changes': {
+                'type': 'object',
+                'additionalProperties': False,
+                'properties': {
+                    'title': {'type': 'string', 'maxLength': Entry._meta.get_field('title').max_length},
+                    'content': {'type': 'string'},
+                    'mood': {'enum': [''] + [choice for choice, _ in Entry.MOOD_CHOICES]},
+                },
+            },
+            'flush': {'type': 'boolean'},
+        },
+    },
+    'autosave.response': {
+        'type': 'object',
+        'required': ['status', 'revision'],
+        'properties': {
+            'status': {'enum': ['success', 'stale']},
+            'revision': {'type': 'integer', 'minimum': 0},
+            'persisted': {'type': 'boolean'},
+        },
+    },
+    'error.response': {
+        'type': 'object',
+        'required': ['status', 'message'],
+        'properties': {
+            'status': {'enum': ['error']},
+            'message': {'type': 'string'},
+        },
+    },
+}
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'boolean': bool,
+    'null': type(None),
+}
+
+
+class SchemaError(ValueError):
+    """A JSON document does not match its schema."""
+
+
+def _is_type(value, name):
+    if name == 'integer':
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _TYPES[name])
+
+
+def validate(value, schema, path='$'):
+    """Raise SchemaError unless `value` matches `schema`."""
+    if 'type' in schema and not _is_type(value, schema['type']):
+        raise SchemaError(f"{path}: expected {schema['type']}")
+    if 'enum' in schema and value not in schema['enum']:
+        raise SchemaError(f"{path}: must be one of {', '.join(map(repr, schema['enum']))}")
+    if isinstance(value, str):
+        if 'maxLength' in schema and len(value) > schema['maxLength']:
+            raise SchemaError(f"{path}: longer than {schema['maxLength']} characters")
+        if 'pattern' in schema and not re.search(schema['pattern'], value):
+            raise SchemaError(f"{path}: does not match {schema['pattern']}")
+    if _is_type(value, 'number'):
+        if 'minimum' in schema and value < schema['minimum']:
+            raise SchemaError(f"{path}: less than {schema['minimum']}")
+        if 'maximum' in schema and value > schema['maximum']:
+            raise SchemaError(f"{path}: greater than {schema['maximum']}")
+    if isinstance(value, dict):
+        for name in schema.get('required', []):
+            if name not in value:
+                raise SchemaError(f"{path}: missing {name}")
+        properties = schema.get('properties', {})
+        extra = schema.get('additionalProperties', True)
+        for name, item in value.items():
+            if name in properties:
+                validate(item, properties[name], f"{path}.{name}")
+            elif extra is False:
+                raise SchemaError(f"{path}: unexpected property {name}")
+            elif isinstance(extra, dict):
+                validate(item, extra, f"{path}.{name}")
+    if isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value):
+            validate(item, schema['items'], f"{path}[{index}]")
+
+
+def parse_body(request, name):
+    """Decode a JSON request body and validate it against SCHEMAS[name]."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise SchemaError("Body is not valid JSON")
+    validate(data, SCHEMAS[name])
+    return data
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class LearningLogsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'learning_logs'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import checks, db  # noqa: F401 (registers the system checks, connects the SQLite pragma hook)
+        post_migrate.connect(db.create_cache_table, sender=self)
@@ -0,0 +1,161 @@
+"""Buffered audit logging.
+
+AccessLog events are queued in-process and written with a single
+bulk_create once the buffer is full or its oldest event is old enough, so
+read-only pages don't each take the SQLite write lock for an INSERT. The
+check runs when a request finishes, in the request's thread and after its
+response has been sent. Each event is tied to the database it was queued
+for; if that alias has since been pointed at another file (as the test
+runner does on teardown), the event is dropped rather than written there.
+Whatever is still queued when the process exits is written by an atexit
+hook, from its own thread and connections. Once MAX_PENDING events are
+queued (say the database stays locked), the oldest are dropped with a
+warning. Setting ACCESS_LOG_BUFFER['ENABLED'] to False, as the test settings do,
+writes every event synchronously.
+"""
+import atexit
+from collections import deque
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import AccessLog
+from .sharding import shard_for_user
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_EVENTS': 100,
+    'MAX_AGE': 5.0,
+    'MAX_PENDING': 10000,
+    'EXIT_TIMEOUT': 5.0,  # seconds the exit flush may hold up shutdown
+}
+
+
+def buffer_settings():
+    return {**DEFAULTS, **getattr(settings, 'ACCESS_LOG_BUFFER', {})}
+
+
+def _database(using):
+    # The file behind an alias; the test runner swaps it in and out
+    return using, str(connections[using].settings_dict['NAME'])
+
+
+class AccessLogBuffer:
+    """Thread-safe queue of unsaved AccessLog rows, each with the database it belongs in."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._oldest = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _queue(self, entries, limit):
+        # Called with the lock held: append, keeping the newest `limit` events
+        dropped = max(0, len(self._pending) + len(entries) - limit)
+        if self._pending.maxlen != limit:
+            self._pending = deque(self._pending, maxlen=limit)
+        self._pending.extend(entries)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        return dropped
+
+    def add(self, event):
+        options = buffer_settings()
+        if not options['ENABLED']:
+            event.save()
+            return
+        # With sharding, each user's events belong in that user's shard
+        database = _database(shard_for_user(event.user_id))
+        with self._lock:
+            dropped = self._queue([(database, event)], options['MAX_PENDING'])
+        if dropped:
+            logger.warning("Access log buffer is full; dropped %d oldest event(s)", dropped)
+
+    def due(self):
+        options = buffer_settings()
+        with self._lock:
+            return self._oldest is not None and (
+                len(self._pending) >= options['MAX_EVENTS']
+                or time.monotonic() - self._oldest >= options['MAX_AGE'])
+
+    def flush(self):
+        """Write all pending events, one bulk_create per database; returns how many were saved."""
+        with self._lock:
+            pending, self._pending, self._oldest = self._pending, deque(maxlen=self._pending.maxlen), None
+        if not pending:
+            return 0
+        by_database = {}
+        for database, event in pending:
+            by_database.setdefault(database, []).append(event)
+        saved, failed = 0, []
+        for (using, name), batch in by_database.items():
+            if _database(using)[1] != name:
+                logger.warning("Dropping %d access log events queued for %s, which now points elsewhere",
+                               len(batch), using)
+                continue
+            try:
+                AccessLog.objects.using(using).bulk_create(batch)
+            except DatabaseError:
+                logger.exception("Could not flush %d access log events to %s; requeueing", len(batch), using)
+                failed.extend(((using, name), event) for event in batch)
+            else:
+                saved += len(batch)
+        if failed:
+            limit = buffer_settings()['MAX_PENDING']
+            with self._lock:
+                # Failed events go back in front of those queued meanwhile
+                queued, self._pending = self._pending, deque(maxlen=limit)
+                dropped = self._queue(failed + list(queued), limit)
+            if dropped:
+                logger.warning("Access log buffer is full; dropped %d oldest event(s)", dropped)
+        return saved
+
+
+access_log_buffer = AccessLogBuffer()
+
+
+def _flush_and_close():
+    try:
+        access_log_buffer.flush()
+    finally:
+        connections.close_all()
+
+
+@atexit.register
+def flush_at_exit():
+    """Best-effort write of the events still queued when the process exits."""
+    if not len(access_log_buffer):
+        return
+    # A thread of its own gets fresh connections, whatever state the main thread's are in,
+    # and a locked database can't hold up shutdown for longer than EXIT_TIMEOUT
+    worker = threading.Thread(target=_flush_and_close, name='access-log-exit-flush', daemon=True)
+    worker.start()
+    worker.join(buffer_settings()['EXIT_TIMEOUT'])
+
+
+@receiver(request_finished)
+def flush_access_logs(sender, **kwargs):
+    """Write the buffer once it is full or old enough, after the response went out."""
+    if access_log_buffer.due():
+        access_log_buffer.flush()
+
+
+def log_access(request, action):
+    """Record an audit event for the current user without blocking on the database."""
+    event = AccessLog(
+        user_id=request.user.pk,
+        action=action,
+        ip_address=request.META.get('REMOTE_ADDR'),
+        timestamp=timezone.now(),
+    )
+    access_log_buffer.add(event)
@@ -0,0 +1,85 @@
+"""Normalized, multi-size profile pictures.
+
+An uploaded picture is decoded once, rotated according to its EXIF data,
+square-cropped and re-encoded without metadata: a master copy of at most
+AVATAR_MAX_SIZE pixels replaces the upload in Profile.image, and one copy
+per AVATAR_SIZES entry is listed in Profile.avatars. File names embed a hash
+of the master, so a new picture always gets new URLs and the old ones can be
+cached by browsers indefinitely.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .imaging import render_avatars
+
+DEFAULTS = {
+    'SIZES': (32, 64, 160, 320),
+    'MAX_SIZE': 512,
+    'MAX_UPLOAD_SIZE': 5 * 1024 * 1024,
+    'FORMAT': 'WEBP',
+    'QUALITY': 85,
+}
+DEFAULT_IMAGE = 'default.jpg'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def avatar_settings():
+    return {**DEFAULTS, **getattr(settings, 'AVATARS', {})}
+
+
+def _save(storage, name, data):
+    # Hashed names only ever hold the same bytes, so an existing file is kept
+    if not storage.exists(name):
+        storage.save(name, ContentFile(data))
+    return name
+
+
+def _delete_files(storage, names):
+    for name in names:
+        if name and name != DEFAULT_IMAGE:
+            storage.delete(name)
+
+
+def discard_files(storage, names, using=None):
+    """Delete the files once the current transaction on `using` commits (right away outside one)."""
+    names = set(names)
+    transaction.on_commit(lambda: _delete_files(storage, names), using=using)
+
+
+def store_avatar(profile, fileobj, previous_image=None):
+    """
+    Write the normalized files and point the profile at them without saving it.
+
+    Returns the names of the profile's previous files, to delete once the
+    profile is saved. Pass previous_image when profile.image already holds
+    the new upload (as it does after ModelForm validation).
+    """
+    options = avatar_settings()
+    encoded = render_avatars(fileobj, options['SIZES'], options['MAX_SIZE'],
+                             options['FORMAT'], options['QUALITY'])
+    digest = hashlib.sha256(encoded['master']).hexdigest()[:16]
+    ext = EXTENSIONS.get(options['FORMAT'], options['FORMAT'].lower())
+    storage = profile.image.storage
+    stem = f"{profile.user_id}-{digest}"
+
+    old = {previous_image or profile.image.name, *profile.avatars.values()}
+    master = _save(storage, f"profile_pics/{stem}.{ext}", encoded.pop('master'))
+    avatars = {
+        str(size): _save(storage, f"profile_pics/avatars/{stem}-{size}.{ext}", data)
+        for size, data in encoded.items()
+    }
+    profile.image = master
+    profile.avatars = avatars
+    return old - {master, *avatars.values()}
+
+
+def save_avatar(profile, fileobj, previous_image=None):
+    """Normalize and save a new picture, removing the old files after commit."""
+    with transaction.atomic():
+        stale = store_avatar(profile, fileobj, previous_image)
+        profile.save()
+        discard_files(profile.image.storage, stale)
+    return profile
@@ -0,0 +1,51 @@
+"""System checks for deployment settings the app relies on."""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+DATABASE_CACHE = 'django.core.cache.backends.db.DatabaseCache'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cached financial summaries, calendar grids, drafts, watermarks and shard
+    assignments are invalidated by writing to the cache, so every server
+    process has to read the same one. The test settings silence this.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) is private to each process, so one worker's "
+        "invalidations are never seen by the others.",
+        hint="Use a shared backend such as DatabaseCache (see CACHES in settings; create its table "
+             "with 'manage.py createcachetable --database cache') or Redis.",
+        id='learning_logs.E001',
+    )]
+
+
+@register(Tags.caches, Tags.database)
+def check_cache_table(app_configs, databases=None, **kwargs):
+    """
+    The DatabaseCache table is created by migrate (see db.create_cache_table);
+    until it exists every cached page fails with "no such table". Like other
+    database checks this only runs when asked to, e.g. 'check --database cache'.
+    """
+    cache = settings.CACHES.get('default', {})
+    alias = getattr(settings, 'CACHE_DATABASE', None)
+    if cache.get('BACKEND') != DATABASE_CACHE or alias not in settings.DATABASES or alias not in (databases or ()):
+        return []
+    if cache['LOCATION'] in connections[alias].introspection.table_names():
+        return []
+    return [Warning(
+        f"The cache table '{cache['LOCATION']}' doesn't exist in the '{alias}' database.",
+        hint=f"Run 'manage.py migrate' or 'manage.py createcachetable --database {alias}'.",
+        id='learning_logs.W001',
+    )]
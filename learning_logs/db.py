@@ -0,0 +1,193 @@
+"""SQLite connection tuning and read routing.
+
+Every new SQLite connection gets the pragmas in SQLITE_PRAGMAS (WAL, busy
+timeout, synchronous=NORMAL, mmap and page cache sizes). In WAL mode readers
+never block the single writer and the writer does not block readers.
+
+Report-style views wrapped in @analytics_reads send their ORM reads to the
+ANALYTICS_DATABASE alias, a read-only connection to the same file, so long
+aggregate queries never hold the connection that handles writes. Writes,
+and reads outside those views, stay on 'default'. Under tests the alias is
+a mirror of 'default' and is bypassed, so TestCase transactions see the
+rows they wrote.
+"""
+import contextvars
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+}
+
+_analytics = contextvars.ContextVar('analytics_reads', default=False)
+
+
+def is_read_only(settings_dict):
+    return 'mode=ro' in str(settings_dict.get('NAME', ''))
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Configure each new SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+    read_only = is_read_only(connection.settings_dict)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # The journal mode is stored in the file; a read-only connection can't change it
+            if name == 'journal_mode' and read_only:
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+
+
+def _configured_analytics_alias():
+    alias = getattr(settings, 'ANALYTICS_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def analytics_alias():
+    """The read-only alias for report queries, or None if it isn't configured or mirrors 'default'."""
+    alias = _configured_analytics_alias()
+    if alias is None:
+        return None
+    # The test runner points a TEST MIRROR at default's test database
+    if connections[alias].settings_dict['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    return alias
+
+
+def bind_stream(iterable, var, value):
+    """Set a context variable around each step of a streaming response body."""
+    # Streaming bodies are produced after the view returns; route each step too
+    iterator = iter(iterable)
+    while True:
+        token = var.set(value)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            var.reset(token)
+        yield chunk
+
+
+async def async_stream(iterable):
+    """
+    Serve a sync streaming body from an async iterator, one step per thread hop.
+
+    Under ASGI, Django collects a sync iterator into a list before sending
+    it, so a large streamed body would be held in memory in full. Each
+    step runs in the request's sync thread, next to its database connection.
+    """
+    iterator = iter(iterable)
+    step = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    try:
+        while (chunk := await step(iterator, done)) is not done:
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+async def abind_stream(aiterable, var, value):
+    """bind_stream() for the async iterators of streaming responses served under ASGI."""
+    iterator = aiter(aiterable)
+    while True:
+        token = var.set(value)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            var.reset(token)
+        yield chunk
+
+
+def analytics_reads(view):
+    """Route the view's reads (including a streamed body) to the analytics database."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _analytics.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _analytics.reset(token)
+        if getattr(response, 'streaming', False):
+            stream = abind_stream if response.is_async else bind_stream
+            response.streaming_content = stream(response.streaming_content, _analytics, True)
+        return response
+    return wrapper
+
+
+def create_cache_table(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: create DatabaseCache's table in CACHE_DATABASE if it is missing."""
+    alias = getattr(settings, 'CACHE_DATABASE', None)
+    if alias not in settings.DATABASES:
+        return
+    from django.core.management import call_command
+    # Only touches database-backed caches; does nothing if the table exists
+    call_command('createcachetable', database=alias, verbosity=0)
+
+
+class CacheRouter:
+    """Keep DatabaseCache's table in the CACHE_DATABASE file and nothing else there."""
+    app_label = 'django_cache'
+
+    def _alias(self):
+        alias = getattr(settings, 'CACHE_DATABASE', None)
+        return alias if alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self._alias()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = self._alias()
+        if alias is None:
+            return None
+        if app_label == self.app_label:
+            return db == alias
+        return False if db == alias else None
+
+
+class AnalyticsRouter:
+    """Send reads made inside @analytics_reads views to ANALYTICS_DATABASE."""
+
+    def db_for_read(self, model, **hints):
+        if _analytics.get():
+            return analytics_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects loaded from the read-only alias are saved through 'default'
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == analytics_alias():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {obj1._state.db, obj2._state.db}
+        if databases <= {DEFAULT_DB_ALIAS, analytics_alias()}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The analytics alias is the same file as 'default', opened read-only
+        if db == _configured_analytics_alias():
+            return False
+        return None
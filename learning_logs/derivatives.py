@@ -0,0 +1,140 @@
+"""Background derivative pipeline for MediaVault blobs.
+
+Once a new image or PDF blob is committed, schedule_derivatives() hands it
+to a process pool that writes resized previews (for PDFs, of the first page
+when poppler's pdftoppm is installed) next to the original in the vault.
+The parent process records them in the blob's derivatives manifest, and
+pages then link the smallest preview that fits instead of the original.
+Derivatives belong to the blob, so deduplicated uploads share them.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .imaging import render_derivatives
+from .models import MediaBlob
+
+logger = logging.getLogger('learning_logs.derivatives')
+
+DEFAULTS = {
+    'WIDTHS': (320, 640, 1280),
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'WORKERS': 2,
+    'ASYNC': True,  # False renders in the calling process (tests, management commands)
+}
+CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def derivative_settings():
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_DERIVATIVES', {})}
+
+
+def derivative_kind(content_type):
+    """'image' or 'pdf' for blobs that get previews, else None."""
+    if content_type.startswith('image/') and content_type not in ('image/svg+xml', 'image/x-icon'):
+        return 'image'
+    if content_type == 'application/pdf':
+        return 'pdf'
+    return None
+
+
+def _executor(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers start clean: no inherited DB connections or threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _job(blob, options):
+    storage = blob.file.storage
+    source = storage.path(blob.file.name)
+    return (render_derivatives, source, source, derivative_kind(blob.content_type),
+            tuple(options['WIDTHS']), options['FORMAT'], options['QUALITY'])
+
+
+def record_derivatives(blob_id, results, fmt):
+    """Store rendered files in the blob's manifest; returns the new status."""
+    blob = MediaBlob.objects.filter(pk=blob_id).only('file', 'content_type').first()
+    if blob is None:
+        # The blob was deleted while rendering; drop the orphaned files
+        for item in results:
+            os.remove(item['path'])
+        return None
+    root = blob.file.storage.location
+    manifest = {
+        str(item['width']): {
+            'name': os.path.relpath(item['path'], root).replace(os.sep, '/'),
+            'width': item['width'], 'height': item['height'], 'size': item['size'],
+            'content_type': CONTENT_TYPES.get(fmt, 'application/octet-stream'),
+        } for item in results
+    }
+    status = 'ready' if manifest or derivative_kind(blob.content_type) == 'image' else 'none'
+    MediaBlob.objects.filter(pk=blob_id).update(derivatives=manifest, derivatives_status=status)
+    return status
+
+
+def _mark_failed(blob_id, error):
+    logger.warning("Derivatives for blob %s failed: %s", blob_id, error)
+    MediaBlob.objects.filter(pk=blob_id).update(derivatives_status='failed')
+
+
+def _on_done(blob_id, fmt, caller, future):
+    # Normally runs on the executor's management thread, which needs its own DB connection
+    own_thread = threading.get_ident() != caller
+    if own_thread:
+        close_old_connections()
+    try:
+        error = future.exception()
+        if error is not None:
+            _mark_failed(blob_id, error)
+        else:
+            record_derivatives(blob_id, future.result(), fmt)
+    except Exception:
+        logger.exception("Recording derivatives for blob %s failed", blob_id)
+    finally:
+        if own_thread:
+            connection.close()
+
+
+def generate_derivatives(blob, run_async=None):
+    """Render previews for a blob, in the pool or inline; returns the future or status."""
+    options = derivative_settings()
+    if derivative_kind(blob.content_type) is None:
+        MediaBlob.objects.filter(pk=blob.pk).update(derivatives_status='none')
+        return 'none'
+
+    func, *args = _job(blob, options)
+    if run_async if run_async is not None else options['ASYNC']:
+        future = _executor(options['WORKERS']).submit(func, *args)
+        caller = threading.get_ident()
+        future.add_done_callback(lambda done: _on_done(blob.pk, options['FORMAT'], caller, done))
+        return future
+    try:
+        results = func(*args)
+    except Exception as e:
+        _mark_failed(blob.pk, e)
+        return 'failed'
+    return record_derivatives(blob.pk, results, options['FORMAT'])
+
+
+def schedule_derivatives(blob_id):
+    """on_commit hook for new blobs: render previews if still pending."""
+    blob = MediaBlob.objects.filter(pk=blob_id, derivatives_status='pending').first()
+    if blob is not None:
+        generate_derivatives(blob)
+
+
+def delete_derivatives(storage, manifest):
+    for item in (manifest or {}).values():
+        storage.delete(item['name'])
@@ -0,0 +1,214 @@
+"""Autosaved entry drafts with coalesced writes.
+
+Clients send partial updates (only the fields that changed) together with a
+revision number that must increase with every save. The latest state of each
+draft lives in the cache; it is written to the EntryDraft table at most once
+per PERSIST_INTERVAL seconds, or immediately when the client asks for a
+flush (e.g. when the page is hidden). A save whose revision is not newer
+than the current one is rejected without touching the database. A save
+costs one cache read and one cache write and takes no lock: an editor
+sends its saves one at a time, and the database row is only ever moved
+forward (a conditional UPDATE on the revision), so a late write from
+another process can never replace a newer draft.
+
+publish_draft() turns a draft into an Entry (or updates the entry it was
+editing) and removes the draft.
+"""
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Entry, EntryDraft
+from . import sharding
+
+DEFAULTS = {
+    'PERSIST_INTERVAL': 30,
+    'CACHE_TIMEOUT': 7 * 24 * 60 * 60,
+}
+FIELDS = ('title', 'content', 'mood')
+NEW_DRAFT = 'new'
+
+_KEY_RE = re.compile(r'^(new|entry-(\d+))$')
+_MOODS = {choice for choice, _ in Entry.MOOD_CHOICES} | {''}
+_TITLE_MAX = Entry._meta.get_field('title').max_length
+
+
+class StaleRevision(Exception):
+    """The client sent a revision that is not newer than the stored draft."""
+
+    def __init__(self, state):
+        super().__init__(f"Draft is already at revision {state['revision']}")
+        self.state = state
+
+
+def draft_settings():
+    return {**DEFAULTS, **getattr(settings, 'ENTRY_DRAFTS', {})}
+
+
+def draft_key(entry=None):
+    """The draft key used while writing a new entry or editing `entry`."""
+    return f"entry-{entry.pk}" if entry is not None else NEW_DRAFT
+
+
+def _cache_key(user_id, key):
+    return f"draft:{user_id}:{key}"
+
+
+def _entry_id(key):
+    match = _KEY_RE.match(key or '')
+    if not match:
+        raise ValueError(f"Invalid draft key: {key!r}")
+    return int(match.group(2)) if match.group(2) else None
+
+
+def _state_from_row(row):
+    return {
+        'entry_id': row.entry_id,
+        **{field: getattr(row, field) for field in FIELDS},
+        'revision': row.revision,
+        'persisted_revision': row.revision,
+        'persisted_at': time.time(),
+    }
+
+
+def load_draft(user, key):
+    """Current state of a draft, from the cache or (on a miss) the database."""
+    entry_id = _entry_id(key)
+    state = cache.get(_cache_key(user.pk, key))
+    if state is not None:
+        return state
+
+    row = EntryDraft.objects.filter(user=user, key=key).first()
+    if row is not None:
+        state = _state_from_row(row)
+    else:
+        if entry_id is not None and not Entry.objects.filter(pk=entry_id, owner=user).exists():
+            raise Entry.DoesNotExist(f"No entry {entry_id} for this user")
+        state = _new_state(entry_id)
+    cache.set(_cache_key(user.pk, key), state, draft_settings()['CACHE_TIMEOUT'])
+    return state
+
+
+async def aload_draft(user, key):
+    """load_draft() through the async cache and ORM APIs."""
+    entry_id = _entry_id(key)
+    state = await cache.aget(_cache_key(user.pk, key))
+    if state is not None:
+        return state
+
+    row = await EntryDraft.objects.filter(user=user, key=key).afirst()
+    if row is not None:
+        state = _state_from_row(row)
+    else:
+        if entry_id is not None and not await Entry.objects.filter(pk=entry_id, owner=user).aexists():
+            raise Entry.DoesNotExist(f"No entry {entry_id} for this user")
+        state = _new_state(entry_id)
+    await cache.aset(_cache_key(user.pk, key), state, draft_settings()['CACHE_TIMEOUT'])
+    return state
+
+
+def _new_state(entry_id):
+    return {
+        'entry_id': entry_id, 'title': '', 'content': '', 'mood': '',
+        'revision': 0, 'persisted_revision': 0, 'persisted_at': 0,
+    }
+
+
+def _persist(user, key, state):
+    values = {field: state[field] for field in FIELDS}
+    # Conditional update: never move the stored draft back to an older revision
+    updated = EntryDraft.objects.filter(user=user, key=key, revision__lt=state['revision'])\
+        .update(revision=state['revision'], updated_at=timezone.now(), **values)
+    if not updated:
+        EntryDraft.objects.get_or_create(user=user, key=key, defaults={
+            'entry_id': state['entry_id'], 'revision': state['revision'], **values,
+        })
+    state['persisted_revision'] = state['revision']
+    state['persisted_at'] = time.time()
+
+
+async def _apersist(user, key, state):
+    values = {field: state[field] for field in FIELDS}
+    updated = await EntryDraft.objects.filter(user=user, key=key, revision__lt=state['revision'])\
+        .aupdate(revision=state['revision'], updated_at=timezone.now(), **values)
+    if not updated:
+        await EntryDraft.objects.aget_or_create(user=user, key=key, defaults={
+            'entry_id': state['entry_id'], 'revision': state['revision'], **values,
+        })
+    state['persisted_revision'] = state['revision']
+    state['persisted_at'] = time.time()
+
+
+def _clean_changes(changes):
+    changes = {field: value for field, value in changes.items() if field in FIELDS}
+    if 'title' in changes and len(changes['title']) > _TITLE_MAX:
+        raise ValueError(f"Title is longer than {_TITLE_MAX} characters")
+    if 'mood' in changes and changes['mood'] not in _MOODS:
+        raise ValueError(f"Unknown mood: {changes['mood']!r}")
+    return changes
+
+
+def _apply(state, revision, changes, flush):
+    """Move the state to `revision`; returns whether it is due to be persisted."""
+    if revision <= state['revision']:
+        raise StaleRevision(state)
+    state.update(changes, revision=revision)
+    return flush or time.time() - state['persisted_at'] >= draft_settings()['PERSIST_INTERVAL']
+
+
+def save_draft(user, key, revision, changes, flush=False):
+    """Apply a partial update; returns (state, persisted) or raises StaleRevision."""
+    changes = _clean_changes(changes)
+    state = load_draft(user, key)
+    persisted = _apply(state, revision, changes, flush)
+    if persisted:
+        _persist(user, key, state)
+    cache.set(_cache_key(user.pk, key), state, draft_settings()['CACHE_TIMEOUT'])
+    return state, persisted
+
+
+async def asave_draft(user, key, revision, changes, flush=False):
+    """save_draft() for async views."""
+    changes = _clean_changes(changes)
+    state = await aload_draft(user, key)
+    persisted = _apply(state, revision, changes, flush)
+    if persisted:
+        await _apersist(user, key, state)
+    await cache.aset(_cache_key(user.pk, key), state, draft_settings()['CACHE_TIMEOUT'])
+    return state, persisted
+
+
+def flush_draft(user, key):
+    """Write a cached draft to the database if it has unsaved revisions."""
+    state = load_draft(user, key)
+    if state['revision'] > state['persisted_revision']:
+        _persist(user, key, state)
+        cache.set(_cache_key(user.pk, key), state, draft_settings()['CACHE_TIMEOUT'])
+    return state
+
+
+def discard_draft(user, key):
+    EntryDraft.objects.filter(user=user, key=key).delete()
+    cache.delete(_cache_key(user.pk, key))
+
+
+def publish_draft(user, key):
+    """Save the draft as an Entry and delete it; returns the entry."""
+    state = load_draft(user, key)
+    if not state['title'].strip():
+        raise ValueError("A draft needs a title before it can be published")
+
+    with sharding.atomic(sharding.shard_for_user(user.pk)):
+        if state['entry_id'] is None:
+            entry = Entry(owner=user)
+        else:
+            entry = Entry.objects.select_for_update().get(pk=state['entry_id'], owner=user)
+        for field in FIELDS:
+            setattr(entry, field, state[field])
+        entry.save()
+        EntryDraft.objects.filter(user=user, key=key).delete()
+    cache.delete(_cache_key(user.pk, key))
+    return entry
@@ -0,0 +1,303 @@
+"""Live per-user events, pushed to browsers over Server-Sent Events.
+
+publish() sends a reminder, milestone or entry-change event to every open
+events stream of a user. Streams are served by an async view under ASGI:
+each one is a Subscription holding a small bounded buffer, so an idle
+connection costs a few hundred bytes and no thread. A slow client that lets
+its buffer overflow loses the oldest events and is told to resync.
+
+The bus also keeps the last LIVE_EVENTS['REPLAY_SIZE'] events per user, so a
+client that reconnects with Last-Event-ID gets what it missed (or a resync
+if the gap is too old). Streams send a comment line every HEARTBEAT seconds
+to keep proxies from closing idle connections.
+
+The bus is in-process. With several server processes, set
+LIVE_EVENTS['BROKER'] to the host:port of the run_event_broker command and
+LIVE_EVENTS['BROKER_SECRET'] to the secret it expects; publish() then hands
+events to a publisher thread that sends them through the broker, which
+relays them to every process, including the publisher.
+"""
+import asyncio
+from collections import OrderedDict, defaultdict, deque, namedtuple
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'HEARTBEAT': 15,
+    'QUEUE_SIZE': 32,
+    'REPLAY_SIZE': 50,
+    'REPLAY_USERS': 10000,
+    'RETRY_MS': 3000,
+    'BROKER': None,
+    'BROKER_SECRET': None,
+    'BROKER_TIMEOUT': 5,  # seconds to connect to the broker or send it an event
+    'BROKER_QUEUE_SIZE': 1000,  # events waiting for the publisher thread before publish() delivers locally
+}
+
+Event = namedtuple('Event', 'id kind data')
+
+
+def event_settings():
+    return {**DEFAULTS, **getattr(settings, 'LIVE_EVENTS', {})}
+
+
+def format_event(event):
+    """An event as an SSE message; events without an id don't move Last-Event-ID."""
+    lines = [f"id: {event.id}"] if event.id else []
+    lines += [f"event: {event.kind}", f"data: {json.dumps(event.data, separators=(',', ':'))}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+RESYNC = Event(None, 'resync', {})
+
+
+class Subscription:
+    """One open stream: a bounded buffer that the publishing threads fill on the stream's loop."""
+    __slots__ = ('loop', 'events', 'ready', 'overflowed')
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.events = deque(maxlen=size)
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.overflowed = True
+        self.events.append(event)
+        self.ready.set()
+
+    async def wait(self, timeout):
+        """Buffered events and whether some were dropped, or None after `timeout` idle seconds."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        events, overflowed = list(self.events), self.overflowed
+        self.events.clear()
+        self.overflowed = False
+        return events, overflowed
+
+
+class EventBus:
+    """Thread-safe registry of the open streams and recent events of each user."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._recent = OrderedDict()
+        self._last_id = 0
+
+    def next_id(self):
+        # Microsecond timestamps keep ids increasing across restarts and roughly ordered across processes
+        with self._lock:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            return self._last_id
+
+    def subscribe(self, user_id):
+        subscription = Subscription(asyncio.get_running_loop(), event_settings()['QUEUE_SIZE'])
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[user_id]
+
+    def deliver(self, user_id, event):
+        """Hand an event to the user's open streams and remember it for reconnects."""
+        options = event_settings()
+        with self._lock:
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque(maxlen=options['REPLAY_SIZE'])
+                if len(self._recent) > options['REPLAY_USERS']:
+                    self._recent.popitem(last=False)
+            else:
+                self._recent.move_to_end(user_id)
+            recent.append(event)
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+            except RuntimeError:
+                # The stream's event loop has shut down
+                self.unsubscribe(user_id, subscription)
+
+    def replay(self, user_id, last_event_id):
+        """Events after `last_event_id`, or None if it is no longer in the replay buffer."""
+        with self._lock:
+            recent = list(self._recent.get(user_id, ()))
+        for index, event in enumerate(recent):
+            if str(event.id) == str(last_event_id):
+                return recent[index + 1:]
+        return None
+
+
+bus = EventBus()
+
+
+class BrokerClient:
+    """
+    Connections to run_event_broker, relaying events between processes.
+
+    send() only queues the event: a publisher thread owns the PUB
+    connection, so a slow or unreachable broker never holds up the request
+    thread that published. A process that serves streams also keeps a
+    reader thread on a SUB connection that delivers relayed events to the
+    local bus. Events the broker can't take are delivered locally only.
+    """
+
+    def __init__(self, address, secret, timeout=5, queue_size=1000):
+        host, _, port = address.rpartition(':')
+        self.address = (host or '127.0.0.1', int(port))
+        self.secret = secret
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue(queue_size)
+        self._publisher = None
+        self._reader = None
+
+    def _connect(self, role):
+        connection = socket.create_connection(self.address, timeout=self.timeout)
+        connection.sendall(role + b' ' + self.secret.encode() + b'\n')
+        return connection
+
+    def _start(self, attribute, target, name):
+        with self._lock:
+            thread = getattr(self, attribute)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                setattr(self, attribute, thread)
+                thread.start()
+
+    def send(self, user_id, event):
+        """Queue an event for the broker; False if the queue is full and it wasn't taken."""
+        self._start('_publisher', self._publish, 'event-broker-publisher')
+        try:
+            self._outbox.put_nowait((user_id, event))
+        except queue.Full:
+            return False
+        return True
+
+    def _publish(self):
+        connection = None
+        while True:
+            user_id, event = self._outbox.get()
+            line = json.dumps({'user_id': user_id, 'id': event.id, 'kind': event.kind, 'data': event.data})
+            try:
+                if connection is None:
+                    connection = self._connect(b'PUB')
+                connection.sendall(line.encode() + b'\n')
+            except OSError:
+                logger.warning("Event broker %s:%s unreachable; delivering locally", *self.address)
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                bus.deliver(user_id, event)
+
+    def listen(self):
+        """Start the reader thread (once per process)."""
+        self._start('_reader', self._read, 'event-broker-reader')
+
+    def _read(self):
+        while True:
+            try:
+                with self._connect(b'SUB') as connection, connection.makefile('rb') as stream:
+                    connection.settimeout(None)
+                    for line in stream:
+                        message = json.loads(line)
+                        bus.deliver(message['user_id'], Event(message['id'], message['kind'], message['data']))
+            except (OSError, ValueError):
+                logger.warning("Lost the event broker at %s:%s; reconnecting", *self.address)
+            time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """The BrokerClient for LIVE_EVENTS['BROKER'], or None for in-process delivery."""
+    global _broker
+    options = event_settings()
+    if not options['BROKER']:
+        return None
+    if not options['BROKER_SECRET']:
+        raise ImproperlyConfigured("LIVE_EVENTS['BROKER'] needs a BROKER_SECRET shared with run_event_broker.")
+    with _broker_lock:
+        if _broker is None:
+            _broker = BrokerClient(options['BROKER'], options['BROKER_SECRET'],
+                                   options['BROKER_TIMEOUT'], options['BROKER_QUEUE_SIZE'])
+    return _broker
+
+
+def publish(user_id, kind, data):
+    """Push an event to the user's open streams, in this process or (via the broker) any."""
+    event = Event(bus.next_id(), kind, data)
+    client = broker()
+    if client is None or not client.send(user_id, event):
+        bus.deliver(user_id, event)
+    return event
+
+
+def publish_on_commit(user_id, kind, data, using=None):
+    """publish() once the current transaction on `using` commits (right away outside one)."""
+    transaction.on_commit(lambda: publish(user_id, kind, data), using=using)
+
+
+def entries_changed(user_id, entry_ids, days, using=None):
+    """Tell the user's open calendars which entries changed and which local days to re-fetch."""
+    publish_on_commit(user_id, 'entry', {
+        'entry_ids': sorted(entry_ids), 'days': sorted(day.isoformat() for day in days),
+    }, using=using)
+
+
+async def event_stream(user_id, last_event_id=None):
+    """The SSE body of one connection; runs until the client disconnects."""
+    options = event_settings()
+    client = broker()
+    if client is not None:
+        client.listen()
+    # Subscribe before replaying so nothing published in between is missed
+    subscription = bus.subscribe(user_id)
+    try:
+        yield f"retry: {options['RETRY_MS']}\n\n"
+        sent = set()
+        if last_event_id:
+            missed = bus.replay(user_id, last_event_id)
+            if missed is None:
+                yield format_event(RESYNC)
+            else:
+                for event in missed:
+                    sent.add(event.id)
+                    yield format_event(event)
+        while True:
+            batch = await subscription.wait(options['HEARTBEAT'])
+            if batch is None:
+                yield ": heartbeat\n\n"
+                continue
+            events, overflowed = batch
+            if overflowed:
+                yield format_event(RESYNC)
+            for event in events:
+                if event.id not in sent:
+                    yield format_event(event)
+            sent.clear()
+    finally:
+        bus.unsubscribe(user_id, subscription)
@@ -0,0 +1,148 @@
+"""Streaming data export.
+
+Rows are read from the database in chunks and encoded one record at a time,
+so an export never holds more than a chunk of rows (plus a small output
+buffer) in memory regardless of how much data the user has. Under ASGI the
+export view wraps the stream in db.async_stream(), since Django would
+otherwise read a sync body into memory before sending it.
+"""
+import csv
+import datetime
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Entry, Expense, Income, RecurringExpense
+
+FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+CHUNK_SIZE = 500
+BUFFER_SIZE = 64 * 1024
+
+# model label -> (model, exported fields, field used by the `since` filter)
+EXPORTS = {
+    'entries': (Entry, ['title', 'slug', 'uuid', 'content', 'date_created', 'event_date',
+                        'last_modified', 'mood', 'latitude', 'longitude', 'tags'], 'last_modified'),
+    'expenses': (Expense, ['title', 'amount', 'category', 'date_added'], 'date_added'),
+    'incomes': (Income, ['source', 'amount', 'date_added'], 'date_added'),
+    'recurring': (RecurringExpense, ['title', 'amount', 'category', 'frequency',
+                                     'next_due_date', 'reminder_active'], None),
+}
+
+
+def parse_since(value):
+    """Parse an ISO date or datetime into an aware datetime, or raise ValueError."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid since value: {value!r}")
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def iter_records(user, include=('entries',), since=None, chunk_size=CHUNK_SIZE):
+    """Yield serializer-style dicts for each exported row, chunk by chunk."""
+    for name in include:
+        model, fields, since_field = EXPORTS[name]
+        queryset = model.objects.filter(owner=user).order_by('pk')
+        if since is not None and since_field:
+            queryset = queryset.filter(**{f'{since_field}__gte': since})
+        if model is Entry:
+            queryset = queryset.prefetch_related('tags')
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            record = {}
+            for field in fields:
+                if field == 'tags':
+                    record[field] = [tag.name for tag in obj.tags.all()]
+                else:
+                    record[field] = getattr(obj, field)
+            yield {'model': model._meta.label_lower, 'pk': obj.pk, 'fields': record}
+
+
+def encode_json(records):
+    """Encode records as a single JSON array, streamed element by element."""
+    yield '['
+    for index, record in enumerate(records):
+        yield (',\n' if index else '\n') + json.dumps(record, cls=DjangoJSONEncoder)
+    yield '\n]\n'
+
+
+def encode_ndjson(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object whose write() just returns the line for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(records, include=('entries',)):
+    """Encode records as CSV with one column per field across the exported models."""
+    columns = []
+    for name in include:
+        for field in EXPORTS[name][1]:
+            if field not in columns:
+                columns.append(field)
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['model', 'pk'] + columns)
+    for record in records:
+        fields = record['fields']
+        row = [record['model'], record['pk']]
+        for column in columns:
+            value = fields.get(column, '')
+            if isinstance(value, list):
+                value = ';'.join(value)
+            elif value is None:
+                value = ''
+            row.append(value)
+        yield writer.writerow(row)
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Join small text chunks into ~size byte blocks to cut per-chunk overhead."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(blocks):
+    """Compress a stream of byte blocks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(user, fmt='json', include=('entries',), since=None, compress=False,
+                  chunk_size=CHUNK_SIZE):
+    """Return an iterator of byte blocks for the requested export."""
+    records = iter_records(user, include, since, chunk_size)
+    if fmt == 'csv':
+        chunks = encode_csv(records, include)
+    elif fmt == 'ndjson':
+        chunks = encode_ndjson(records)
+    else:
+        chunks = encode_json(records)
+    blocks = buffered(chunks)
+    return gzipped(blocks) if compress else blocks
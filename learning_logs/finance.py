@@ -0,0 +1,89 @@
+"""Cached per-user financial summaries.
+
+A summary (goals, month income, month expenses, recurring total) is cached
+per (user, month) under a key that embeds the user's finance version. Any
+committed change to Expense, Income, FinancialGoal or RecurringExpense bumps
+that version, so an old summary can never be read again; it simply ages
+out of the cache.
+"""
+import datetime
+from decimal import Decimal
+import time
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailySpend, FinancialGoal, Income, RecurringExpense
+from .utils import month_bounds
+
+SUMMARY_TIMEOUT = 60 * 60
+GOAL_FIELDS = ('monthly_salary', 'daily_income_estimate', 'savings_goal', 'daily_spending_limit')
+
+
+def _version_key(user_id):
+    return f"finance:version:{user_id}"
+
+
+def _fresh_version():
+    # Time-based, so a version key lost to eviction never restarts at an old value
+    return int(time.time() * 1000)
+
+
+def finance_version(user_id):
+    """Return the user's current finance version, initialising it if needed."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_finance_version(user_id):
+    """Make every cached summary for the user unreachable."""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def summary_key(user_id, year, month, version):
+    return f"finance:summary:{user_id}:{year}-{month:02d}:v{version}"
+
+
+def compute_summary(user, year, month):
+    """Build the summary from the database without writing anything."""
+    month_start = datetime.date(year, month, 1)
+    next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+    goals = FinancialGoal.objects.filter(owner=user).values(*GOAL_FIELDS).first() \
+        or {field: Decimal('0') for field in GOAL_FIELDS}
+    start, end = month_bounds(year, month)
+    income_sum = Income.objects.filter(
+        owner=user, date_added__gte=start, date_added__lt=end,
+    ).aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
+    expense_total = DailySpend.objects.filter(
+        user=user, day__gte=month_start, day__lt=next_month,
+    ).aggregate(Sum('total'))['total__sum'] or Decimal('0')
+    recurring_total = RecurringExpense.objects.filter(owner=user)\
+        .aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
+    return {
+        'goals': goals,
+        'income_sum': income_sum,
+        'expense_total': expense_total,
+        'recurring_total': recurring_total,
+    }
+
+
+def financial_summary(user, year=None, month=None):
+    """Return the cached summary for a month (default: the current one)."""
+    if year is None or month is None:
+        today = timezone.localdate()
+        year, month = today.year, today.month
+    key = summary_key(user.pk, year, month, finance_version(user.pk))
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_summary(user, year, month)
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
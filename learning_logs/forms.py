@@ -1,5 +1,6 @@
 from django import forms
 from .models import Topic, Entry, Expense, Income, FinancialGoal, RecurringExpense, Profile
+from .avatars import avatar_settings, discard_files, save_avatar, store_avatar
 
 
 class TopicForm(forms.ModelForm):
@@ -60,4 +61,37 @@ class RecurringExpenseForm(forms.ModelForm):
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['image']
\ No newline at end of file
+        fields = ['image']
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image and 'image' in self.changed_data:
+            limit = avatar_settings()['MAX_UPLOAD_SIZE']
+            if image.size > limit:
+                raise forms.ValidationError(f"Picha ni kubwa mno (kikomo ni MB {limit // (1024 * 1024)}).")
+        return image
+
+    def save(self, commit=True):
+        profile = super().save(commit=False)
+        self.stale_files = set()
+        if 'image' in self.changed_data and self.cleaned_data.get('image'):
+            # Replace the raw upload with the resized, re-encoded versions
+            previous = getattr(self.initial.get('image'), 'name', None)
+            if commit:
+                return save_avatar(profile, self.cleaned_data['image'], previous)
+            # Kept until the caller saves the profile and calls save_m2m(), as
+            # with any ModelForm saved with commit=False
+            self.stale_files = store_avatar(profile, self.cleaned_data['image'], previous)
+        elif commit:
+            profile.save()
+        return profile
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        self.delete_stale_files()
+
+    def delete_stale_files(self):
+        """Delete the picture files replaced by save(commit=False), once the profile is saved."""
+        stale, self.stale_files = getattr(self, 'stale_files', set()), set()
+        if stale:
+            discard_files(self.instance.image.storage, stale)
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""Pure image work for MediaVault derivatives and profile avatars.
+
+Functions here may run in worker processes, so this module must not import
+Django models or touch the database: it only reads images and writes or
+returns resized copies.
+"""
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image, ImageOps
+
+PDF_RENDER_WIDTH = 1280
+PDF_TIMEOUT = 30
+
+
+def pdf_first_page(source, workdir):
+    """Render page one of a PDF to PNG with poppler's pdftoppm, or return None."""
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        return None
+    prefix = os.path.join(workdir, 'page')
+    try:
+        subprocess.run(
+            [pdftoppm, '-f', '1', '-l', '1', '-png', '-singlefile', '-scale-to', str(PDF_RENDER_WIDTH), source, prefix],
+            check=True, capture_output=True, timeout=PDF_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return prefix + '.png'
+
+
+def _open_image(path, largest):
+    image = Image.open(path)
+    # Let the JPEG decoder downscale while decoding; far cheaper for big photos
+    image.draft('RGB', (largest * 2, largest * 2))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def render_derivatives(source, dest_prefix, kind, widths, fmt='WEBP', quality=80):
+    """
+    Write resized copies of an image (or a PDF's first page) as <dest_prefix>-w<width>.<ext>.
+
+    Images are never upscaled, so a small original may produce no files.
+    Returns a list of {'path', 'width', 'height', 'size'} dicts.
+    """
+    ext = 'jpg' if fmt == 'JPEG' else fmt.lower()
+    with tempfile.TemporaryDirectory() as workdir:
+        if kind == 'pdf':
+            source = pdf_first_page(source, workdir)
+            if source is None:
+                return []
+        image = _open_image(source, max(widths))
+        if fmt == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+
+        results = []
+        for width in sorted(widths):
+            if width >= image.width and kind != 'pdf':
+                break
+            copy = image.copy()
+            copy.thumbnail((width, width * 4), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            path = f"{dest_prefix}-w{width}.{ext}"
+            copy.save(path, fmt, quality=quality, optimize=True)
+            results.append({'path': path, 'width': copy.width, 'height': copy.height, 'size': os.path.getsize(path)})
+            if copy.width < width:
+                # The page was narrower than this width; larger sizes would be identical
+                break
+        return results
+
+
+def render_avatars(fileobj, sizes, max_size, fmt='WEBP', quality=85):
+    """
+    Square-crop a profile picture (honouring EXIF orientation) and encode it.
+
+    Returns {'master': bytes} for a copy at most max_size pixels wide plus
+    one {size: bytes} item per avatar size. Metadata is not carried over.
+    """
+    image = _open_image(fileobj, max_size)
+    if fmt == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    side = min(image.width, image.height, max_size)
+    square = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+
+    encoded = {}
+    for label, size in [('master', side)] + [(size, min(size, side)) for size in sizes]:
+        buffer = io.BytesIO()
+        copy = square if size == side else square.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        copy.save(buffer, fmt, quality=quality, optimize=True)
+        encoded[label] = buffer.getvalue()
+    return encoded
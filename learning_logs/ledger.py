@@ -0,0 +1,95 @@
+"""Daily spend ledger.
+
+DailySpend holds one row per (user, local day, category) with the summed
+amount and number of expenses. The Expense signals in models.py keep it in
+step inside the expense's own transaction, so finance views can read charts
+and totals from a handful of ledger rows instead of aggregating Expense.
+"""
+from collections import defaultdict
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySpend, Expense
+
+
+def expense_day(expense):
+    """The local calendar day an expense is booked under."""
+    return timezone.localdate(expense.date_added)
+
+
+def adjust_daily_spend(user_id, day, category, amount, count):
+    """Atomically add amount/count to a ledger row, creating it if needed."""
+    rows = DailySpend.objects.filter(user_id=user_id, day=day, category=category)
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        return
+    if count <= 0:
+        # Nothing booked to take away from; rebuild_spend_ledger repairs any drift
+        return
+    try:
+        with transaction.atomic():
+            DailySpend.objects.create(user_id=user_id, day=day, category=category, total=amount, count=count)
+    except IntegrityError:
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def rebuild_spend_ledger(user=None, expense_model=Expense, ledger_model=DailySpend, databases=(None,)):
+    """Recompute ledger rows from Expense (optionally for one user), read from each of `databases`."""
+    expenses = expense_model.objects.all()
+    ledger = ledger_model.objects.all()
+    if user is not None:
+        expenses = expenses.filter(owner=user)
+        ledger = ledger.filter(user=user)
+    rows = expenses.annotate(day=TruncDate('date_added')).values('owner_id', 'day', 'category').annotate(
+        total=Sum('amount'), count=Count('id'),
+    ).order_by()
+    # A user's expenses are all in one database, so the per-database groups never overlap
+    rows = [row for using in databases for row in (rows.using(using) if using else rows)]
+    with transaction.atomic():
+        ledger.delete()
+        ledger_model.objects.bulk_create([
+            ledger_model(user_id=row['owner_id'], day=row['day'], category=row['category'],
+                         total=row['total'], count=row['count'])
+            for row in rows
+        ], batch_size=500)
+
+
+def spending_summary(user, today=None, chart_days=7):
+    """
+    Read chart, category pie, today's and this month's spending in one query.
+
+    Returns a dict with `chart` (list of (day, total) for the last chart_days
+    days), `by_category` (month totals, largest first), `today_total`,
+    `month_total` and `today_count`.
+    """
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    chart_start = today - datetime.timedelta(days=chart_days - 1)
+    rows = DailySpend.objects.filter(
+        user=user, day__gte=min(month_start, chart_start), day__lte=today, count__gt=0,
+    ).values_list('day', 'category', 'total', 'count')
+
+    per_day = defaultdict(Decimal)
+    per_category = defaultdict(Decimal)
+    today_count = 0
+    for day, category, total, count in rows:
+        per_day[day] += total
+        if day >= month_start:
+            per_category[category] += total
+        if day == today:
+            today_count += count
+
+    chart = [(day, per_day[day]) for day in
+             (chart_start + datetime.timedelta(days=i) for i in range(chart_days))]
+    by_category = sorted(per_category.items(), key=lambda item: item[1], reverse=True)
+    return {
+        'chart': chart,
+        'by_category': by_category,
+        'today_total': per_day[today],
+        'month_total': sum(per_category.values(), Decimal('0')),
+        'today_count': today_count,
+    }
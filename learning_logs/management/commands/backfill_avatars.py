@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from learning_logs.avatars import DEFAULT_IMAGE, avatar_settings, save_avatar
+from learning_logs.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Resize existing profile pictures into normalized, hashed avatar files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Re-render profiles that already have avatars (e.g. after changing AVATARS sizes).")
+
+    def handle(self, *args, **options):
+        sizes = {str(size) for size in avatar_settings()['SIZES']}
+        done = skipped = failed = 0
+        for profile in Profile.objects.exclude(image='').exclude(image=DEFAULT_IMAGE).iterator():
+            if not options['force'] and set(profile.avatars) >= sizes:
+                skipped += 1
+                continue
+            if not profile.image.storage.exists(profile.image.name):
+                failed += 1
+                self.stderr.write(f"Missing picture for {profile}: {profile.image.name}")
+                continue
+            try:
+                with profile.image.open('rb') as picture:
+                    save_avatar(profile, picture)
+            except (OSError, UnidentifiedImageError) as e:
+                failed += 1
+                self.stderr.write(f"Could not resize picture for {profile}: {e}")
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f"Resized {done} profile pictures ({skipped} already done, {failed} failed)."))
@@ -0,0 +1,45 @@
+import mimetypes
+
+from django.core.management.base import BaseCommand
+
+from learning_logs.models import MediaVault
+from learning_logs.sharding import row_databases
+from learning_logs.vault import attachment_type, file_digest, store_blob
+
+
+class Command(BaseCommand):
+    help = (
+        "Move legacy MediaVault uploads (diary_vault/...) into content-addressed blobs, "
+        "storing identical files once. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true',
+                            help="Leave the legacy files in MEDIA_ROOT after moving them.")
+
+    def handle(self, *args, **options):
+        moved = missing = 0
+        legacy = (
+            attachment
+            for using in row_databases()
+            for attachment in MediaVault.objects.using(using).filter(blob__isnull=True).exclude(file='').iterator()
+        )
+        for attachment in legacy:
+            if not attachment.file.storage.exists(attachment.file.name):
+                missing += 1
+                self.stderr.write(f"Missing file for attachment {attachment.pk}: {attachment.file.name}")
+                continue
+            name = attachment.file.name
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            with attachment.file.open('rb') as content:
+                digest, size = file_digest(content)
+                content.seek(0)
+                attachment.blob = store_blob(content, digest, size, content_type)
+            attachment.original_name = attachment.original_name or name.rsplit('/', 1)[-1]
+            attachment.file_type = attachment_type(content_type, name) or attachment.file_type
+            attachment.file = ''
+            attachment.save(update_fields=['blob', 'original_name', 'file_type', 'file'])
+            if not options['keep_originals']:
+                attachment.file.storage.delete(name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} attachments into the vault ({missing} missing)."))
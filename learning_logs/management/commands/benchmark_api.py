@@ -0,0 +1,124 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from learning_logs.management.commands.benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests per second of the calendar and autosave endpoints under concurrent "
+        "clients: the sync views through the WSGI handler (one thread per client) against the "
+        "async api/v2/ views through the ASGI handler (one task per client). Both run in-process "
+        "through Django's test clients, so server and network overhead are left out. Stale (409) "
+        "autosaves are reported apart from successful ones. Seed data first with seed_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='seed_0', help="Username to benchmark as.")
+        parser.add_argument('--clients', type=int, default=50, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=20, help="Requests per client.")
+        parser.add_argument('--endpoints', default='calendar,autosave',
+                            help="Comma-separated subset of: calendar, autosave.")
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist; run seed_data first.")
+        if options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError("--clients and --requests must be at least 1.")
+        endpoints = options['endpoints'].split(',')
+        unknown = [name for name in endpoints if name not in ('calendar', 'autosave')]
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(unknown)}")
+
+        # Revisions only have to increase; concurrent saves of one draft still race, and the
+        # losers' stale (409) replies are counted apart from the saves that went through
+        self.revisions = itertools.count(int(time.time() * 1000))
+        self.stdout.write(
+            "In-process test clients: no server, sockets or worker processes are involved, so these "
+            "figures compare the WSGI and ASGI handlers only. Benchmark real servers (e.g. gunicorn "
+            "against uvicorn) before drawing deployment conclusions."
+        )
+        for name in endpoints:
+            for mode in ('wsgi', 'asgi'):
+                run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+                timings, statuses, elapsed = run(name, options['clients'], options['requests'])
+                self.report(name, mode, timings, statuses, elapsed)
+
+    def request_args(self, name, mode):
+        """(method, url, kwargs) of the next request to send."""
+        today = timezone.localdate()
+        if name == 'calendar':
+            view = 'learning_logs:calendar_data' if mode == 'wsgi' else 'learning_logs:calendar_month_api'
+            return 'get', f"{reverse(view)}?year={today.year}&month={today.month}", {}
+        revision = next(self.revisions)
+        content = f"Benchmark draft {revision}"
+        if mode == 'wsgi':
+            return 'post', reverse('learning_logs:autosave_entry'), {
+                'data': {'draft_key': 'new', 'revision': revision, 'content': content},
+            }
+        return 'post', reverse('learning_logs:autosave_api'), {
+            'data': json.dumps({'draft_key': 'new', 'revision': revision, 'changes': {'content': content}}),
+            'content_type': 'application/json',
+        }
+
+    def run_wsgi(self, name, clients, requests):
+        def worker(_):
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(self.user)
+            results = []
+            try:
+                for _ in range(requests):
+                    method, url, kwargs = self.request_args(name, 'wsgi')
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, **kwargs)
+                    results.append(((time.perf_counter() - start) * 1000, response.status_code))
+            finally:
+                # Each worker thread opened its own connections
+                connections.close_all()
+            return results
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = [row for rows in pool.map(worker, range(clients)) for row in rows]
+        return [ms for ms, _ in results], [status for _, status in results], time.perf_counter() - start
+
+    def run_asgi(self, name, clients, requests):
+        async def worker():
+            client = AsyncClient(HTTP_HOST='localhost')
+            await client.aforce_login(self.user)
+            results = []
+            for _ in range(requests):
+                method, url, kwargs = self.request_args(name, 'asgi')
+                start = time.perf_counter()
+                response = await getattr(client, method)(url, **kwargs)
+                results.append(((time.perf_counter() - start) * 1000, response.status_code))
+            return results
+
+        async def main():
+            return await asyncio.gather(*(worker() for _ in range(clients)))
+
+        start = time.perf_counter()
+        results = [row for rows in asyncio.run(main()) for row in rows]
+        return [ms for ms, _ in results], [status for _, status in results], time.perf_counter() - start
+
+    def report(self, name, mode, timings, statuses, elapsed):
+        ok = sum(1 for status in statuses if 200 <= status < 300)
+        stale = statuses.count(409)
+        failed = len(statuses) - ok - stale
+        self.stdout.write(
+            f"{name:<9} {mode}  rps={len(timings) / elapsed:>8.1f} ok_rps={ok / elapsed:>8.1f} "
+            f"p50={percentile(timings, 50):>8.1f}ms p95={percentile(timings, 95):>8.1f}ms "
+            f"ok={ok} stale={stale} failed={failed}"
+        )
@@ -0,0 +1,146 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Exercise the main views through the test client and report query counts, "
+        "p50/p95 latency and peak memory per view. Seed data first with seed_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='seed_0', help="Username to benchmark as.")
+        parser.add_argument('--runs', type=int, default=20, help="Timed requests per view.")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per view.")
+        parser.add_argument('--cold', action='store_true',
+                            help="Clear the cache before every request (measure uncached cost).")
+        parser.add_argument('--views', help="Comma-separated subset of view names to run.")
+        parser.add_argument('--save-baseline', metavar='PATH', help="Write the results as a JSON baseline.")
+        parser.add_argument('--compare', metavar='PATH', help="Compare against a JSON baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative p95 slowdown before a regression is reported.")
+
+    def targets(self):
+        today = timezone.localdate()
+        return {
+            'dashboard': reverse('learning_logs:dashboard'),
+            'index': reverse('learning_logs:index'),
+            'expenses': reverse('learning_logs:expenses'),
+            'entry_list': reverse('learning_logs:entry_list'),
+            'calendar': reverse('learning_logs:calendar'),
+            'calendar_data': f"{reverse('learning_logs:calendar_data')}?year={today.year}&month={today.month}",
+            'export_data': reverse('learning_logs:export_data'),
+        }
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist; run seed_data first.")
+
+        targets = self.targets()
+        if options['views']:
+            names = options['views'].split(',')
+            unknown = [name for name in names if name not in targets]
+            if unknown:
+                raise CommandError(f"Unknown views: {', '.join(unknown)}")
+            targets = {name: targets[name] for name in names}
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        results = {}
+        for name, url in targets.items():
+            results[name] = self.measure(client, url, options)
+            row = results[name]
+            self.stdout.write(
+                f"{name:<14} queries={row['queries']:<4} p50={row['p50_ms']:>8.1f}ms "
+                f"p95={row['p95_ms']:>8.1f}ms peak={row['peak_kb']:>8.0f}KiB"
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save_baseline']}"))
+
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def request(self, client, url, cold):
+        if cold:
+            cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"{url} returned {response.status_code}")
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+        return response
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            self.request(client, url, options['cold'])
+
+        timings, queries = [], []
+        for _ in range(options['runs']):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                self.request(client, url, options['cold'])
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+
+        # Memory is traced in a separate pass; tracemalloc would skew the timings
+        tracemalloc.start()
+        self.request(client, url, options['cold'])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'queries': max(queries),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, results, path, tolerance):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {path}: {e}")
+
+        regressions = []
+        for name, row in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if row['queries'] > base['queries']:
+                regressions.append(f"{name}: queries {base['queries']} -> {row['queries']}")
+            if row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {row['p95_ms']}ms")
+            if row['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+                regressions.append(f"{name}: peak memory {base['peak_kb']}KiB -> {row['peak_kb']}KiB")
+
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}."))
@@ -0,0 +1,53 @@
+import datetime
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from learning_logs.models import MediaBlob
+from learning_logs.storage import vault_storage
+from learning_logs.vault import discard_unreferenced_file
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete MediaVault blob files that no MediaBlob row refers to, e.g. left behind "
+        "when the transaction of an upload rolled back after its file was written. "
+        "Files newer than --min-age are kept, since their upload may not have committed yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=24,
+                            help="Only delete files last modified at least this many hours ago.")
+        parser.add_argument('--dry-run', action='store_true', help="List orphaned files without deleting them.")
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError("--min-age must not be negative.")
+        storage = vault_storage()
+        cutoff = timezone.now() - datetime.timedelta(hours=options['min_age'])
+        deleted = 0
+        for name in self.blob_names(storage):
+            digest = name.rsplit('/', 1)[-1]
+            if storage.get_modified_time(name) > cutoff or MediaBlob.objects.filter(sha256=digest).exists():
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                # Rechecks the row under the write lock, so a concurrent upload keeps its file
+                discard_unreferenced_file(digest)
+            deleted += 1
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} orphaned blob files."))
+
+    def blob_names(self, storage):
+        """Names of the blob files in the ab/cd/<digest> layout; derivatives are skipped."""
+        if not storage.exists(''):
+            return
+        for first in storage.listdir('')[0]:
+            for second in storage.listdir(first)[0]:
+                for filename in storage.listdir(f"{first}/{second}")[1]:
+                    if _DIGEST_RE.match(filename):
+                        yield f"{first}/{second}/{filename}"
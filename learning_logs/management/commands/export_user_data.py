@@ -0,0 +1,51 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from learning_logs.export import CHUNK_SIZE, EXPORTS, FORMATS, parse_since, stream_export
+from learning_logs.sharding import pin_user
+
+
+class Command(BaseCommand):
+    help = "Stream a user's diary and finance data to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--include', default='entries',
+                            help=f"Comma-separated datasets: {', '.join(EXPORTS)} (default: entries).")
+        parser.add_argument('--since', help="Only export rows added or changed since this ISO date/datetime.")
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output stream.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--output', '-o', help="Output file (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        include = [name for name in options['include'].split(',') if name]
+        unknown = [name for name in include if name not in EXPORTS]
+        if unknown or not include:
+            raise CommandError(f"Unknown datasets: {', '.join(unknown) or '(none)'}")
+
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        with pin_user(user.pk):
+            blocks = stream_export(user, options['format'], include, since, options['gzip'],
+                                   options['chunk_size'])
+            if options['output']:
+                with open(options['output'], 'wb') as output:
+                    for block in blocks:
+                        output.write(block)
+            else:
+                for block in blocks:
+                    sys.stdout.buffer.write(block)
+                sys.stdout.buffer.flush()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from learning_logs.derivatives import delete_derivatives, generate_derivatives
+from learning_logs.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = (
+        "Render preview derivatives for MediaVault blobs that are still pending "
+        "(e.g. uploaded before the pipeline existed or while workers were down)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help="Also retry blobs whose rendering failed.")
+        parser.add_argument('--all', action='store_true', help="Re-render every blob, e.g. after changing WIDTHS.")
+
+    def handle(self, *args, **options):
+        blobs = MediaBlob.objects.all()
+        if not options['all']:
+            statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+            blobs = blobs.filter(derivatives_status__in=statuses)
+
+        counts = {}
+        for blob in blobs.iterator():
+            if options['all']:
+                delete_derivatives(blob.file.storage, blob.derivatives)
+            status = generate_derivatives(blob, run_async=False)
+            counts[status] = counts.get(status, 0) + 1
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items(), key=lambda item: str(item[0])))
+        self.stdout.write(self.style.SUCCESS(f"Processed {sum(counts.values())} blobs ({summary or 'nothing to do'})."))
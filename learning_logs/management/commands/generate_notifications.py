@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from learning_logs.notifications import KEEP_DAYS, generate_notifications, prune_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Write today's bill reminders and no-expense nudges into the notifications inbox. "
+        "Safe to run repeatedly (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Treat this ISO date as today (default: today).")
+        parser.add_argument('--keep-days', type=int, default=KEEP_DAYS,
+                            help="Delete notifications that expired more than this many days ago.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+        if options['keep_days'] < 0:
+            raise CommandError("--keep-days must not be negative.")
+
+        generated = generate_notifications(today)
+        pruned = prune_notifications(today, options['keep_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {generated} notifications (duplicates ignored), pruned {pruned} expired."
+        ))
@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from learning_logs.models import ShardAssignment
+from learning_logs.sharding import pin, shard_aliases, sharded_models, sync_tags
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply migrations to 'default' and every shard database, copy the tag table into the "
+        "shards and keep users who already have rows in 'default' there. Run it after changing SHARD_COUNT."
+    )
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        call_command('migrate', database=DEFAULT_DB_ALIAS, interactive=False, verbosity=verbosity)
+        aliases = shard_aliases()
+        if not aliases:
+            self.stdout.write("SHARD_COUNT is 0; only 'default' was migrated.")
+            return
+
+        kept = self.keep_existing_users()
+        for alias in aliases:
+            self.stdout.write(f"Migrating {alias}")
+            # Data migrations use unrouted historical models; send every query to the shard
+            with pin(alias, all_models=True):
+                call_command('migrate', database=alias, interactive=False, verbosity=verbosity)
+            sync_tags(alias)
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {len(aliases)} shards; {kept} existing users stay in '{DEFAULT_DB_ALIAS}'."
+        ))
+
+    def keep_existing_users(self):
+        """Record users with unassigned rows in 'default' as living there."""
+        owners = set()
+        for model, lookup in sharded_models():
+            if '__' not in lookup:
+                owners.update(model.objects.using(DEFAULT_DB_ALIAS).values_list(f'{lookup}_id', flat=True).distinct())
+        owners -= set(ShardAssignment.objects.values_list('user_id', flat=True))
+        ShardAssignment.objects.bulk_create(
+            [ShardAssignment(user_id=user_id, alias=DEFAULT_DB_ALIAS) for user_id in sorted(owners)],
+            batch_size=500, ignore_conflicts=True,
+        )
+        return len(owners)
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from learning_logs.models import ShardAssignment
+from learning_logs.sharding import move_user, row_databases, shard_aliases, shard_for_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a user's diary, finance, attachment and access log rows to another database. "
+        "The user's rows get new ids there; every web worker routes the user to the new "
+        "database as soon as the move commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('target', nargs='?',
+                            help="Database alias to move to (default: the shard with the fewest users).")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+        if not shard_aliases():
+            raise CommandError("Sharding is off (SHARD_COUNT is 0).")
+
+        target = options['target'] or self.emptiest_shard()
+        if target not in row_databases():
+            raise CommandError(f"Unknown database '{target}'; choose one of {', '.join(row_databases())}.")
+        source = shard_for_user(user.pk)
+        if source == target:
+            self.stdout.write(f"{user.username} is already in {target}.")
+            return
+
+        copied = move_user(user, target)
+        self.stdout.write(self.style.SUCCESS(f"Moved {copied} rows of {user.username} from {source} to {target}."))
+
+    def emptiest_shard(self):
+        counts = dict(ShardAssignment.objects.values_list('alias').annotate(users=Count('id')))
+        return min(shard_aliases(), key=lambda alias: counts.get(alias, 0))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from learning_logs.recurring import CHUNK_SIZE, MAX_PERIODS, process_due_recurring_expenses
+
+
+class Command(BaseCommand):
+    help = (
+        "Turn due recurring expenses into Expense rows and advance their next due date. "
+        "Safe to run repeatedly (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Treat this ISO date as today (default: today).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="Schedules processed per transaction.")
+        parser.add_argument('--max-periods', type=int, default=MAX_PERIODS,
+                            help="Most missed periods booked per schedule per chunk.")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+        if options['chunk_size'] < 1 or options['max_periods'] < 1:
+            raise CommandError("--chunk-size and --max-periods must be at least 1.")
+
+        seen, created = process_due_recurring_expenses(today, options['chunk_size'], options['max_periods'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {seen} due schedules, created {created} expenses."))
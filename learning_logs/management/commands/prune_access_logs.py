@@ -0,0 +1,110 @@
+from collections import Counter, defaultdict
+import datetime
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from learning_logs.models import AccessLog, AccessLogRollup
+from learning_logs import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll AccessLog rows older than the retention window up into daily counts, "
+        "archive them to gzipped NDJSON files and delete them in bounded batches. "
+        "Each batch's archive is complete on disk before its rows are deleted, and is named "
+        "after its database, month and id range, so a rerun after a crash rewrites the same "
+        "file instead of appending the rows twice. Meant to be run periodically (e.g. nightly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ACCESS_LOG_RETENTION_DAYS,
+                            help="Keep raw rows newer than this many days.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows rolled up, archived and deleted per transaction.")
+        parser.add_argument('--archive-dir', default=str(settings.ACCESS_LOG_ARCHIVE_DIR),
+                            help="Directory for the accesslog-<database>-YYYY-MM-<first id>-<last id>.ndjson.gz files.")
+        parser.add_argument('--no-archive', action='store_true',
+                            help="Delete pruned rows without writing them to the archive.")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM the SQLite database afterwards to return freed pages.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be >= 0 and --batch-size >= 1.")
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        archive_dir = None if options['no_archive'] else Path(options['archive_dir'])
+        if archive_dir is not None:
+            archive_dir.mkdir(parents=True, exist_ok=True)
+
+        total = 0
+        for using in sharding.row_databases():
+            total += self.prune(using, cutoff, options['batch_size'], archive_dir)
+            connection = connections[using]
+            if options['vacuum'] and connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {total} access log rows older than {cutoff:%Y-%m-%d}."))
+
+    def prune(self, using, cutoff, batch_size, archive_dir):
+        """Roll up, archive and delete the old rows stored in one database."""
+        pruned = 0
+        logs = AccessLog.objects.using(using)
+        while True:
+            batch = list(
+                logs.filter(timestamp__lt=cutoff)
+                .order_by('id')
+                .values('id', 'user_id', 'timestamp', 'ip_address', 'action')[:batch_size]
+            )
+            if not batch:
+                return pruned
+            # Rollups live in 'default'; both commit together
+            with sharding.atomic(using):
+                self.rollup(batch)
+                if archive_dir is not None:
+                    self.archive(using, batch, archive_dir)
+                logs.filter(id__in=[row['id'] for row in batch]).delete()
+            pruned += len(batch)
+
+    def rollup(self, batch):
+        """Add the batch's per-user, per-day action counts to AccessLogRollup."""
+        counts = Counter(
+            (row['user_id'], timezone.localdate(row['timestamp']), row['action']) for row in batch
+        )
+        for (user_id, day, action), count in counts.items():
+            updated = AccessLogRollup.objects.filter(user_id=user_id, day=day, action=action)\
+                .update(count=F('count') + count)
+            if not updated:
+                AccessLogRollup.objects.create(user_id=user_id, day=day, action=action, count=count)
+
+    def archive(self, using, batch, archive_dir):
+        """Write the batch to one gzipped NDJSON file per month, named after its database and id range."""
+        by_month = defaultdict(list)
+        for row in batch:
+            by_month[row['timestamp'].strftime('%Y-%m')].append(row)
+        for month, rows in by_month.items():
+            # Ids are numbered per database, so shards get files of their own
+            path = archive_dir / f"accesslog-{using}-{month}-{rows[0]['id']:010d}-{rows[-1]['id']:010d}.ndjson.gz"
+            partial = path.with_name(f".{path.name}.partial")
+            with open(partial, 'wb') as file:
+                with gzip.GzipFile(fileobj=file, mode='wb') as archive:
+                    for row in rows:
+                        archive.write(json.dumps({
+                            'id': row['id'],
+                            'user_id': row['user_id'],
+                            'timestamp': row['timestamp'].isoformat(),
+                            'ip_address': row['ip_address'],
+                            'action': row['action'],
+                        }).encode() + b'\n')
+                # On disk before the DELETE commits; a crash in between leaves the rows to a rerun
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(partial, path)
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from learning_logs.models import MoodDailyRollup
+from learning_logs.rollups import rebuild_mood_rollups
+from learning_logs.sharding import user_databases
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily mood rollups from diary entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild rollups for this username.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        rebuild_mood_rollups(user, databases=user_databases(user))
+        rows = MoodDailyRollup.objects.filter(user=user) if user else MoodDailyRollup.objects.all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows.count()} mood rollup rows."))
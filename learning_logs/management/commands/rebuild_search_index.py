@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from learning_logs.models import Entry
+from learning_logs.search import clear_index, index_entries, use_fts
+from learning_logs.sharding import user_databases
+
+
+class Command(BaseCommand):
+    help = "Rebuild the diary entry full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild entries owned by this username.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Entries indexed per batch (default: 500).")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            try:
+                owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        batch_size = options['batch_size']
+        total = 0
+        databases = user_databases(owner)
+        for using in databases:
+            entries = Entry.objects.using(using).all()
+            if owner is not None:
+                entries = entries.filter(owner=owner)
+            entries = entries.prefetch_related('tags').order_by('pk')
+
+            # Each database holds its own entries' index rows
+            with transaction.atomic(using=using):
+                clear_index(owner, using=using)
+                batch = []
+                for entry in entries.iterator(chunk_size=batch_size):
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        index_entries(batch)
+                        total += len(batch)
+                        batch = []
+                index_entries(batch)
+                total += len(batch)
+
+        backend = 'FTS5' if use_fts(databases[-1]) else 'python'
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} entries ({backend} backend)."))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from learning_logs.models import DailySpend
+from learning_logs.ledger import rebuild_spend_ledger
+from learning_logs.sharding import user_databases
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily spend ledger from expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild the ledger for this username.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+        rebuild_spend_ledger(user, databases=user_databases(user))
+        rows = DailySpend.objects.filter(user=user) if user else DailySpend.objects.all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows.count()} ledger rows."))
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from learning_logs.models import UserStats
+
+
+class Command(BaseCommand):
+    help = "Recount per-user statistics from the source tables and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only reconcile this username.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        checked = repaired = 0
+        for user in users.iterator():
+            expected = UserStats.computed(user.pk)
+            stats, created = UserStats.objects.get_or_create(user=user, defaults=expected)
+            checked += 1
+            if created:
+                repaired += 1
+                continue
+            drift = {name: value for name, value in expected.items() if getattr(stats, name) != value}
+            if drift:
+                UserStats.objects.filter(pk=stats.pk).update(**drift)
+                repaired += 1
+                self.stdout.write(f"{user.username}: fixed {', '.join(sorted(drift))}")
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, repaired {repaired}."))
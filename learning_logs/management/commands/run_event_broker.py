@@ -0,0 +1,90 @@
+import asyncio
+import hmac
+
+from django.core.management.base import BaseCommand, CommandError
+
+from learning_logs.events import event_settings
+
+# Lines a slow subscriber may fall behind before it is disconnected
+MAX_BACKLOG = 1000
+# Seconds a new connection has to send its role and the shared secret
+HANDSHAKE_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Relay live events between server processes (a local stand-in for a pub/sub broker). "
+        "Point LIVE_EVENTS['BROKER'] at the address it listens on; clients must present "
+        "LIVE_EVENTS['BROKER_SECRET']."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('address', nargs='?', default='127.0.0.1:8765', help="host:port to listen on.")
+
+    def handle(self, *args, **options):
+        host, _, port = options['address'].rpartition(':')
+        try:
+            port = int(port)
+        except ValueError:
+            raise CommandError(f"Invalid address: {options['address']}")
+        secret = event_settings()['BROKER_SECRET']
+        if not secret:
+            raise CommandError("Set LIVE_EVENTS['BROKER_SECRET'] so only the app's processes can connect.")
+        self.secret = secret.encode()
+        self.subscribers = set()
+        try:
+            asyncio.run(self.serve(host or '127.0.0.1', port))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.connected, host, port)
+        self.stdout.write(self.style.SUCCESS(f"Relaying live events on {host}:{port}"))
+        async with server:
+            await server.serve_forever()
+
+    async def connected(self, reader, writer):
+        try:
+            handshake = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+            role, _, secret = handshake.strip().partition(b' ')
+            if not hmac.compare_digest(secret, self.secret):
+                return
+            if role == b'SUB':
+                await self.subscribe(reader, writer)
+            elif role == b'PUB':
+                async for line in reader:
+                    self.relay(line)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def subscribe(self, reader, writer):
+        queue = asyncio.Queue(MAX_BACKLOG)
+        self.subscribers.add(queue)
+        sender = asyncio.ensure_future(self.send(queue, writer))
+        try:
+            # Subscribers never send anything; EOF means they went away
+            await reader.read()
+        finally:
+            self.subscribers.discard(queue)
+            sender.cancel()
+
+    async def send(self, queue, writer):
+        while True:
+            line = await queue.get()
+            if line is None:
+                writer.close()
+                return
+            writer.write(line)
+            await writer.drain()
+
+    def relay(self, line):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(line)
+            except asyncio.QueueFull:
+                # Too far behind; it reconnects and its clients resync from their replay buffers
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
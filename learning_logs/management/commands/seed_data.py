@@ -0,0 +1,141 @@
+import datetime
+from decimal import Decimal
+import random
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from learning_logs.ledger import rebuild_spend_ledger
+from learning_logs.models import (Entry, Expense, Income, MoodHealthMatrix, RecurringExpense,
+                                  Tag, UserStats)
+from learning_logs.rollups import rebuild_mood_rollups
+from learning_logs.search import clear_index, index_entries
+from learning_logs import sharding
+from learning_logs.utils import bulk_insert
+
+WORDS = (
+    "leo nilikuwa kazini soko chakula familia safari mvua jua rafiki shule kitabu muziki "
+    "meeting project deadline coffee walk gym family dinner weekend travel idea plan "
+    "sleep early late happy tired focus reading writing garden market bus"
+).split()
+MOODS = [choice for choice, _ in Entry.MOOD_CHOICES] + ['']
+CATEGORIES = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+FREQUENCIES = [choice for choice, _ in RecurringExpense.FREQUENCY_CHOICES]
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic users with diary and finance data for load testing and benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--entries', type=int, default=1000, help="Entries per user.")
+        parser.add_argument('--tags', type=int, default=50, help="Size of the shared tag pool.")
+        parser.add_argument('--health', type=float, default=0.5,
+                            help="Fraction of entries that get a MoodHealthMatrix.")
+        parser.add_argument('--expenses', type=int, default=2000, help="Expenses per user.")
+        parser.add_argument('--incomes', type=int, default=100, help="Incomes per user.")
+        parser.add_argument('--recurring', type=int, default=10, help="Recurring expenses per user.")
+        parser.add_argument('--days', type=int, default=365, help="Spread rows over this many past days.")
+        parser.add_argument('--prefix', default='seed', help="Usernames are <prefix>_<n>.")
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for reproducible data.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        if options['users'] < 1:
+            raise CommandError("--users must be at least 1.")
+
+        tags = self.seed_tags(options['tags'])
+        password = make_password(options['password'])
+        for n in range(options['users']):
+            username = f"{options['prefix']}_{n}"
+            if User.objects.filter(username=username).exists():
+                raise CommandError(f"User '{username}' already exists; use another --prefix.")
+            with transaction.atomic():
+                user = User.objects.create(username=username, password=password)
+                with sharding.pin_user(user.pk) as using, sharding.atomic(using):
+                    self.seed_user(user, tags, rng, options, batch_size)
+            self.stdout.write(f"Seeded {username}")
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {options['users']} users."))
+
+    def seed_tags(self, count):
+        names = [f"tag{n}" for n in range(count)]
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        return list(Tag.objects.filter(name__in=names))
+
+    def random_moment(self, rng, days):
+        return timezone.now() - datetime.timedelta(seconds=rng.randint(0, days * 86400))
+
+    def sentence(self, rng, low, high):
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+    def seed_user(self, user, tags, rng, options, batch_size):
+        days = options['days']
+
+        entries = []
+        for _ in range(options['entries']):
+            created = self.random_moment(rng, days)
+            title = self.sentence(rng, 2, 6).capitalize()
+            entry_uuid = uuid.UUID(int=rng.getrandbits(128), version=4)
+            entries.append(Entry(
+                # bulk_insert bypasses Entry.save(), so fill in uuid and slug here
+                owner=user, title=title, uuid=entry_uuid, slug=slugify(f"{title}-{entry_uuid}"),
+                content=self.sentence(rng, 20, 200), mood=rng.choice(MOODS),
+                date_created=created, last_modified=created,
+                event_date=created + datetime.timedelta(hours=rng.randint(-48, 48)),
+            ))
+        bulk_insert(Entry, entries, batch_size=batch_size)
+
+        through = Entry.tags.through
+        links = []
+        for entry in entries:
+            for tag in rng.sample(tags, min(len(tags), rng.randint(0, 3))):
+                links.append(through(entry_id=entry.pk, tag_id=tag.pk))
+        through.objects.bulk_create(links, batch_size=batch_size, ignore_conflicts=True)
+
+        MoodHealthMatrix.objects.bulk_create([
+            MoodHealthMatrix(
+                entry=entry, heart_rate_avg=rng.randint(55, 110),
+                sleep_hours=Decimal(rng.randint(30, 100)) / 10,
+                water_intake_liters=Decimal(rng.randint(5, 40)) / 10,
+                mood_intensity=rng.randint(1, 10),
+            ) for entry in entries if rng.random() < options['health']
+        ], batch_size=batch_size)
+
+        bulk_insert(Expense, [
+            Expense(owner=user, title=self.sentence(rng, 1, 3), category=rng.choice(CATEGORIES),
+                    amount=Decimal(rng.randint(500, 500000)) / 100,
+                    date_added=self.random_moment(rng, days))
+            for _ in range(options['expenses'])
+        ], batch_size=batch_size)
+        bulk_insert(Income, [
+            Income(owner=user, source=self.sentence(rng, 1, 2), amount=Decimal(rng.randint(10000, 2000000)) / 100,
+                   date_added=self.random_moment(rng, days))
+            for _ in range(options['incomes'])
+        ], batch_size=batch_size)
+
+        today = timezone.localdate()
+        RecurringExpense.objects.bulk_create([
+            RecurringExpense(owner=user, title=self.sentence(rng, 1, 2), category=rng.choice(CATEGORIES),
+                             amount=Decimal(rng.randint(1000, 200000)) / 100, frequency=rng.choice(FREQUENCIES),
+                             next_due_date=today + datetime.timedelta(days=rng.randint(-10, 40)),
+                             reminder_active=rng.random() < 0.8)
+            for _ in range(options['recurring'])
+        ], batch_size=batch_size)
+
+        # Bulk inserts skip signals, so build the derived tables directly
+        clear_index(user)
+        for start in range(0, len(entries), batch_size):
+            chunk = Entry.objects.filter(pk__in=[entry.pk for entry in entries[start:start + batch_size]])
+            index_entries(chunk.prefetch_related('tags'))
+        rebuild_mood_rollups(user, databases=sharding.user_databases(user))
+        rebuild_spend_ledger(user, databases=sharding.user_databases(user))
+        UserStats.objects.update_or_create(user=user, defaults=UserStats.computed(user.pk))
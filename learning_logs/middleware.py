@@ -0,0 +1,196 @@
+"""Request-level performance instrumentation.
+
+PerformanceMiddleware is opt-in: it only activates when
+PERFORMANCE_MONITORING['ENABLED'] is True. For each request it records SQL
+query count and time, repeated queries (likely N+1 patterns), template
+render time and total wall time. It reports them in a Server-Timing header,
+logs slow requests with their queries, and aggregates per-URL-name stats for
+the staff-only performance_stats view.
+
+Template timing wraps Template.render only while a monitored request is in
+flight, and puts the original back once the last one finishes.
+"""
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import base as template_base
+
+logger = logging.getLogger('learning_logs.performance')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SLOW_REQUEST_MS': 500,
+    'DUPLICATE_QUERY_THRESHOLD': 3,
+    'SAMPLES_PER_URL': 1000,
+}
+
+_current = contextvars.ContextVar('performance_request', default=None)
+
+
+def monitoring_settings():
+    return {**DEFAULTS, **getattr(settings, 'PERFORMANCE_MONITORING', {})}
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def duplicates(self, threshold):
+        """SQL statements (ignoring parameters) run at least `threshold` times."""
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count >= threshold}
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        metrics.sql_ms += duration
+        metrics.queries.append((sql, duration))
+
+
+_template_lock = threading.Lock()
+_template_timing = {'requests': 0, 'render': None}
+
+
+def _timed_template_render(self, context):
+    render = _template_timing['render']
+    metrics = _current.get()
+    if metrics is None:
+        return render(self, context)
+    # Only the outermost render counts; includes and extends render nested templates
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return render(self, context)
+    finally:
+        metrics.template_depth -= 1
+        if metrics.template_depth == 0:
+            metrics.template_ms += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def timed_templates():
+    """Time Template.render while at least one monitored request is being handled."""
+    with _template_lock:
+        if _template_timing['requests'] == 0:
+            _template_timing['render'] = template_base.Template.render
+            template_base.Template.render = _timed_template_render
+        _template_timing['requests'] += 1
+    try:
+        yield
+    finally:
+        with _template_lock:
+            _template_timing['requests'] -= 1
+            if _template_timing['requests'] == 0:
+                template_base.Template.render = _template_timing['render']
+
+
+class PerformanceStats:
+    """Thread-safe, bounded per-URL-name samples of recent requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(deque)
+        self._counts = Counter()
+
+    def add(self, name, total_ms, query_count, sql_ms, limit):
+        with self._lock:
+            samples = self._samples[name]
+            samples.append((total_ms, query_count, sql_ms))
+            while len(samples) > limit:
+                samples.popleft()
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            items = [(name, list(samples), self._counts[name]) for name, samples in self._samples.items()]
+        report = {}
+        for name, samples, count in items:
+            totals = sorted(sample[0] for sample in samples)
+            report[name] = {
+                'requests': count,
+                'sampled': len(samples),
+                'p50_ms': _percentile(totals, 50),
+                'p95_ms': _percentile(totals, 95),
+                'p99_ms': _percentile(totals, 99),
+                'max_ms': round(totals[-1], 2),
+                'avg_queries': round(sum(sample[1] for sample in samples) / len(samples), 2),
+                'avg_sql_ms': round(sum(sample[2] for sample in samples) / len(samples), 2),
+            }
+        return report
+
+
+def _percentile(ordered, pct):
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 2)
+
+
+request_stats = PerformanceStats()
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        if not monitoring_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = monitoring_settings()
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                stack.enter_context(timed_templates())
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        duplicates = metrics.duplicates(options['DUPLICATE_QUERY_THRESHOLD'])
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.sql_ms:.1f};desc="{len(metrics.queries)} queries"',
+            f'tpl;dur={metrics.template_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        if duplicates:
+            response['X-Duplicate-Queries'] = str(sum(duplicates.values()))
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match and match.view_name else request.path
+        request_stats.add(name, total_ms, len(metrics.queries), metrics.sql_ms,
+                              options['SAMPLES_PER_URL'])
+
+        if total_ms >= options['SLOW_REQUEST_MS'] or duplicates:
+            self.log(request, name, total_ms, metrics, duplicates, options)
+        return response
+
+    def log(self, request, name, total_ms, metrics, duplicates, options):
+        lines = [
+            f"{request.method} {request.path} ({name}) took {total_ms:.1f}ms: "
+            f"{len(metrics.queries)} queries in {metrics.sql_ms:.1f}ms, templates {metrics.template_ms:.1f}ms"
+        ]
+        for sql, count in duplicates.items():
+            lines.append(f"  possible N+1 ({count}x): {sql}")
+        if total_ms >= options['SLOW_REQUEST_MS']:
+            for sql, duration in sorted(metrics.queries, key=lambda query: query[1], reverse=True)[:10]:
+                lines.append(f"  {duration:7.1f}ms  {sql}")
+        logger.warning('\n'.join(lines))
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+CREATE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS learning_logs_entry_fts USING fts5("
+    "title, content, tags, mood, owner_id UNINDEXED, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+BACKFILL_FTS = (
+    "INSERT INTO learning_logs_entry_fts (rowid, title, content, tags, mood, owner_id) "
+    "SELECT e.id, e.title, e.content, "
+    "COALESCE((SELECT group_concat(t.name, ' ') FROM learning_logs_entry_tags et "
+    "JOIN learning_logs_tag t ON t.id = et.tag_id WHERE et.entry_id = e.id), ''), "
+    "e.mood, e.owner_id FROM learning_logs_entry e"
+)
+DROP_FTS = "DROP TABLE IF EXISTS learning_logs_entry_fts"
+
+
+class RunFTS5SQL(migrations.RunSQL):
+    """RunSQL on SQLite builds with FTS5 only; elsewhere search uses the SearchTerm index."""
+
+    def _has_fts5(self, connection):
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            return bool(cursor.fetchone()[0])
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if self._has_fts5(schema_editor.connection):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if self._has_fts5(schema_editor.connection):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0012_searchterm'),
+    ]
+
+    operations = [
+        RunFTS5SQL([CREATE_FTS, BACKFILL_FTS], DROP_FTS),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_mood_rollups(apps, schema_editor):
+    from learning_logs.rollups import rebuild_mood_rollups
+
+    rebuild_mood_rollups(
+        entry_model=apps.get_model('learning_logs', 'Entry'),
+        rollup_model=apps.get_model('learning_logs', 'MoodDailyRollup'),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0016_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoodDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('mood', models.CharField(max_length=50)),
+                ('entry_count', models.IntegerField(default=0)),
+                ('intensity_sum', models.IntegerField(default=0)),
+                ('intensity_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'mood'), name='unique_mood_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_mood_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_spend_ledger(apps, schema_editor):
+    from learning_logs.ledger import rebuild_spend_ledger
+
+    rebuild_spend_ledger(
+        expense_model=apps.get_model('learning_logs', 'Expense'),
+        ledger_model=apps.get_model('learning_logs', 'DailySpend'),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0017_mooddailyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('Chakula', 'Chakula'), ('Usafiri', 'Usafiri'), ('Mawasiliano', 'Mawasiliano'), ('Burudani', 'Burudani'), ('Dharura', 'Dharura'), ('Mengineyo', 'Mengineyo')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category'), name='unique_daily_spend')],
+            },
+        ),
+        migrations.RunPython(populate_spend_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0020_recurring_payments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bill', 'Bill reminder'), ('no_expense', 'No expense today'), ('milestone', 'Milestone')], max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('dedupe_key', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_on', models.DateField(blank=True, null=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'read_at', 'created_at'], name='notification_inbox_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'dedupe_key'), name='unique_notification')],
+            },
+        ),
+    ]
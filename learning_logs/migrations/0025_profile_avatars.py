@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0024_mediablob_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatars',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
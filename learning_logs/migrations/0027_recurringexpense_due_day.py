@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:26
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay
+
+
+def set_due_days(apps, schema_editor):
+    # Dates already clamped to a short month can't be told apart; they keep the day they have
+    RecurringExpense = apps.get_model('learning_logs', 'RecurringExpense')
+    RecurringExpense.objects.using(schema_editor.connection.alias).update(due_day=ExtractDay('next_due_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learning_logs', '0026_shardassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringexpense',
+            name='due_day',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_due_days, migrations.RunPython.noop),
+    ]
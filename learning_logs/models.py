@@ -1,10 +1,14 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 import uuid
-from django.db.models.signals import post_save
+from decimal import Decimal
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
+from django.db.models.functions import Greatest
+from .storage import vault_storage
+from . import sharding
 
 class Topic(models.Model):
     """A topic the user is learning about."""
@@ -52,6 +56,18 @@ class Entry(models.Model):
     class Meta:
         verbose_name_plural = 'entries'
         ordering = ['-date_created']
+        indexes = [
+            models.Index(fields=['owner', 'date_created'], name='entry_owner_created_idx'),
+            models.Index(fields=['owner', 'event_date'], name='entry_owner_event_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember stored values so a move or mood change can update the old month/day too
+        instance._loaded_event_date = instance.__dict__.get('event_date')
+        instance._loaded_mood = instance.__dict__.get('mood')
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.uuid:
@@ -59,6 +75,8 @@ class Entry(models.Model):
         if not self.slug:
             self.slug = slugify(f"{self.title}-{self.uuid}")
         super().save(*args, **kwargs)
+        # Every post_save receiver has seen the previous date by now; the next save compares to this one
+        self._loaded_event_date = self.event_date
         
     def __str__(self):
         """Return a string representation of the model."""
@@ -76,31 +94,256 @@ class MoodHealthMatrix(models.Model):
     water_intake_liters = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
     mood_intensity = models.IntegerField(default=5) # 1-10 scale
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_intensity = instance.__dict__.get('mood_intensity')
+        return instance
+
+class MoodDailyRollup(models.Model):
+    """Per-user, per-day, per-mood entry counts backing the sentiment trend."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    mood = models.CharField(max_length=50)
+    entry_count = models.IntegerField(default=0)
+    intensity_sum = models.IntegerField(default=0)
+    intensity_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'mood'], name='unique_mood_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.day} {self.mood} x{self.entry_count}"
+
+class MediaBlob(models.Model):
+    """Content-addressed file, stored once and shared by every attachment with the same bytes."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(storage=vault_storage, max_length=100)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    # Number of MediaVault rows pointing here; the file is deleted when it drops to zero
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Resized previews written next to the file: {"<width>": {"name", "width", "height", "size", "content_type"}}
+    derivatives = models.JSONField(default=dict, blank=True)
+    derivatives_status = models.CharField(max_length=10, default='pending', choices=[
+        ('pending', 'Pending'), ('ready', 'Ready'), ('none', 'Not applicable'), ('failed', 'Failed'),
+    ])
+
+    def __str__(self):
+        return self.sha256
+
+    def derivative_for(self, width):
+        """The smallest derivative at least `width` wide, else the largest one (or None)."""
+        items = sorted(self.derivatives.values(), key=lambda item: item['width'])
+        for item in items:
+            if item['width'] >= width:
+                return item
+        return items[-1] if items else None
+
 class MediaVault(models.Model):
     """Secure storage for entry attachments."""
     entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='media')
-    file = models.FileField(upload_to='diary_vault/%Y/%m/')
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments')
+    original_name = models.CharField(max_length=255, blank=True)
+    # Legacy per-upload copy; new attachments live in blob (see backfill_media_vault)
+    file = models.FileField(upload_to='diary_vault/%Y/%m/', blank=True)
     file_type = models.CharField(max_length=20, choices=[('image', 'Image'), ('audio', 'Audio'), ('pdf', 'PDF')])
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    def __str__(self):
+        return self.original_name or self.file.name
+
+    def preview_widths(self):
+        """Widths of the resized previews available for this attachment."""
+        if self.blob is None:
+            return []
+        return sorted(item['width'] for item in self.blob.derivatives.values())
+
+class SearchTerm(models.Model):
+    """Inverted index row, used for search when SQLite FTS5 is unavailable."""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    field = models.CharField(max_length=10)
+    frequency = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'term'])]
+
+    def __str__(self):
+        return f"{self.term} ({self.field})"
+
 class AccessLog(models.Model):
     """Security audit trail."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     action = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['user', 'timestamp']),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.action}"
 
+class AccessLogRollup(models.Model):
+    """Per-user daily action counts kept after raw AccessLog rows are pruned."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    action = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'action'], name='unique_accesslog_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.action} x{self.count} ({self.day})"
+
+def _entry_days(instance):
+    """Return the local days an entry occupies, before and after a change."""
+    days = set()
+    for value in (getattr(instance, '_loaded_event_date', None), instance.event_date):
+        if value:
+            value = timezone.localtime(value) if timezone.is_aware(value) else value
+            days.add(value.date())
+    return days
+
+def _entry_months(instance):
+    """Return the (year, month) pairs an entry occupies, before and after a change."""
+    return {(day.year, day.month) for day in _entry_days(instance)}
+
 @receiver(post_save, sender=Entry)
-def check_milestones(sender, instance, created, **kwargs):
-    """Trigger notification on milestone entries."""
-    if created:
-        count = Entry.objects.filter(owner=instance.owner).count()
-        if count % 100 == 0:
-            # In a real app, trigger email task here
-            print(f"Milestone reached: {count} entries for {instance.owner.username}")
+@receiver(post_delete, sender=Entry)
+def publish_entry_change(sender, instance, raw=False, **kwargs):
+    """Push the days an entry left or landed on to the owner's open calendars."""
+    if raw:
+        return
+    from .events import entries_changed
+    entries_changed(instance.owner_id, [instance.pk], _entry_days(instance), using=instance._state.db)
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def invalidate_calendar(sender, instance, **kwargs):
+    """Drop cached calendar months touched by a created, edited, moved or deleted entry, once committed."""
+    from .utils import invalidate_calendar_month
+    owner_id, months = instance.owner_id, _entry_months(instance)
+
+    def invalidate():
+        for year, month in months:
+            invalidate_calendar_month(owner_id, year, month)
+    # Before the commit, a concurrent request could cache the month again from the old rows
+    transaction.on_commit(invalidate, using=instance._state.db)
+
+@receiver(post_save, sender=Entry)
+def index_entry_for_search(sender, instance, raw=False, **kwargs):
+    """Keep the full-text index in step with the entry."""
+    if raw:
+        return
+    from .search import index_entry
+    index_entry(instance)
+
+@receiver(post_delete, sender=Entry)
+def remove_entry_from_search(sender, instance, **kwargs):
+    from .search import remove_entry
+    remove_entry(instance)
+
+@receiver(m2m_changed, sender=Entry.tags.through)
+def reindex_entry_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Reindex entries whose tag set changed."""
+    if reverse and action == 'pre_clear':
+        # Clearing a tag's entries doesn't report which entries were affected
+        instance._cleared_entry_ids = list(instance.entry_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .search import index_entry
+    if not reverse:
+        index_entry(instance)
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_entry_ids', None)
+    if pk_set:
+        for entry in Entry.objects.filter(pk__in=pk_set):
+            index_entry(entry)
+
+@receiver(post_save, sender=Tag)
+def reindex_renamed_tag(sender, instance, created, raw=False, **kwargs):
+    """A renamed tag changes the indexed text of every entry carrying it."""
+    if created or raw:
+        return
+    from .search import index_entry
+    for entry in instance.entry_set.all():
+        index_entry(entry)
+
+class Notification(models.Model):
+    """Precomputed reminder shown on the home page until read or expired."""
+    KIND_CHOICES = [
+        ('bill', 'Bill reminder'),
+        ('no_expense', 'No expense today'),
+        ('milestone', 'Milestone'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    message = models.CharField(max_length=255)
+    # Identifies what the notification is about so the generator job stays idempotent
+    dedupe_key = models.CharField(max_length=100)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_on = models.DateField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', 'read_at', 'created_at'], name='notification_inbox_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dedupe_key'], name='unique_notification'),
+        ]
+
+    def __str__(self):
+        return self.message
+
+    @classmethod
+    def inbox(cls, user, limit=10):
+        """Unread, unexpired notifications for a user, newest first."""
+        today = timezone.localdate()
+        return cls.objects.filter(user=user, read_at__isnull=True)\
+            .filter(models.Q(expires_on__isnull=True) | models.Q(expires_on__gte=today))\
+            .order_by('-created_at')[:limit]
+
+    @classmethod
+    def mark_read(cls, user, ids=None):
+        """Mark the user's unread notifications (or just `ids`) read in one UPDATE."""
+        unread = cls.objects.filter(user=user, read_at__isnull=True)
+        if ids is not None:
+            unread = unread.filter(pk__in=ids)
+        return unread.update(read_at=timezone.now())
+
+class EntryDraft(models.Model):
+    """Last persisted autosave state of an entry being written or edited."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='drafts')
+    # 'new' for an unsaved entry, 'entry-<pk>' while editing an existing one
+    key = models.CharField(max_length=50)
+    entry = models.ForeignKey(Entry, on_delete=models.CASCADE, null=True, blank=True)
+    title = models.CharField(max_length=200, blank=True)
+    content = models.TextField(blank=True)
+    mood = models.CharField(max_length=50, choices=Entry.MOOD_CHOICES, blank=True)
+    revision = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_entry_draft'),
+        ]
+
+    def __str__(self):
+        return f"Draft {self.key} of {self.user} (rev {self.revision})"
 
 class Expense(models.Model):
     CATEGORY_CHOICES = [
@@ -116,10 +359,53 @@ class Expense(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='Mengineyo')
     date_added = models.DateTimeField(auto_now_add=True)
+    # Set when the expense was materialized from a recurring bill
+    recurring_expense = models.ForeignKey('RecurringExpense', on_delete=models.SET_NULL, null=True, blank=True,
+                                          related_name='payments')
+    due_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'date_added'], name='expense_owner_added_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['recurring_expense', 'due_date'], name='unique_recurring_payment'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the ledger currently holds for this expense
+        instance._loaded_amount = instance.__dict__.get('amount')
+        instance._loaded_category = instance.__dict__.get('category')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The ledger receivers run inside the same transaction as the write
+        with sharding.atomic(router.db_for_write(Expense, instance=self)):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with sharding.atomic(router.db_for_write(Expense, instance=self)):
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
+class DailySpend(models.Model):
+    """Ledger of each user's spending per local day and category."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    category = models.CharField(max_length=20, choices=Expense.CATEGORY_CHOICES)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'category'], name='unique_daily_spend'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.day} {self.category}: {self.total}"
+
 class Income(models.Model):
     """Mapato yanayoingia (Mshahara, Biashara, n.k)."""
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -127,6 +413,9 @@ class Income(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date_added = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'date_added'], name='income_owner_added_idx')]
+
     def __str__(self):
         return f"{self.source} - {self.amount}"
 
@@ -154,14 +443,269 @@ class RecurringExpense(models.Model):
     category = models.CharField(max_length=20, choices=Expense.CATEGORY_CHOICES, default='Mengineyo')
     frequency = models.CharField(max_length=20, choices=FREQUENCY_CHOICES, default='Monthly')
     next_due_date = models.DateField()
+    # Day of month the bill falls due; dates clamped in shorter months return to it
+    due_day = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
     reminder_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'reminder_active', 'next_due_date'], name='recurring_owner_due_idx'),
+            models.Index(fields=['next_due_date', 'id'], name='recurring_due_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_next_due_date = instance.__dict__.get('next_due_date')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # A due date set by hand (not by the recurring job) sets the day of month
+        if self.due_day is None or self.next_due_date != getattr(self, '_loaded_next_due_date', None):
+            self.due_day = self.next_due_date.day
+        super().save(*args, **kwargs)
+        self._loaded_next_due_date = self.next_due_date
+
     def __str__(self):
         return f"{self.title} ({self.frequency}) - {self.amount}"
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='default.jpg', upload_to='profile_pics')
+    # Square avatar renditions by pixel size, e.g. {"64": "profile_pics/avatars/<user>-<hash>-64.webp"}
+    avatars = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f'{self.user.username} Profile'
+
+    @property
+    def avatar_urls(self):
+        """URL per avatar size for templates ({{ profile.avatar_urls.64 }}); the original until resized."""
+        from .avatars import avatar_settings
+        storage = self.image.storage
+        urls = {}
+        for size in avatar_settings()['SIZES']:
+            name = self.avatars.get(str(size))
+            urls[str(size)] = storage.url(name) if name else self.image.url
+        return urls
+
+class UserStats(models.Model):
+    """Denormalized per-user counters, kept current by the signals below."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    entry_count = models.PositiveIntegerField(default=0)
+    topic_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    last_entry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'user stats'
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+    @classmethod
+    def computed(cls, user_id):
+        """Count everything from the source tables (used on first use and to repair drift)."""
+        using = sharding.shard_for_user(user_id)
+        entries = Entry.objects.using(using).filter(owner_id=user_id)
+        return {
+            'entry_count': entries.count(),
+            'topic_count': Topic.objects.filter(owner_id=user_id).count(),
+            'expense_count': Expense.objects.using(using).filter(owner_id=user_id).count(),
+            'income_count': Income.objects.using(using).filter(owner_id=user_id).count(),
+            'last_entry_at': entries.aggregate(models.Max('date_created'))['date_created__max'],
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        """Return the user's stats row, building it from the source tables if missing."""
+        try:
+            return cls.objects.get(user=user)
+        except cls.DoesNotExist:
+            stats, _ = cls.objects.get_or_create(user=user, defaults=cls.computed(user.pk))
+            return stats
+
+class ShardAssignment(models.Model):
+    """The database holding a user's sharded rows (see learning_logs.sharding)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='shard')
+    alias = models.CharField(max_length=50)
+    assigned_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f'{self.user.username} Profile'
\ No newline at end of file
+        return f"{self.user_id} -> {self.alias}"
+
+def _bump_stats(user_id, created, **fields):
+    """Apply atomic F() increments; only a creation may build a missing row."""
+    updates = {name: Greatest(models.F(name) + delta, 0) if isinstance(delta, int) else delta
+               for name, delta in fields.items()}
+    if not UserStats.objects.filter(user_id=user_id).update(**updates) and created:
+        # The new row is already saved, so counting from scratch includes it
+        UserStats.objects.get_or_create(user_id=user_id, defaults=UserStats.computed(user_id))
+
+@receiver(post_save, sender=Entry)
+def count_new_entry(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump_stats(instance.owner_id, True, entry_count=1, last_entry_at=instance.date_created)
+
+@receiver(post_save, sender=Entry)
+def check_milestones(sender, instance, created, **kwargs):
+    """Trigger notification on milestone entries."""
+    if created:
+        count = UserStats.objects.filter(user_id=instance.owner_id)\
+            .values_list('entry_count', flat=True).first() or 0
+        if count and count % 100 == 0:
+            # In a real app, trigger email task here
+            note, created = Notification.objects.get_or_create(
+                user_id=instance.owner_id, dedupe_key=f"milestone:entries:{count}",
+                defaults={'kind': 'milestone', 'message': f"Hongera! Umefikisha kumbukumbu {count} kwenye shajara yako."},
+            )
+            if created:
+                from .events import publish_on_commit
+                publish_on_commit(instance.owner_id, 'milestone', {'id': note.pk, 'message': note.message})
+
+@receiver(post_save, sender=Expense)
+def clear_no_expense_nudge(sender, instance, created, raw=False, **kwargs):
+    """Recording an expense answers today's 'no expense yet' reminder."""
+    if created and not raw:
+        Notification.objects.filter(
+            user_id=instance.owner_id, kind='no_expense', read_at__isnull=True,
+        ).update(read_at=timezone.now())
+
+@receiver(post_delete, sender=Entry)
+def count_deleted_entry(sender, instance, **kwargs):
+    _bump_stats(instance.owner_id, False, entry_count=-1)
+    # Read the new latest entry first: with sharding it may live in another database than UserStats
+    latest = Entry.objects.db_manager(instance._state.db).filter(owner_id=instance.owner_id)\
+        .order_by('-date_created').values_list('date_created', flat=True).first()
+    UserStats.objects.filter(user_id=instance.owner_id, last_entry_at=instance.date_created)\
+        .update(last_entry_at=latest)
+
+STAT_FIELDS = {Topic: 'topic_count', Expense: 'expense_count', Income: 'income_count'}
+
+@receiver(post_save, sender=Topic)
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def count_new_row(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump_stats(instance.owner_id, True, **{STAT_FIELDS[sender]: 1})
+
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def count_deleted_row(sender, instance, **kwargs):
+    _bump_stats(instance.owner_id, False, **{STAT_FIELDS[sender]: -1})
+
+@receiver(post_save, sender=Entry)
+def roll_up_entry_mood(sender, instance, created, raw=False, **kwargs):
+    """Move the entry between mood rollup rows when it is created or its mood changes."""
+    if raw:
+        return
+    from .rollups import adjust_mood_rollup, entry_day
+    old_mood = None if created else getattr(instance, '_loaded_mood', instance.mood)
+    if old_mood == instance.mood:
+        return
+    day = entry_day(instance)
+    intensity = None
+    if not created:
+        intensity = MoodHealthMatrix.objects.filter(entry=instance).values_list('mood_intensity', flat=True).first()
+    if old_mood:
+        adjust_mood_rollup(instance.owner_id, day, old_mood, -1, -(intensity or 0), -(intensity is not None))
+    if instance.mood:
+        adjust_mood_rollup(instance.owner_id, day, instance.mood, 1, intensity or 0, intensity is not None)
+    instance._loaded_mood = instance.mood
+
+@receiver(post_delete, sender=Entry)
+def roll_up_deleted_entry(sender, instance, **kwargs):
+    # The health matrix (and its intensity) was removed by its own post_delete first
+    if instance.mood:
+        from .rollups import adjust_mood_rollup, entry_day
+        adjust_mood_rollup(instance.owner_id, entry_day(instance), instance.mood, -1)
+
+@receiver(post_save, sender=MoodHealthMatrix)
+def roll_up_intensity(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_loaded_intensity', instance.mood_intensity)
+    if old == instance.mood_intensity:
+        return
+    entry = instance.entry
+    if entry.mood:
+        from .rollups import adjust_mood_rollup, entry_day
+        adjust_mood_rollup(entry.owner_id, entry_day(entry), entry.mood, 0,
+                           instance.mood_intensity - (old or 0), int(created))
+    instance._loaded_intensity = instance.mood_intensity
+
+@receiver(post_delete, sender=MoodHealthMatrix)
+def roll_up_deleted_intensity(sender, instance, **kwargs):
+    entry = Entry.objects.filter(pk=instance.entry_id).only('owner', 'date_created', 'mood').first()
+    if entry is not None and entry.mood:
+        from .rollups import adjust_mood_rollup, entry_day
+        adjust_mood_rollup(entry.owner_id, entry_day(entry), entry.mood, 0, -instance.mood_intensity, -1)
+
+@receiver(post_save, sender=Expense)
+def post_expense_to_ledger(sender, instance, created, raw=False, **kwargs):
+    """Move an expense's amount into (or between) its daily ledger rows."""
+    if raw:
+        return
+    from .ledger import adjust_daily_spend, expense_day
+    day = expense_day(instance)
+    amount = Decimal(str(instance.amount))
+    if not created:
+        old_amount = getattr(instance, '_loaded_amount', amount)
+        old_category = getattr(instance, '_loaded_category', instance.category)
+        if old_amount == amount and old_category == instance.category:
+            return
+        adjust_daily_spend(instance.owner_id, day, old_category, -old_amount, -1)
+    adjust_daily_spend(instance.owner_id, day, instance.category, amount, 1)
+    instance._loaded_amount, instance._loaded_category = amount, instance.category
+
+@receiver(post_delete, sender=Expense)
+def remove_expense_from_ledger(sender, instance, **kwargs):
+    from .ledger import adjust_daily_spend, expense_day
+    amount = getattr(instance, '_loaded_amount', Decimal(str(instance.amount)))
+    category = getattr(instance, '_loaded_category', instance.category)
+    adjust_daily_spend(instance.owner_id, expense_day(instance), category, -amount, -1)
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+@receiver(post_save, sender=FinancialGoal)
+@receiver(post_delete, sender=FinancialGoal)
+@receiver(post_save, sender=RecurringExpense)
+@receiver(post_delete, sender=RecurringExpense)
+def invalidate_financial_summary(sender, instance, **kwargs):
+    """Retire cached financial summaries once the change is committed."""
+    from .finance import bump_finance_version
+    owner_id = instance.owner_id
+    # With sharding the row may have been written to a shard, in that database's transaction
+    transaction.on_commit(lambda: bump_finance_version(owner_id), using=instance._state.db)
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_delete, sender=Income)
+@receiver(post_save, sender=FinancialGoal)
+@receiver(post_delete, sender=FinancialGoal)
+@receiver(post_save, sender=RecurringExpense)
+@receiver(post_delete, sender=RecurringExpense)
+@receiver(post_save, sender=Profile)
+def bump_user_watermark(sender, instance, raw=False, **kwargs):
+    """Expire the user's conditional pages (see watermarks.py) once the change is committed."""
+    if raw:
+        return
+    from .watermarks import bump_watermark_on_commit
+    user_id = instance.user_id if sender is Profile else instance.owner_id
+    bump_watermark_on_commit(user_id, using=instance._state.db)
+
+@receiver(post_delete, sender=MediaVault)
+def release_media_blob(sender, instance, **kwargs):
+    """Drop the attachment's reference; the blob goes once nothing uses it."""
+    if instance.blob_id:
+        from .vault import release_blob
+        release_blob(instance.blob_id)
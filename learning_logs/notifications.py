@@ -0,0 +1,99 @@
+"""Precomputed reminders for the home page inbox.
+
+generate_notifications() is run periodically (see the generate_notifications
+command). It writes upcoming bill reminders and "no expense yet today"
+nudges into the Notification table, keyed by a dedupe_key so repeated runs
+on the same day insert nothing new. The home page then reads the inbox with
+one indexed query instead of rescanning bills on every hit. New reminders
+are also pushed to the user's open pages as 'reminder' events (see
+events.py); from a cron process they only reach the web servers through
+the LIVE_EVENTS broker.
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .events import publish
+from .models import DailySpend, Notification, RecurringExpense
+from .sharding import row_databases
+
+REMINDER_DAYS = 3
+ACTIVE_DAYS = 30
+KEEP_DAYS = 30
+BATCH_SIZE = 1000
+
+
+def bill_message(bill, today):
+    days_left = (bill.next_due_date - today).days
+    if days_left == 0:
+        return f"Kikumbusho: {bill.title} inatakiwa kulipwa leo (TZS {bill.amount})"
+    return f"Kikumbusho: {bill.title} inatakiwa kulipwa baada ya siku {days_left}"
+
+
+def bill_notifications(today):
+    """Reminders for active bills due within REMINDER_DAYS; the text changes daily."""
+    for using in row_databases():
+        bills = RecurringExpense.objects.using(using).filter(
+            reminder_active=True,
+            next_due_date__range=[today, today + datetime.timedelta(days=REMINDER_DAYS)],
+        ).only('id', 'owner_id', 'title', 'amount', 'next_due_date')
+        for bill in bills.iterator(chunk_size=BATCH_SIZE):
+            yield Notification(
+                user_id=bill.owner_id, kind='bill', message=bill_message(bill, today),
+                dedupe_key=f"bill:{bill.pk}:{bill.next_due_date}:{today}", expires_on=today,
+            )
+
+
+def no_expense_notifications(today):
+    """Nudges for recently active users who have not recorded an expense today."""
+    spent_today = DailySpend.objects.filter(user_id=OuterRef('pk'), day=today, count__gt=0)
+    users = User.objects.filter(
+        is_active=True,
+        last_login__gte=timezone.now() - datetime.timedelta(days=ACTIVE_DAYS),
+    ).exclude(Exists(spent_today)).values_list('pk', flat=True)
+    for user_id in users.iterator(chunk_size=BATCH_SIZE):
+        yield Notification(
+            user_id=user_id, kind='no_expense',
+            message="Leo bado hujaweka matumizi yako. Kumbuka kurekodi!",
+            dedupe_key=f"no_expense:{today}", expires_on=today,
+        )
+
+
+def prune_notifications(today, keep_days=KEEP_DAYS):
+    """Delete notifications that expired more than keep_days ago."""
+    deleted, _ = Notification.objects.filter(
+        expires_on__lt=today - datetime.timedelta(days=keep_days),
+    ).delete()
+    return deleted
+
+
+def insert_notifications(batch):
+    """Insert a batch, skipping existing dedupe keys, and push the new ones as events."""
+    existing = set(Notification.objects.filter(
+        user_id__in={notification.user_id for notification in batch},
+        dedupe_key__in={notification.dedupe_key for notification in batch},
+    ).values_list('user_id', 'dedupe_key'))
+    Notification.objects.bulk_create(batch, ignore_conflicts=True)
+    for notification in batch:
+        if (notification.user_id, notification.dedupe_key) not in existing:
+            publish(notification.user_id, 'reminder', {'kind': notification.kind, 'message': notification.message})
+
+
+def generate_notifications(today=None):
+    """Populate today's reminders; returns the number of rows the job tried to insert."""
+    today = today or timezone.localdate()
+    total = 0
+    for source in (bill_notifications(today), no_expense_notifications(today)):
+        batch = []
+        for notification in source:
+            batch.append(notification)
+            if len(batch) >= BATCH_SIZE:
+                insert_notifications(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            insert_notifications(batch)
+        total += len(batch)
+    return total
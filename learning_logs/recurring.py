@@ -0,0 +1,139 @@
+"""Materializing due recurring expenses.
+
+process_due_recurring_expenses() walks schedules whose next_due_date has
+passed in (next_due_date, id) order, a chunk at a time, turns every missed
+period into an Expense and advances next_due_date. Each chunk is one
+transaction, and a schedule is only advanced if its next_due_date is still
+the value that was read, so overlapping or repeated runs never book a
+period twice. With sharding, each database holding schedules is walked in
+turn.
+"""
+import calendar
+from collections import Counter, defaultdict
+import datetime
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .finance import bump_finance_version
+from .ledger import adjust_daily_spend
+from .models import Expense, RecurringExpense, UserStats
+from . import sharding
+from .utils import bulk_insert, day_bounds
+from .watermarks import bump_watermark_on_commit
+
+CHUNK_SIZE = 500
+MAX_PERIODS = 366
+
+
+def add_months(day, months, anchor_day=None):
+    """Shift a date by whole months to `anchor_day` (default: its own day), clamped to the month's end."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month,
+                       day=min(anchor_day or day.day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(day, frequency, periods=1, anchor_day=None):
+    """The due date `periods` steps after `day` for a RecurringExpense frequency."""
+    if frequency == 'Daily':
+        return day + datetime.timedelta(days=periods)
+    if frequency == 'Weekly':
+        return day + datetime.timedelta(weeks=periods)
+    if frequency == 'Yearly':
+        return add_months(day, 12 * periods, anchor_day)
+    return add_months(day, periods, anchor_day)
+
+
+def due_dates(schedule, today, max_periods=MAX_PERIODS):
+    """Every due date of a schedule up to today, plus the next date to wait for."""
+    dates = []
+    # Monthly bills due on the 31st fall on the 28th in February and on the 31st again in March
+    anchor_day = schedule.due_day or schedule.next_due_date.day
+    while len(dates) < max_periods:
+        day = next_occurrence(schedule.next_due_date, schedule.frequency, len(dates), anchor_day)
+        if day > today:
+            return dates, day
+        dates.append(day)
+    return dates, next_occurrence(schedule.next_due_date, schedule.frequency, len(dates), anchor_day)
+
+
+def _process_chunk(schedules, today, max_periods, using=DEFAULT_DB_ALIAS):
+    """Book and advance one chunk of schedules; returns the number of expenses created."""
+    planned = {}
+    for schedule in schedules:
+        dates, next_due = due_dates(schedule, today, max_periods)
+        if dates:
+            planned[schedule.pk] = (schedule, dates, next_due)
+    if not planned:
+        return 0
+
+    with sharding.atomic(using):
+        already_booked = set(Expense.objects.filter(
+            recurring_expense_id__in=planned,
+            due_date__lte=today,
+        ).values_list('recurring_expense_id', 'due_date'))
+
+        expenses = []
+        for schedule, dates, next_due in planned.values():
+            # Skip schedules another run advanced since we read them
+            if not RecurringExpense.objects.filter(pk=schedule.pk, next_due_date=schedule.next_due_date)\
+                    .update(next_due_date=next_due):
+                continue
+            for day in dates:
+                if (schedule.pk, day) in already_booked:
+                    continue
+                expenses.append(Expense(
+                    owner_id=schedule.owner_id, title=schedule.title, amount=schedule.amount,
+                    category=schedule.category, date_added=day_bounds(day)[0],
+                    recurring_expense_id=schedule.pk, due_date=day,
+                ))
+
+        bulk_insert(Expense, expenses, batch_size=CHUNK_SIZE)
+
+        # bulk_insert skips the Expense signals, so update the derived data here
+        ledger = defaultdict(lambda: [0, 0])
+        for expense in expenses:
+            row = ledger[(expense.owner_id, expense.due_date, expense.category)]
+            row[0] += expense.amount
+            row[1] += 1
+        for (owner_id, day, category), (total, count) in ledger.items():
+            adjust_daily_spend(owner_id, day, category, total, count)
+        for owner_id, count in Counter(expense.owner_id for expense in expenses).items():
+            UserStats.objects.filter(user_id=owner_id).update(expense_count=F('expense_count') + count)
+        for owner_id in {schedule.owner_id for schedule, _, _ in planned.values()}:
+            transaction.on_commit(lambda owner_id=owner_id: bump_finance_version(owner_id))
+            bump_watermark_on_commit(owner_id)
+    return len(expenses)
+
+
+def process_due_recurring_expenses(today=None, chunk_size=CHUNK_SIZE, max_periods=MAX_PERIODS):
+    """Materialize every due schedule; returns (schedules seen, expenses created)."""
+    today = today or timezone.localdate()
+    seen = created = 0
+    for using in sharding.row_databases():
+        with sharding.pin(using):
+            counts = _process_database(today, chunk_size, max_periods, using)
+        seen, created = seen + counts[0], created + counts[1]
+    return seen, created
+
+
+def _process_database(today, chunk_size, max_periods, using):
+    due = RecurringExpense.objects.using(using).filter(next_due_date__lte=today)\
+        .order_by('next_due_date', 'id')\
+        .only('id', 'owner_id', 'title', 'amount', 'category', 'frequency', 'next_due_date', 'due_day')
+    cursor = None
+    seen = created = 0
+    while True:
+        # Keyset walk over the (next_due_date, id) index keeps memory bounded
+        chunk = due
+        if cursor is not None:
+            chunk = due.filter(Q(next_due_date__gt=cursor[0]) | Q(next_due_date=cursor[0], id__gt=cursor[1]))
+        schedules = list(chunk[:chunk_size])
+        if not schedules:
+            break
+        cursor = (schedules[-1].next_due_date, schedules[-1].pk)
+        seen += len(schedules)
+        created += _process_chunk(schedules, today, max_periods, using)
+    return seen, created
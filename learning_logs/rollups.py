@@ -0,0 +1,100 @@
+"""Materialized mood rollups.
+
+MoodDailyRollup keeps one row per (user, day, mood) holding the number of
+entries and their summed MoodHealthMatrix intensity. The signals in
+models.py adjust these rows incrementally, so the sentiment trend for any
+range is read from the rollup table without touching Entry.
+"""
+from collections import defaultdict
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Entry, MoodDailyRollup
+
+MOOD_SCORES = {'Happy': 10, 'Excited': 8, 'Neutral': 5, 'Anxious': 3, 'Sad': 1}
+TREND_RANGES = {'30': 30, '365': 365, 'all': None}
+
+
+def entry_day(entry):
+    """The local calendar day an entry is rolled up under."""
+    return timezone.localdate(entry.date_created)
+
+
+def adjust_mood_rollup(user_id, day, mood, count=0, intensity_sum=0, intensity_count=0):
+    """Atomically add the given deltas to a rollup row, creating it if needed."""
+    deltas = {
+        'entry_count': int(count),
+        'intensity_sum': int(intensity_sum),
+        'intensity_count': int(intensity_count),
+    }
+    rows = MoodDailyRollup.objects.filter(user_id=user_id, day=day, mood=mood)
+    if rows.update(**{name: F(name) + delta for name, delta in deltas.items()}):
+        return
+    if all(delta <= 0 for delta in deltas.values()):
+        # Nothing to take away from; rebuild_mood_rollups repairs any drift
+        return
+    try:
+        with transaction.atomic():
+            MoodDailyRollup.objects.create(user_id=user_id, day=day, mood=mood, **deltas)
+    except IntegrityError:
+        # Someone else created the row in the meantime
+        rows.update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def rebuild_mood_rollups(user=None, entry_model=Entry, rollup_model=MoodDailyRollup, databases=(None,)):
+    """Recompute rollup rows from Entry (optionally for one user), read from each of `databases`."""
+    entries = entry_model.objects.exclude(mood='')
+    rollups = rollup_model.objects.all()
+    if user is not None:
+        entries = entries.filter(owner=user)
+        rollups = rollups.filter(user=user)
+    rows = entries.annotate(day=TruncDate('date_created')).values('owner_id', 'day', 'mood').annotate(
+        entry_count=Count('id'),
+        intensity_sum=Sum('health_matrix__mood_intensity'),
+        intensity_count=Count('health_matrix'),
+    ).order_by()
+    # A user's entries are all in one database, so the per-database groups never overlap
+    rows = [row for using in databases for row in (rows.using(using) if using else rows)]
+    with transaction.atomic():
+        rollups.delete()
+        rollup_model.objects.bulk_create([
+            rollup_model(
+                user_id=row['owner_id'], day=row['day'], mood=row['mood'],
+                entry_count=row['entry_count'], intensity_sum=row['intensity_sum'] or 0,
+                intensity_count=row['intensity_count'],
+            ) for row in rows
+        ], batch_size=500)
+
+
+def mood_trend(user, days=30):
+    """
+    Return the daily sentiment trend for the last `days` days (None for all time).
+
+    Each point has the day's mean mood score, entry count and mean intensity.
+    """
+    rows = MoodDailyRollup.objects.filter(user=user, entry_count__gt=0)
+    if days is not None:
+        rows = rows.filter(day__gte=timezone.localdate() - datetime.timedelta(days=days))
+    by_day = defaultdict(lambda: {'count': 0, 'score': 0, 'intensity_sum': 0, 'intensity_count': 0})
+    for day, mood, count, intensity_sum, intensity_count in rows.order_by('day').values_list(
+            'day', 'mood', 'entry_count', 'intensity_sum', 'intensity_count'):
+        point = by_day[day]
+        point['count'] += count
+        point['score'] += MOOD_SCORES.get(mood, 5) * count
+        point['intensity_sum'] += intensity_sum
+        point['intensity_count'] += intensity_count
+
+    trend = []
+    for day, point in by_day.items():
+        trend.append({
+            'date': day.strftime('%Y-%m-%d'),
+            'score': round(point['score'] / point['count'], 2),
+            'count': point['count'],
+            'intensity': round(point['intensity_sum'] / point['intensity_count'], 2)
+            if point['intensity_count'] else None,
+        })
+    return trend
@@ -0,0 +1,251 @@
+"""Full-text search over diary entries.
+
+Entries are indexed into an SQLite FTS5 virtual table when the database
+supports it. Other databases (or SQLite builds without FTS5) use the
+SearchTerm inverted index maintained in Python instead. With sharding, each
+entry is indexed in the database that holds it.
+"""
+from collections import Counter, defaultdict, namedtuple
+import math
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.html import escape
+
+from .models import Entry, SearchTerm
+from .sharding import row_databases, shard_for_user, user_databases
+
+FTS_TABLE = 'learning_logs_entry_fts'
+FIELDS = ('title', 'content', 'tags', 'mood')
+FIELD_WEIGHTS = {'title': 10.0, 'content': 1.0, 'tags': 5.0, 'mood': 2.0}
+SEARCH_LIMIT = 200
+SNIPPET_WORDS = 16
+MAX_TERM_LENGTH = 64
+
+# Control characters mark highlights until the snippet has been escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+SearchHit = namedtuple('SearchHit', ['entry_id', 'score', 'snippet'])
+
+_fts_tables = {}
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free word tokens."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [token[:MAX_TERM_LENGTH] for token in re.findall(r'\w+', text.lower())]
+
+
+def create_fts_table(conn):
+    """Create the FTS5 table, returning False if this SQLite lacks FTS5."""
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, content, tags, mood, owner_id UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            return False
+    return True
+
+
+def use_fts(using=DEFAULT_DB_ALIAS):
+    """Return True when searches in this database should go through the FTS5 table."""
+    connection = connections[using]
+    backend = getattr(settings, 'ENTRY_SEARCH_BACKEND', 'auto')
+    if backend == 'python' or connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[key] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_tables[key]
+
+
+def entry_document(entry, tag_names=None):
+    """Return the searchable text of an entry, keyed by field."""
+    if tag_names is None:
+        tag_names = entry.tags.values_list('name', flat=True)
+    return {
+        'title': entry.title or '',
+        'content': entry.content or '',
+        'tags': ' '.join(tag_names),
+        'mood': entry.mood or '',
+    }
+
+
+def _fts_row(entry, tag_names=None):
+    document = entry_document(entry, tag_names)
+    return (entry.pk, *(document[field] for field in FIELDS), entry.owner_id)
+
+
+def _search_terms(entry, tag_names=None):
+    document = entry_document(entry, tag_names)
+    terms = []
+    for field in FIELDS:
+        for term, frequency in Counter(tokenize(document[field])).items():
+            terms.append(SearchTerm(owner_id=entry.owner_id, entry_id=entry.pk,
+                                    field=field, term=term, frequency=frequency))
+    return terms
+
+
+def entry_database(entry):
+    """The database an entry is stored in, which is where its index rows go."""
+    if entry._state.db in row_databases():
+        return entry._state.db
+    return shard_for_user(entry.owner_id)
+
+
+def index_entries(entries):
+    """Add entries to the index; tags should be prefetched by the caller."""
+    by_database = defaultdict(list)
+    for entry in entries:
+        by_database[entry_database(entry)].append(entry)
+    for using, batch in by_database.items():
+        if use_fts(using):
+            with connections[using].cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags, mood, owner_id) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    [_fts_row(entry, [tag.name for tag in entry.tags.all()]) for entry in batch],
+                )
+        else:
+            terms = []
+            for entry in batch:
+                terms.extend(_search_terms(entry, [tag.name for tag in entry.tags.all()]))
+            SearchTerm.objects.using(using).bulk_create(terms, batch_size=500)
+
+
+def index_entry(entry):
+    """(Re)index a single entry after it or its tags changed."""
+    remove_entry(entry)
+    using = entry_database(entry)
+    if use_fts(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content, tags, mood, owner_id) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                _fts_row(entry),
+            )
+    else:
+        SearchTerm.objects.using(using).bulk_create(_search_terms(entry))
+
+
+def remove_entry(entry):
+    """Drop an entry from the index."""
+    using = entry_database(entry)
+    if use_fts(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [entry.pk])
+    else:
+        SearchTerm.objects.using(using).filter(entry_id=entry.pk).delete()
+
+
+def clear_index(owner=None, using=None):
+    """Empty the index, for everyone or a single user (in one database, if given)."""
+    for using in [using] if using is not None else user_databases(owner):
+        if use_fts(using):
+            with connections[using].cursor() as cursor:
+                if owner is None:
+                    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+                else:
+                    cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE owner_id = %s", [owner.pk])
+        else:
+            terms = SearchTerm.objects.using(using).all()
+            if owner is not None:
+                terms = terms.filter(owner=owner)
+            terms.delete()
+
+
+def render_snippet(raw):
+    """Escape a marked-up snippet and turn the highlight markers into <mark> tags."""
+    return escape(raw).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def _mark_snippet(text, tokens):
+    """Build a highlighted snippet around the first token match in text."""
+    words = text.split()
+    prefixes = tuple(tokens)
+    first = None
+    marked = []
+    for index, word in enumerate(words):
+        if any(token.startswith(prefixes) for token in tokenize(word)):
+            if first is None:
+                first = index
+            word = f"{MARK_START}{word}{MARK_END}"
+        marked.append(word)
+    start = max((first or 0) - SNIPPET_WORDS // 4, 0)
+    snippet = ' '.join(marked[start:start + SNIPPET_WORDS])
+    if start > 0:
+        snippet = '…' + snippet
+    if start + SNIPPET_WORDS < len(words):
+        snippet += '…'
+    return snippet
+
+
+def _search_fts(user, tokens, limit, using):
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', %s) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND owner_id = %s "
+            "ORDER BY score DESC LIMIT %s",
+            [MARK_START, MARK_END, SNIPPET_WORDS, match, user.pk, limit],
+        )
+        return [SearchHit(row[0], row[1], render_snippet(row[2])) for row in cursor.fetchall()]
+
+
+def _search_python(user, tokens, limit, using):
+    query = None
+    for token in tokens:
+        condition = SearchTerm.objects.using(using).filter(owner=user, term__startswith=token)
+        query = condition if query is None else query | condition
+    rows = query.values_list('entry_id', 'term', 'field', 'frequency')
+
+    # Every query token must match (like FTS5's implicit AND)
+    matched = defaultdict(set)
+    postings = defaultdict(list)
+    document_frequency = defaultdict(set)
+    for entry_id, term, field, frequency in rows:
+        for token in tokens:
+            if term.startswith(token):
+                matched[entry_id].add(token)
+                document_frequency[token].add(entry_id)
+                postings[entry_id].append((token, field, frequency))
+
+    candidates = [entry_id for entry_id, found in matched.items() if len(found) == len(tokens)]
+    if not candidates:
+        return []
+
+    total = Entry.objects.using(using).filter(owner=user).count() or 1
+    scores = {}
+    for entry_id in candidates:
+        score = 0.0
+        for token, field, frequency in postings[entry_id]:
+            idf = math.log(1 + total / len(document_frequency[token]))
+            score += FIELD_WEIGHTS[field] * (1 + math.log(frequency)) * idf
+        scores[entry_id] = score
+    ranked = sorted(candidates, key=lambda entry_id: (-scores[entry_id], -entry_id))[:limit]
+
+    contents = dict(Entry.objects.using(using).filter(pk__in=ranked).values_list('pk', 'content'))
+    return [
+        SearchHit(entry_id, scores[entry_id], render_snippet(_mark_snippet(contents.get(entry_id, ''), tokens)))
+        for entry_id in ranked
+    ]
+
+
+def search_entries(user, query, limit=SEARCH_LIMIT):
+    """Return the user's best matching entries as ranked SearchHits."""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    using = shard_for_user(user.pk)
+    if use_fts(using):
+        return _search_fts(user, tokens, limit, using)
+    return _search_python(user, tokens, limit, using)
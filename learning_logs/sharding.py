@@ -0,0 +1,430 @@
+"""Optional per-user sharding of user-owned rows across SQLite files.
+
+SQLite admits one writer at a time per database file, so with every user in
+db.sqlite3 all writes queue behind a single lock. With SHARD_COUNT > 0 the
+rows of SHARDED_MODELS (a user's diary, finances, attachments and audit
+trail) live in shard_0 ... shard_N-1 files instead, each with its own write
+lock. Users, sessions, tags, caches and rollups stay on 'default'.
+
+ShardAssignment records which database holds each user's rows. Users seen
+for the first time are spread over the shards by id; users that existed
+before sharding was switched on are recorded on 'default' by migrate_shards
+and stay there until move_user_shard moves them. Assignments are cached
+only in a cache shared by every process: a process-local copy would keep
+sending a moved user's queries to the old database.
+
+ShardRouter sends queries on sharded models to the pinned database:
+ShardMiddleware pins the signed-in user's shard for each request, and jobs
+that span users pin each database in turn (row_databases() / pin()).
+Instances remember where they were loaded from, so related lookups and
+saves follow them. Tag rows are copied into every shard so entry/tag joins
+stay inside one file, and foreign keys from shard rows to users and tags
+are not enforced by SQLite, since those rows live in another file.
+"""
+from contextlib import ExitStack, contextmanager
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from .checks import PROCESS_LOCAL_CACHES
+from .db import abind_stream, bind_stream
+
+APP_LABEL = 'learning_logs'
+SHARD_PREFIX = 'shard_'
+
+# Model name -> lookup of the owning user, in the order rows are copied
+OWNER_LOOKUPS = {
+    'recurringexpense': 'owner',
+    'entry': 'owner',
+    'entry_tags': 'entry__owner',
+    'moodhealthmatrix': 'entry__owner',
+    'mediavault': 'entry__owner',
+    'searchterm': 'owner',
+    'entrydraft': 'user',
+    'expense': 'owner',
+    'income': 'owner',
+    'accesslog': 'user',
+}
+SHARDED_MODELS = frozenset(OWNER_LOOKUPS)
+# Copied into every shard so joins from sharded rows stay within one file
+REPLICATED_MODELS = frozenset({'tag'})
+CACHE_TIMEOUT = 60 * 60
+MOVE_BATCH_SIZE = 500
+
+# (alias, all_models); all_models routes unsharded models there too (migrate_shards)
+_pinned = contextvars.ContextVar('shard_pinned', default=(None, False))
+
+
+def shard_aliases():
+    """The shard aliases in use (SHARD_COUNT of them), in shard number order."""
+    return [f'{SHARD_PREFIX}{shard}' for shard in range(getattr(settings, 'SHARD_COUNT', 0))]
+
+
+def sharding_enabled():
+    return bool(shard_aliases())
+
+
+def row_databases():
+    """Every database that may hold sharded rows: 'default' (unmoved users) and each shard."""
+    return [DEFAULT_DB_ALIAS, *shard_aliases()]
+
+
+def user_databases(user=None):
+    """The databases to read a user's sharded rows from, or everyone's when user is None."""
+    return row_databases() if user is None else [shard_for_user(user.pk)]
+
+
+def is_shard(alias):
+    return alias in shard_aliases()
+
+
+def is_shard_file(alias):
+    # A shard database whether or not SHARD_COUNT currently uses it
+    return alias.startswith(SHARD_PREFIX)
+
+
+def is_sharded(model):
+    return model._meta.app_label == APP_LABEL and model._meta.model_name in SHARDED_MODELS
+
+
+def _cache_key(user_id):
+    return f"shard:user:{user_id}"
+
+
+def _cache_is_shared():
+    return settings.CACHES.get('default', {}).get('BACKEND') not in PROCESS_LOCAL_CACHES
+
+
+def shard_for_user(user_id):
+    """The database holding a user's sharded rows, assigning a shard on first use."""
+    aliases = shard_aliases()
+    if not aliases:
+        return DEFAULT_DB_ALIAS
+    shared = _cache_is_shared()
+    alias = cache.get(_cache_key(user_id)) if shared else None
+    if alias is None:
+        from .models import ShardAssignment
+        assignment, _ = ShardAssignment.objects.get_or_create(
+            user_id=user_id, defaults={'alias': aliases[user_id % len(aliases)]},
+        )
+        alias = assignment.alias
+        if shared:
+            cache.set(_cache_key(user_id), alias, CACHE_TIMEOUT)
+    return alias
+
+
+async def ashard_for_user(user_id):
+    """shard_for_user() for async views and middleware."""
+    aliases = shard_aliases()
+    if not aliases:
+        return DEFAULT_DB_ALIAS
+    shared = _cache_is_shared()
+    alias = await cache.aget(_cache_key(user_id)) if shared else None
+    if alias is None:
+        from .models import ShardAssignment
+        assignment, _ = await ShardAssignment.objects.aget_or_create(
+            user_id=user_id, defaults={'alias': aliases[user_id % len(aliases)]},
+        )
+        alias = assignment.alias
+        if shared:
+            await cache.aset(_cache_key(user_id), alias, CACHE_TIMEOUT)
+    return alias
+
+
+def assign_shard(user_id, alias):
+    """Record that a user's rows now live in `alias`."""
+    from .models import ShardAssignment
+    ShardAssignment.objects.update_or_create(user_id=user_id, defaults={'alias': alias})
+    cache.set(_cache_key(user_id), alias, CACHE_TIMEOUT)
+
+
+def current_shard():
+    return _pinned.get()[0]
+
+
+@contextmanager
+def pin(alias, all_models=False):
+    """Route sharded models (or, with all_models, every model) to `alias` in this block."""
+    token = _pinned.set((alias, all_models))
+    try:
+        yield alias
+    finally:
+        _pinned.reset(token)
+
+
+def pin_user(user_id):
+    return pin(shard_for_user(user_id))
+
+
+@contextmanager
+def atomic(*aliases):
+    """One transaction on 'default' plus one on each other alias given."""
+    with ExitStack() as stack:
+        # Always lock 'default' first so two jobs never wait on each other in opposite orders
+        for alias in dict.fromkeys([DEFAULT_DB_ALIAS, *aliases]):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def _shard_of(instance):
+    """The database holding rows related to an instance, when the instance tells."""
+    db = instance._state.db
+    # __class__ rather than type(): request.user is a lazy proxy for the User
+    if is_sharded(instance.__class__):
+        if db in row_databases():
+            return db
+        if db is None:
+            owner_id = getattr(instance, 'owner_id', None) or getattr(instance, 'user_id', None)
+            if owner_id:
+                return shard_for_user(owner_id)
+            entry = instance._state.fields_cache.get('entry')
+            if entry is not None and entry._state.db in row_databases():
+                return entry._state.db
+        return None
+    if is_shard(db):
+        return db
+    if isinstance(instance, User) and instance.pk:
+        return shard_for_user(instance.pk)
+    return None
+
+
+class ShardRouter:
+    """
+    Send sharded models to the owner's shard, everything else to 'default'.
+
+    Returns None wherever 'default' is the answer, so AnalyticsRouter can
+    still move report reads to the read-only alias.
+    """
+
+    def _route(self, model, hints, write):
+        if not sharding_enabled():
+            return None
+        pinned, all_models = _pinned.get()
+        if all_models:
+            return pinned
+        instance = hints.get('instance')
+        if is_sharded(model):
+            alias = (_shard_of(instance) if instance is not None else None) or pinned
+            return None if alias == DEFAULT_DB_ALIAS else alias
+        if instance is not None and is_shard(instance._state.db):
+            if model._meta.model_name in REPLICATED_MODELS and not write:
+                return instance._state.db
+            # e.g. entry.owner: the user row is in 'default', not next to the entry
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints, write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {obj1._state.db, obj2._state.db}
+        if any(is_shard(db) for db in databases) and databases <= set(row_databases()):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every database gets the full schema; unused tables simply stay empty
+        return None
+
+
+class ShardMiddleware:
+    """Pin the signed-in user's shard for the request (and a streamed response body)."""
+    sync_capable = True
+    # Under ASGI, async views are reached without a hop through a worker thread
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not sharding_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+        alias = shard_for_user(user.pk)
+        with pin(alias):
+            response = self.get_response(request)
+        return self.bind(response, alias)
+
+    async def __acall__(self, request):
+        user = await request.auser() if hasattr(request, 'auser') else None
+        if user is None or not user.is_authenticated:
+            return await self.get_response(request)
+        alias = await ashard_for_user(user.pk)
+        with pin(alias):
+            response = await self.get_response(request)
+        return self.bind(response, alias)
+
+    def bind(self, response, alias):
+        if getattr(response, 'streaming', False):
+            stream = abind_stream if response.is_async else bind_stream
+            response.streaming_content = stream(response.streaming_content, _pinned, (alias, False))
+        return response
+
+
+def sync_tags(alias):
+    """Make the tag table of `alias` an exact copy of the one in 'default'."""
+    from .models import Tag
+    tags = list(Tag.objects.using(DEFAULT_DB_ALIAS).order_by('pk'))
+    Tag.objects.using(alias).exclude(pk__in=[tag.pk for tag in tags]).delete()
+    Tag.objects.using(alias).bulk_create(tags, batch_size=500, update_conflicts=True,
+                                         unique_fields=['id'], update_fields=['name'])
+
+
+def sharded_models():
+    """(model, owner lookup) pairs, parents before the rows that point at them."""
+    return [(apps.get_model(APP_LABEL, name), lookup) for name, lookup in OWNER_LOOKUPS.items()]
+
+
+def _batches(queryset, size=MOVE_BATCH_SIZE):
+    batch = []
+    for row in queryset.iterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_rows(model, rows, target, new_ids):
+    """Insert rows in `target` under new ids, pointing their foreign keys at moved parents."""
+    from .utils import bulk_insert
+    fields = [field for field in model._meta.concrete_fields
+              if field.is_relation and field.related_model in new_ids]
+    old_ids = []
+    for row in rows:
+        for field in fields:
+            old = getattr(row, field.attname)
+            if old is not None:
+                setattr(row, field.attname, new_ids[field.related_model][old])
+        old_ids.append(row.pk)
+        row.pk = None
+    # bulk_insert keeps the rows' auto_now(_add) dates
+    bulk_insert(model, rows, using=target)
+    if model in new_ids:
+        new_ids[model].update(zip(old_ids, (row.pk for row in rows)))
+
+
+def move_user(user, target):
+    """
+    Move a user's sharded rows to `target`; returns the number of rows copied.
+
+    Rows get new ids in the target, since each database numbers its own. The
+    source database stays write-locked for the whole move, so nothing the
+    user writes meanwhile is lost. The assignment is switched once the copy
+    has committed and before the source rows are deleted. Search index rows
+    are rebuilt in the target rather than copied.
+    """
+    from .drafts import _cache_key as draft_cache_key, draft_key, flush_draft
+    from .models import Entry, EntryDraft, RecurringExpense
+    from .search import clear_index, index_entries
+    from .utils import invalidate_calendar_month
+    from .watermarks import bump_watermark
+
+    source = shard_for_user(user.pk)
+    if source == target:
+        return 0
+    if is_shard(target):
+        sync_tags(target)
+    # Cached drafts name entries by id; write them out so they are moved and renamed too
+    draft_keys = list(EntryDraft.objects.using(source).filter(user=user).values_list('key', flat=True))
+    with pin(source):
+        for key in draft_keys:
+            flush_draft(user, key)
+    # Parents whose ids are referenced by rows copied after them
+    new_ids = {Entry: {}, RecurringExpense: {}}
+    copied = 0
+    with transaction.atomic(using=source):
+        with transaction.atomic(using=target):
+            for model, lookup in sharded_models():
+                if model._meta.model_name == 'searchterm':
+                    continue
+                rows = model.objects.using(source).filter(**{lookup: user.pk}).order_by('pk')
+                for batch in _batches(rows):
+                    if model is EntryDraft:
+                        # 'entry-<pk>' keys follow the entry to its new id
+                        for draft in batch:
+                            if draft.entry_id:
+                                draft.key = draft_key(Entry(pk=new_ids[Entry][draft.entry_id]))
+                    _copy_rows(model, batch, target, new_ids)
+                    copied += len(batch)
+            entries = Entry.objects.using(target).filter(owner=user)
+            index_entries(entries.prefetch_related('tags'))
+        assign_shard(user.pk, target)
+        clear_index(user, using=source)
+        # Children first; raw deletes skip the cascades and signals a normal delete would fire
+        for model, lookup in reversed(sharded_models()):
+            model.objects.using(source).filter(**{lookup: user.pk})._raw_delete(source)
+    cache.delete_many([draft_cache_key(user.pk, key) for key in draft_keys])
+    # Cached month grids link to the old entry ids
+    months = {(day.year, day.month) for day in entries.datetimes('event_date', 'month')}
+    for year, month in months:
+        invalidate_calendar_month(user.pk, year, month)
+    # Pages the browser kept link to the old ids too
+    bump_watermark(user.pk)
+    return copied
+
+
+@receiver(connection_created)
+def relax_shard_foreign_keys(sender, connection, **kwargs):
+    """Shard rows point at users and tags whose rows are in 'default'."""
+    if is_shard_file(connection.alias):
+        connection.disable_constraint_checking()
+
+
+@receiver(post_migrate)
+def relax_migrated_shard(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # The migration schema editor turns foreign key enforcement back on when it exits
+    if is_shard_file(using):
+        connections[using].disable_constraint_checking()
+
+
+@receiver(post_save, sender='learning_logs.Tag')
+def replicate_tag(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shard_aliases():
+        sender.objects.using(alias).update_or_create(pk=instance.pk, defaults={'name': instance.name})
+
+
+@receiver(post_delete, sender='learning_logs.Tag')
+def remove_replicated_tag(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shard_aliases():
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_rows(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Deleting a user cascades within 'default' only; clear their shard by hand."""
+    alias = shard_for_user(instance.pk)
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    from .models import AccessLog, Entry, EntryDraft, Expense, Income, RecurringExpense, SearchTerm
+    with pin(alias), transaction.atomic(using=alias):
+        # Entry's cascade takes its health data, attachments, drafts and tag links with it
+        for model, lookup in [(Entry, 'owner'), (Expense, 'owner'), (Income, 'owner'),
+                              (RecurringExpense, 'owner'), (AccessLog, 'user'),
+                              (EntryDraft, 'user'), (SearchTerm, 'owner')]:
+            model.objects.using(alias).filter(**{lookup: instance.pk}).delete()
+    cache.delete(_cache_key(instance.pk))
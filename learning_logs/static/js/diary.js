@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initTheme();
     initNav();
     initCropper();
+    initLiveEvents();
 });
 
 // --- X-Calendar AJAX Navigation ---
@@ -80,16 +81,56 @@ function initAutosave() {
 
     let timeout = null;
     const statusIndicator = document.getElementById('autosave-status');
+    const fields = ['title', 'content', 'mood'];
+    const draftKey = form.dataset.draftKey || 'new';
+    // The server only accepts revisions newer than the one it already has
+    let revision = parseInt(form.dataset.draftRevision || '0', 10);
+    let lastSent = currentValues();
+
+    function currentValues() {
+        const values = {};
+        fields.forEach(name => {
+            if (form.elements[name]) values[name] = form.elements[name].value;
+        });
+        return values;
+    }
+
+    function pendingDraft(flush) {
+        // Send only the fields that changed since the last save
+        const values = currentValues();
+        const changed = fields.filter(name => name in values && values[name] !== lastSent[name]);
+        if (!changed.length && !flush) return null;
+
+        revision += 1;
+        const formData = new FormData();
+        formData.append('csrfmiddlewaretoken', form.querySelector('[name=csrfmiddlewaretoken]').value);
+        formData.append('draft_key', draftKey);
+        formData.append('revision', revision);
+        if (flush) formData.append('flush', '1');
+        changed.forEach(name => formData.append(name, values[name]));
+        lastSent = values;
+        return formData;
+    }
 
     form.addEventListener('input', function() {
         if (statusIndicator) statusIndicator.textContent = 'Typing...';
         
         clearTimeout(timeout);
         timeout = setTimeout(() => {
-            saveDraft(new FormData(form));
+            const formData = pendingDraft(false);
+            if (formData) saveDraft(formData);
         }, 2000); // Autosave after 2 seconds of inactivity
     });
 
+    form.addEventListener('submit', () => clearTimeout(timeout));
+
+    // Persist whatever is still buffered server-side when the page goes away
+    window.addEventListener('pagehide', function() {
+        clearTimeout(timeout);
+        const formData = pendingDraft(true);
+        if (formData && navigator.sendBeacon) navigator.sendBeacon('/api/autosave/', formData);
+    });
+
     function saveDraft(formData) {
         if (statusIndicator) statusIndicator.textContent = 'Saving draft...';
 
@@ -102,6 +143,14 @@ function initAutosave() {
         })
         .then(res => res.json())
         .then(data => {
+            if (data.status === 'stale') {
+                // Another window saved a newer draft; continue after its revision
+                revision = Math.max(revision, data.revision);
+                lastSent = {};
+                if (statusIndicator) statusIndicator.textContent = 'Draft changed elsewhere';
+                return;
+            }
+            if (data.status !== 'success') throw new Error(data.message || 'Autosave failed');
             if (statusIndicator) {
                 statusIndicator.textContent = 'Draft saved';
                 setTimeout(() => statusIndicator.textContent = '', 3000);
@@ -109,6 +158,7 @@ function initAutosave() {
         })
         .catch(err => {
             console.error('Autosave failed', err);
+            lastSent = {};
             if (statusIndicator) statusIndicator.textContent = 'Save failed';
         });
     }
@@ -171,7 +221,6 @@ function initModal() {
     const closeBtns = document.querySelectorAll('.close-modal');
     const newEventBtn = document.getElementById('btn-new-event');
     const calendarDays = document.querySelectorAll('.calendar__day:not(.calendar__day--empty)');
-    const dateInput = document.querySelector('input[name="event_date"]');
 
     if (!modal) return;
 
@@ -183,21 +232,7 @@ function initModal() {
     }
 
     // Open modal on Calendar Day click
-    calendarDays.forEach(day => {
-        day.addEventListener('click', (e) => {
-            // Don't trigger if clicking an existing event pill (optional, maybe open edit view)
-            if (e.target.classList.contains('event-pill')) return;
-
-            const dateStr = day.dataset.date; // YYYY-MM-DD
-            if (dateStr && dateInput) {
-                // Set the date input value (requires format YYYY-MM-DDTHH:MM)
-                const now = new Date();
-                const timeStr = now.toTimeString().slice(0,5); // HH:MM
-                dateInput.value = `${dateStr}T${timeStr}`;
-            }
-            modal.classList.add('active');
-        });
-    });
+    calendarDays.forEach(day => day.addEventListener('click', dayClick));
 
     // Close modal
     closeBtns.forEach(btn => {
@@ -250,6 +285,22 @@ function initNav() {
     }
 }
 
+function dayClick(e) {
+    const modal = document.getElementById('eventModal');
+    const dateInput = document.querySelector('input[name="event_date"]');
+    // Don't trigger if clicking an existing event pill (optional, maybe open edit view)
+    if (!modal || e.target.classList.contains('event-pill')) return;
+
+    const dateStr = this.dataset.date; // YYYY-MM-DD
+    if (dateStr && dateInput) {
+        // Set the date input value (requires format YYYY-MM-DDTHH:MM)
+        const now = new Date();
+        const timeStr = now.toTimeString().slice(0,5); // HH:MM
+        dateInput.value = `${dateStr}T${timeStr}`;
+    }
+    modal.classList.add('active');
+}
+
 // --- Drag and Drop Logic ---
 function initDragAndDrop() {
     const events = document.querySelectorAll('.event-pill');
@@ -299,6 +350,7 @@ function dragDrop(e) {
     const entryId = e.dataTransfer.getData('text/plain');
     const newDate = this.dataset.date;
     const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+    ownMoves.add(entryId);
 
     fetch('/api/update_entry_date/', {
         method: 'POST',
@@ -311,21 +363,87 @@ function dragDrop(e) {
     .then(response => response.json())
     .then(data => {
         if (data.status === 'success') {
-            // Refresh calendar to show moved event
-            const currentBtn = document.querySelector('.js-nav-next');
-            // We use the "next" button's data to figure out current view, 
-            // or simply reload the current month logic.
-            // A simpler way is to trigger a click on a hidden refresh button or re-fetch.
-            // For now, let's just re-fetch the current view based on the header buttons.
-            const prevBtn = document.querySelector('.js-nav-prev');
-            // If prev is showing month X, then current is month X+1
-            let year = parseInt(prevBtn.dataset.year);
-            let month = parseInt(prevBtn.dataset.month) + 1;
-            if (month > 12) { month = 1; year++; }
-            
-            fetchCalendar(year, month);
+            patchCalendarCells(data.cells);
         } else {
             alert('Failed to move event: ' + data.message);
         }
     });
-}
\ No newline at end of file
+}
+
+// Swap in the re-rendered day cells returned by a move instead of refetching the month
+function patchCalendarCells(cells) {
+    Object.entries(cells || {}).forEach(([date, html]) => {
+        const cell = document.querySelector(`.calendar__day[data-date="${date}"]`);
+        if (!cell) return; // day is in a month that is not on screen
+
+        const template = document.createElement('template');
+        template.innerHTML = `<table><tbody><tr>${html}</tr></tbody></table>`;
+        const fresh = template.content.querySelector('td');
+        cell.replaceWith(fresh);
+        fresh.addEventListener('click', dayClick);
+        fresh.addEventListener('dragover', dragOver);
+        fresh.addEventListener('dragenter', dragEnter);
+        fresh.addEventListener('dragleave', dragLeave);
+        fresh.addEventListener('drop', dragDrop);
+        fresh.querySelectorAll('.event-pill').forEach(event => {
+            event.addEventListener('dragstart', dragStart);
+            event.addEventListener('dragend', dragEnd);
+        });
+    });
+}
+
+// --- Live events (Server-Sent Events) ---
+// Entries moved from this page; their cells are already patched, so their echo is skipped
+const ownMoves = new Set();
+
+function initLiveEvents() {
+    const calendar = document.querySelector('.calendar-wrapper');
+    const inbox = document.querySelector('[data-live-notifications]');
+    if ((!calendar && !inbox) || !window.EventSource) return;
+
+    // The browser reconnects by itself and sends Last-Event-ID, so missed events are replayed
+    const source = new EventSource('/events/');
+
+    source.addEventListener('entry', function(e) {
+        if (!calendar) return;
+        const data = JSON.parse(e.data);
+        const ids = data.entry_ids.map(String);
+        if (ids.every(id => ownMoves.has(id))) {
+            ids.forEach(id => ownMoves.delete(id));
+            return;
+        }
+        const shown = data.days.find(day => document.querySelector(`.calendar__day[data-date="${day}"]`));
+        if (!shown) return; // none of the days is on screen
+        const [year, month] = shown.split('-').map(Number);
+        fetchCalendar(year, month);
+    });
+
+    function showNotification(e) {
+        if (!inbox) return;
+        const list = inbox.querySelector('.notification-list');
+        if (!list) {
+            window.location.reload(); // the inbox was empty; let the server render it
+            return;
+        }
+        const item = document.createElement('div');
+        item.className = 'notification-item';
+        item.innerHTML = '<div class="notification-content"><i class="fas fa-bell"></i><span></span></div>';
+        item.querySelector('span').textContent = JSON.parse(e.data).message;
+        list.prepend(item);
+    }
+    source.addEventListener('reminder', showNotification);
+    source.addEventListener('milestone', showNotification);
+
+    // Events were dropped (slow connection or too long offline): start over from the server's state
+    source.addEventListener('resync', function() {
+        if (calendar) {
+            const cell = document.querySelector('.calendar__day[data-date]');
+            if (cell) {
+                const [year, month] = cell.dataset.date.split('-').map(Number);
+                fetchCalendar(year, month);
+            }
+        } else {
+            window.location.reload();
+        }
+    });
+}
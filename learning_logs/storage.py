@@ -0,0 +1,40 @@
+"""File storage for content-addressed MediaVault blobs.
+
+Blobs are stored outside MEDIA_ROOT, so they are never reachable through the
+public media URL; they are only served by the authenticated vault download
+view. A blob's name is derived from its SHA-256 digest, so saving the same
+name twice means saving the same bytes and the existing file is kept.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+class VaultStorage(FileSystemStorage):
+    # Resolved on access so the root follows MEDIA_VAULT_ROOT (e.g. override_settings)
+    @property
+    def base_location(self):
+        return str(settings.MEDIA_VAULT_ROOT)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def get_available_name(self, name, max_length=None):
+        # Names are content hashes: an existing file already has these bytes
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def vault_storage():
+    return VaultStorage()
+
+
+def blob_name(digest):
+    """Fan blobs out over two directory levels, e.g. ab/cd/abcd...."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
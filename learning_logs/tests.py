@@ -1,3 +1,1881 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+from decimal import Decimal
+import gzip
+import io
+import json
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+import threading
 
-# Create your tests here.
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .api import SCHEMAS, SchemaError, validate
+from .audit import AccessLogBuffer, access_log_buffer, flush_at_exit
+from .checks import check_cache_table, check_shared_cache
+from .db import analytics_alias, create_cache_table
+from .events import BrokerClient, Event, EventBus, broker, event_stream, publish
+from .export import buffered, iter_records, parse_since, stream_export
+from .finance import bump_finance_version, finance_version, financial_summary
+from .forms import ProfileForm
+from .management.commands.benchmark_api import Command as BenchmarkApi
+from .management.commands.run_event_broker import Command as RunEventBroker
+from .ledger import rebuild_spend_ledger, spending_summary
+from .drafts import StaleRevision, load_draft, publish_draft, save_draft
+from .middleware import PerformanceMiddleware, PerformanceStats
+from .models import AccessLog, AccessLogRollup, DailySpend, Entry, EntryDraft, Expense, Income, MediaBlob, MediaVault, MoodDailyRollup, MoodHealthMatrix, Notification, Profile, RecurringExpense, ShardAssignment, Tag, Topic, UserStats
+from .notifications import generate_notifications, prune_notifications
+from .recurring import process_due_recurring_expenses
+from .rollups import mood_trend, rebuild_mood_rollups
+from .search import clear_index, search_entries, use_fts
+from .sharding import ashard_for_user, assign_shard, move_user, pin, shard_for_user, sharded_models
+from .storage import blob_name, vault_storage
+from .watermarks import bump_watermark, watermark
+from .utils import MAX_MOVES, XCalendar, day_bounds, decode_cursor, encode_cursor, keyset_page, month_bounds, move_entries
+from .vault import RangeNotSatisfiable, attach, file_digest, parse_range, release_blob, store_blob
+
+
+class DateWindowTests(TestCase):
+    @override_settings(TIME_ZONE='Africa/Dar_es_Salaam')
+    def test_month_bounds_are_half_open_in_current_timezone(self):
+        start, end = month_bounds(2026, 12)
+        self.assertEqual(timezone.localtime(start).replace(tzinfo=None), datetime.datetime(2026, 12, 1))
+        self.assertEqual(timezone.localtime(end).replace(tzinfo=None), datetime.datetime(2027, 1, 1))
+        # Dar es Salaam is UTC+3, so local midnight is 21:00 UTC the day before
+        self.assertEqual(start.astimezone(datetime.timezone.utc).hour, 21)
+
+    def test_day_bounds_cover_one_day(self):
+        start, end = day_bounds(datetime.date(2026, 3, 5))
+        self.assertEqual(end - start, datetime.timedelta(days=1))
+        self.assertEqual(timezone.localtime(start).date(), datetime.date(2026, 3, 5))
+
+
+class CalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mwandishi')
+        tz = timezone.get_current_timezone()
+        cls.entries = [
+            Entry.objects.create(owner=cls.user, title=f'Siku {day}', content='.', mood='Happy',
+                                 event_date=datetime.datetime(2026, 5, day, 9, tzinfo=tz))
+            for day in (1, 1, 14, 31)
+        ]
+        cls.tz = tz
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, month=5):
+        return XCalendar(2026, month, user=self.user).formatmonth()
+
+    def test_month_renders_with_one_range_query_and_then_from_cache(self):
+        with self.assertNumQueries(1):
+            html = self.render()
+        self.assertEqual(html.count('event-pill'), 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), html)
+
+    def assertRefreshedAfter(self, change, months=(5,)):
+        for month in months:
+            self.render(month)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            # Until the change commits, the cached grid still matches what other requests can read
+            for month in months:
+                with self.assertNumQueries(0):
+                    self.render(month)
+        for month in months:
+            with self.assertNumQueries(1):
+                self.render(month)
+
+    def test_created_entry_refreshes_its_month(self):
+        self.assertRefreshedAfter(lambda: Entry.objects.create(
+            owner=self.user, title='Mpya', content='.', event_date=datetime.datetime(2026, 5, 20, tzinfo=self.tz)))
+        self.assertIn('Mpya', self.render())
+
+    def test_edited_entry_refreshes_its_month(self):
+        entry = self.entries[2]
+        entry.title = 'Imebadilika'
+        self.assertRefreshedAfter(entry.save)
+        self.assertIn('Imebadilika', self.render())
+
+    def test_entry_moved_to_another_month_refreshes_both(self):
+        entry = Entry.objects.get(pk=self.entries[3].pk)
+        entry.event_date = datetime.datetime(2026, 6, 2, 9, tzinfo=self.tz)
+        self.assertRefreshedAfter(entry.save, months=(5, 6))
+        self.assertEqual(self.render(5).count('event-pill'), 3)
+        self.assertIn(f'data-entry-id="{entry.pk}"', self.render(6))
+        # The next move starts from June
+        entry.event_date = datetime.datetime(2026, 7, 2, 9, tzinfo=self.tz)
+        self.assertRefreshedAfter(entry.save, months=(6, 7))
+
+    def test_deleted_entry_refreshes_its_month(self):
+        self.assertRefreshedAfter(self.entries[0].delete)
+        self.assertEqual(self.render().count('event-pill'), 3)
+
+
+class QueryPlanTests(TestCase):
+    """The hot per-user queries must be answered from the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner')
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN checks are SQLite specific")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan, plan)
+
+    def test_calendar_month_uses_owner_event_index(self):
+        start, end = month_bounds(2026, 3)
+        queryset = Entry.objects.filter(owner=self.user, event_date__gte=start, event_date__lt=end)
+        self.assertUsesIndex(queryset, 'entry_owner_event_idx')
+
+    def test_entry_list_uses_owner_created_index(self):
+        queryset = Entry.objects.filter(owner=self.user, date_created__lt=timezone.now())\
+            .order_by('-date_created', '-id')
+        self.assertUsesIndex(queryset, 'entry_owner_created_idx')
+
+    def test_month_expenses_use_owner_added_index(self):
+        start, end = month_bounds(2026, 3)
+        queryset = Expense.objects.filter(owner=self.user, date_added__gte=start, date_added__lt=end)
+        self.assertUsesIndex(queryset, 'expense_owner_added_idx')
+
+    def test_month_income_uses_owner_added_index(self):
+        start, end = month_bounds(2026, 3)
+        queryset = Income.objects.filter(owner=self.user, date_added__gte=start, date_added__lt=end)
+        self.assertUsesIndex(queryset, 'income_owner_added_idx')
+
+    def test_upcoming_bills_use_owner_due_index(self):
+        today = datetime.date(2026, 3, 5)
+        queryset = RecurringExpense.objects.filter(
+            owner=self.user, reminder_active=True,
+            next_due_date__range=[today, today + datetime.timedelta(days=3)],
+        )
+        self.assertUsesIndex(queryset, 'recurring_owner_due_idx')
+
+
+DATABASE_CACHE = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache_entries'}
+
+
+class SharedCacheCheckTests(TestCase):
+    databases = {'default', 'cache'}
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_an_error(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['learning_logs.E001'])
+
+    @override_settings(CACHES={'default': DATABASE_CACHE})
+    def test_database_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES={'default': DATABASE_CACHE})
+    def test_missing_cache_table_is_reported(self):
+        self.assertEqual([error.id for error in check_cache_table(None, databases=['cache'])], ['learning_logs.W001'])
+        # Database checks only run when asked to
+        self.assertEqual(check_cache_table(None), [])
+
+    @override_settings(CACHES={'default': DATABASE_CACHE})
+    def test_migrate_creates_the_cache_table(self):
+        create_cache_table(using='default')
+        self.assertIn('cache_entries', connections['cache'].introspection.table_names())
+        self.assertNotIn('cache_entries', connections['default'].introspection.table_names())
+        self.assertEqual(check_cache_table(None, databases=['cache']), [])
+
+
+class RecurringExpenseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('payer')
+
+    def test_monthly_bill_keeps_its_day_after_a_short_month(self):
+        bill = RecurringExpense.objects.create(owner=self.user, title='Kodi', amount=100, frequency='Monthly',
+                                               next_due_date=datetime.date(2026, 1, 31))
+        process_due_recurring_expenses(today=datetime.date(2026, 4, 1))
+        days = list(Expense.objects.filter(recurring_expense=bill).order_by('due_date').values_list('due_date', flat=True))
+        self.assertEqual(days, [datetime.date(2026, 1, 31), datetime.date(2026, 2, 28), datetime.date(2026, 3, 31)])
+        bill.refresh_from_db()
+        self.assertEqual(bill.next_due_date, datetime.date(2026, 4, 30))
+
+    def test_booked_expenses_are_dated_on_their_due_day(self):
+        bill = RecurringExpense.objects.create(owner=self.user, title='Maji', amount=10, frequency='Weekly',
+                                               next_due_date=datetime.date(2026, 3, 2))
+        process_due_recurring_expenses(today=datetime.date(2026, 3, 10))
+        expenses = Expense.objects.filter(recurring_expense=bill).order_by('due_date')
+        self.assertEqual([timezone.localtime(e.date_added).date() for e in expenses], [e.due_date for e in expenses])
+        # Switching auto_now_add off for the batch used to leak into concurrent saves
+        self.assertTrue(Expense._meta.get_field('date_added').auto_now_add)
+
+    def test_rerun_books_nothing_new(self):
+        RecurringExpense.objects.create(owner=self.user, title='Simu', amount=5, frequency='Daily',
+                                        next_due_date=datetime.date(2026, 3, 1))
+        process_due_recurring_expenses(today=datetime.date(2026, 3, 5))
+        self.assertEqual(process_due_recurring_expenses(today=datetime.date(2026, 3, 5)), (0, 0))
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 5)
+
+    def test_due_day_follows_a_due_date_set_by_hand(self):
+        bill = RecurringExpense.objects.create(owner=self.user, title='Kodi', amount=100,
+                                               next_due_date=datetime.date(2026, 1, 31))
+        bill = RecurringExpense.objects.get(pk=bill.pk)
+        bill.next_due_date = datetime.date(2026, 2, 15)
+        bill.save()
+        self.assertEqual(bill.due_day, 15)
+
+
+class DraftTests(TestCase):
+    databases = {'default', 'cache'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_partial_updates_are_merged(self):
+        save_draft(self.user, 'new', 1, {'title': 'Asubuhi'})
+        state, _ = save_draft(self.user, 'new', 2, {'content': 'Jua limechomoza'})
+        self.assertEqual((state['title'], state['content'], state['revision']), ('Asubuhi', 'Jua limechomoza', 2))
+
+    def test_old_revision_is_rejected(self):
+        save_draft(self.user, 'new', 5, {'title': 'Tano'})
+        with self.assertRaises(StaleRevision):
+            save_draft(self.user, 'new', 5, {'title': 'Tano tena'})
+        with self.assertRaises(StaleRevision):
+            save_draft(self.user, 'new', 4, {'title': 'Nne'})
+        self.assertEqual(load_draft(self.user, 'new')['title'], 'Tano')
+
+    def test_writes_are_coalesced_until_flush(self):
+        save_draft(self.user, 'new', 1, {'title': 'Kwanza'}, flush=True)
+        _, persisted = save_draft(self.user, 'new', 2, {'title': 'Pili'})
+        self.assertFalse(persisted)
+        self.assertEqual(EntryDraft.objects.get(user=self.user, key='new').revision, 1)
+        _, persisted = save_draft(self.user, 'new', 3, {'title': 'Tatu'}, flush=True)
+        self.assertTrue(persisted)
+        self.assertEqual(EntryDraft.objects.get(user=self.user, key='new').title, 'Tatu')
+
+    @override_settings(CACHES={'default': DATABASE_CACHE})
+    def test_coalesced_save_reads_and_writes_the_cache_once(self):
+        create_cache_table(using='default')
+        save_draft(self.user, 'new', 1, {'title': 'Kwanza'}, flush=True)
+        with CaptureQueriesContext(connections['cache']) as queries, self.assertNumQueries(0):
+            save_draft(self.user, 'new', 2, {'title': 'Pili'})
+        # The get, then the set: a row count for culling, the key lookup and the UPDATE
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 4, statements)
+
+    def test_autosave_view_answers_409_for_stale_revision(self):
+        self.client.force_login(self.user)
+        url = '/api/autosave/'
+        self.assertEqual(self.client.post(url, {'draft_key': 'new', 'revision': 2, 'title': 'A'}).status_code, 200)
+        response = self.client.post(url, {'draft_key': 'new', 'revision': 1, 'title': 'B'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {'status': 'stale', 'revision': 2})
+
+    def test_publish_creates_the_entry_and_drops_the_draft(self):
+        save_draft(self.user, 'new', 1, {'title': 'Safari', 'content': 'Dar', 'mood': 'Happy'}, flush=True)
+        entry = publish_draft(self.user, 'new')
+        self.assertEqual((entry.title, entry.owner, entry.mood), ('Safari', self.user, 'Happy'))
+        self.assertFalse(EntryDraft.objects.filter(user=self.user).exists())
+
+
+class VaultTests(TestCase):
+    DATA = b'0123456789' * 10
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('keeper')
+        cls.entry = Entry.objects.create(owner=cls.user, title='Sauti', content='...')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(MEDIA_VAULT_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def attach(self, data=DATA):
+        content = ContentFile(data, name='clip.mp3')
+        digest, size = file_digest(content)
+        with self.captureOnCommitCallbacks(execute=True):
+            return attach(self.entry, content, digest, size, 'audio/mpeg', 'audio', 'clip.mp3')
+
+    def test_same_bytes_are_stored_once_and_deleted_with_the_last_reference(self):
+        first, second = self.attach(), self.attach()
+        self.assertEqual(first.blob_id, second.blob_id)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(vault_storage().exists(blob.file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(vault_storage().exists(blob.file.name))
+
+    def test_reupload_before_cleanup_keeps_the_file(self):
+        attachment = self.attach()
+        blob = attachment.blob
+        MediaVault.objects.filter(pk=attachment.pk).delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            release_blob(blob.pk)
+        # The same bytes arrive before the deletion hook runs
+        content = ContentFile(self.DATA)
+        store_blob(content, blob.sha256, len(self.DATA), 'audio/mpeg')
+        for callback in callbacks:
+            callback()
+        self.assertTrue(vault_storage().exists(blob.file.name))
+
+    def test_failed_attach_removes_the_new_file(self):
+        with mock.patch.object(MediaVault.objects, 'create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.attach()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(vault_storage().exists(blob_name(file_digest(ContentFile(self.DATA))[0])))
+
+    def test_failed_attach_keeps_a_referenced_file(self):
+        blob = self.attach().blob
+        with mock.patch.object(MediaVault.objects, 'create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.attach()
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(vault_storage().exists(blob.file.name))
+
+    def test_clean_media_vault_deletes_only_old_orphans(self):
+        blob = self.attach().blob
+        orphan = ContentFile(b'rolled back')
+        digest, _ = file_digest(orphan)
+        vault_storage().save(blob_name(digest), orphan)
+        out = io.StringIO()
+        call_command('clean_media_vault', stdout=out)
+        # Too recent: its upload might still commit
+        self.assertTrue(vault_storage().exists(blob_name(digest)))
+        call_command('clean_media_vault', min_age=0, stdout=out)
+        self.assertFalse(vault_storage().exists(blob_name(digest)))
+        self.assertTrue(vault_storage().exists(blob.file.name))
+        self.assertIn("Deleted 1 orphaned blob files.", out.getvalue())
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-30', 100), (70, 99))
+        self.assertEqual(parse_range('bytes=-300', 100), (0, 99))
+        for header, size in (('bytes=100-', 100), ('bytes=20-10', 100), ('bytes=-0', 100), ('bytes=-5', 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, size)
+
+    def test_download_serves_ranges(self):
+        attachment = self.attach()
+        self.client.force_login(self.user)
+        url = f'/attachments/{attachment.pk}/'
+        response = self.client.get(url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), self.DATA[10:20])
+
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=10-19', 'If-Range': response['ETag']}).status_code, 206)
+        response = self.client.get(url, headers={'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+
+        response = self.client.get(url, headers={'Range': 'bytes=200-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+
+    async def test_download_streams_asynchronously_under_asgi(self):
+        attachment = await sync_to_async(self.attach)()
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/attachments/{attachment.pk}/')
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.DATA)
+
+
+@override_settings(AVATARS={'SIZES': (32, 64), 'MAX_SIZE': 128})
+class AvatarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('picha')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(MEDIA_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.profile = Profile.objects.create(user=self.user)
+
+    def upload(self, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+
+    def save(self, color):
+        form = ProfileForm({}, {'image': self.upload(color)}, instance=self.profile)
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            return form.save()
+
+    def files(self):
+        return [self.profile.image.name, *self.profile.avatars.values()]
+
+    def test_names_embed_user_and_content_hash(self):
+        profile = self.save('red')
+        stem = profile.image.name.removeprefix('profile_pics/').removesuffix('.webp')
+        self.assertRegex(stem, rf'^{self.user.pk}-[0-9a-f]{{16}}$')
+        self.assertEqual(profile.avatars, {
+            '32': f'profile_pics/avatars/{stem}-32.webp',
+            '64': f'profile_pics/avatars/{stem}-64.webp',
+        })
+        with Image.open(profile.image.path) as master:
+            self.assertEqual(master.size, (128, 128))
+        # The same picture again keeps the same names and files
+        self.assertEqual(self.save('red').image.name, profile.image.name)
+        self.assertTrue(all(profile.image.storage.exists(name) for name in self.files()))
+
+    def test_replaced_files_are_deleted(self):
+        self.save('red')
+        old = self.files()
+        self.save('blue')
+        storage = self.profile.image.storage
+        self.assertTrue(all(storage.exists(name) for name in self.files()))
+        self.assertFalse(any(storage.exists(name) for name in old))
+
+    def test_commit_false_deletes_replaced_files_after_the_caller_saves(self):
+        self.save('red')
+        old = self.files()
+        form = ProfileForm({}, {'image': self.upload('blue')}, instance=self.profile)
+        self.assertTrue(form.is_valid(), form.errors)
+        profile = form.save(commit=False)
+        self.assertEqual(form.stale_files, set(old))
+        storage = profile.image.storage
+        self.assertTrue(all(storage.exists(name) for name in old))
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+            form.save_m2m()
+        self.assertFalse(any(storage.exists(name) for name in old))
+        self.assertEqual(form.stale_files, set())
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    """Fresh connections to a database file, as a server process opens them."""
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = directory / 'db.sqlite3'
+
+    def open(self, name, options):
+        wrapper = DatabaseWrapper({**connections['default'].settings_dict, 'NAME': name, 'OPTIONS': options},
+                                  alias='pragma_test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_the_pragmas(self):
+        wrapper = self.open(str(self.path), {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 0)
+
+    def test_read_only_connections_keep_the_file_journal_and_refuse_writes(self):
+        self.pragma(self.open(str(self.path), {}), 'journal_mode')
+        wrapper = self.open(f'file:{self.path}?mode=ro', {'uri': True})
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 1)
+        with self.assertRaises(DatabaseError), wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (id integer)')
+
+
+class AnalyticsDatabaseTests(TransactionTestCase):
+    """The analytics alias pointed at a read-only copy of the test database, as in production."""
+    databases = {'default', 'analytics'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('mchambuzi')
+        Entry.objects.create(owner=self.user, title='Safari', content='Arusha')
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        path = directory / 'db.sqlite3'
+        # Snapshot the in-memory test database into a file the read-only alias can open
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+        wrapper = DatabaseWrapper({**connections['analytics'].settings_dict, 'NAME': f'file:{path}?mode=ro',
+                                   'OPTIONS': {'uri': True}}, alias='analytics')
+        self.addCleanup(wrapper.close)
+        original = connections['analytics']
+        connections['analytics'] = wrapper
+        self.addCleanup(connections.__setitem__, 'analytics', original)
+        # Written after the snapshot: only reads from 'default' can see it
+        Entry.objects.create(owner=self.user, title='Baadaye', content='Dodoma')
+        self.client.force_login(self.user)
+
+    def test_report_reads_go_to_the_read_only_alias(self):
+        self.assertEqual(analytics_alias(), 'analytics')
+        body = b''.join(self.client.get('/export/', {'format': 'ndjson'}).streaming_content)
+        self.assertEqual([json.loads(line)['fields']['title'] for line in body.splitlines()], ['Safari'])
+        # Outside @analytics_reads views reads stay on 'default'
+        self.assertEqual(Entry.objects.count(), 2)
+
+    def test_writes_through_the_analytics_alias_are_rejected(self):
+        with self.assertRaises(DatabaseError):
+            Entry.objects.using('analytics').filter(owner=self.user).update(title='Imeandikwa')
+        self.assertFalse(Entry.objects.filter(title='Imeandikwa').exists())
+
+    def test_rows_loaded_from_the_analytics_alias_are_saved_to_default(self):
+        entry = Entry.objects.using('analytics').get(title='Safari')
+        entry.title = 'Safari ndefu'
+        entry.save()
+        self.assertEqual(entry._state.db, 'default')
+        self.assertTrue(Entry.objects.filter(title='Safari ndefu').exists())
+
+
+class ReportViewTests(TestCase):
+    """
+    Views wrapped in @analytics_reads, whose reads fall back to 'default' under tests;
+    AnalyticsDatabaseTests run them against a real read-only alias. Export formats are
+    covered by ExportTests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mwandishi')
+        other = User.objects.create_user('jirani')
+        Entry.objects.create(owner=cls.user, title='Safari', content='Arusha', mood='Happy')
+        Entry.objects.create(owner=cls.user, title='Kazi', content='Ofisi', mood='Neutral')
+        Entry.objects.create(owner=other, title='Siri', content='Si yangu')
+        Expense.objects.create(owner=cls.user, title='Chakula', amount=15000, category='Chakula')
+        Income.objects.create(owner=cls.user, source='Mshahara', amount=900000)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_analytics_alias_is_bypassed_under_tests(self):
+        self.assertIsNone(analytics_alias())
+
+    def test_dashboard_and_expenses_render(self):
+        for url, text in (('/dashboard/', 'Safari'), ('/expenses/', 'Chakula')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, text)
+
+    def export(self, **params):
+        response = self.client.get('/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_export_json(self):
+        response, body = self.export(include='entries,expenses')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="diary_export.json"')
+        records = json.loads(body)
+        self.assertEqual([r['model'] for r in records], ['learning_logs.entry'] * 2 + ['learning_logs.expense'])
+        self.assertEqual({r['fields']['title'] for r in records}, {'Safari', 'Kazi', 'Chakula'})
+
+    def test_export_rejects_bad_parameters(self):
+        for params in ({'format': 'xml'}, {'include': 'passwords'}, {'since': 'jana'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/export/', params).status_code, 400)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/export/', {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 2)
+
+
+@mock.patch('learning_logs.sharding.shard_aliases', lambda: ['shard_0', 'shard_1'])
+class ShardAssignmentTests(TestCase):
+    """Shard lookups; tests use local memory, which each process keeps to itself."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('msafiri')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_users_are_spread_by_id(self):
+        alias = shard_for_user(self.user.pk)
+        self.assertEqual(alias, f'shard_{self.user.pk % 2}')
+        self.assertEqual(ShardAssignment.objects.get(user=self.user).alias, alias)
+
+    def test_move_by_another_process_is_seen_right_away(self):
+        shard_for_user(self.user.pk)
+        # Another worker moves the user; its cache writes never reach this process
+        ShardAssignment.objects.filter(user=self.user).update(alias='default')
+        self.assertEqual(shard_for_user(self.user.pk), 'default')
+        assign_shard(self.user.pk, 'shard_1')
+        self.assertEqual(shard_for_user(self.user.pk), 'shard_1')
+
+    async def test_async_lookup_reads_the_assignment(self):
+        await ShardAssignment.objects.acreate(user=self.user, alias='shard_1')
+        self.assertEqual(await ashard_for_user(self.user.pk), 'shard_1')
+        await ShardAssignment.objects.filter(user=self.user).aupdate(alias='shard_0')
+        self.assertEqual(await ashard_for_user(self.user.pk), 'shard_0')
+
+
+SHARDS = ('shard_0', 'shard_1')
+
+
+@override_settings(SHARD_COUNT=2)
+class ShardingTests(TestCase):
+    """Two shard databases in use, as with SHARD_COUNT = 2 in settings."""
+    databases = {'default', 'cache', *SHARDS}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhamaji')
+        cls.tag = Tag.objects.create(name='safari')
+
+    def setUp(self):
+        cache.clear()
+
+    def _should_check_constraints(self, connection):
+        # Shard rows point at users and tags in 'default', which SQLite can't see from there
+        return not connection.alias.startswith('shard_') and super()._should_check_constraints(connection)
+
+    def assign(self, alias):
+        assign_shard(self.user.pk, alias)
+        return alias
+
+    def count(self, model, alias, **lookup):
+        return model.objects.using(alias).filter(**(lookup or {'owner': self.user})).count()
+
+    def test_requests_read_and_write_the_users_shard(self):
+        alias = self.assign('shard_1')
+        # Outside a request, ShardMiddleware isn't there to pin the shard
+        with pin(shard_for_user(self.user.pk)):
+            entry = Entry.objects.create(owner=self.user, title='Ngorongoro', content='Kreta.')
+        self.assertEqual(entry._state.db, alias)
+        self.assertEqual(self.count(Entry, 'default') + self.count(Entry, 'shard_0'), 0)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/entries/'), 'Ngorongoro')
+        response = self.client.post('/new_expense/', {'title': 'Nauli', 'amount': '2000', 'category': 'Usafiri'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.count(Expense, alias), 1)
+        self.assertEqual(self.count(Expense, 'default'), 0)
+
+    def test_finance_summary_is_retired_when_the_shard_commits(self):
+        alias = self.assign('shard_0')
+        version = finance_version(self.user.pk)
+        with self.captureOnCommitCallbacks(using=alias, execute=True), pin(alias):
+            Expense.objects.create(owner=self.user, title='Chai', amount=500)
+            self.assertEqual(finance_version(self.user.pk), version)
+        self.assertEqual(finance_version(self.user.pk), version + 1)
+
+    def test_tags_are_copied_into_every_shard(self):
+        for alias in SHARDS:
+            self.assertEqual(Tag.objects.using(alias).get(pk=self.tag.pk).name, 'safari')
+        self.tag.name = 'matembezi'
+        self.tag.save()
+        for alias in SHARDS:
+            self.assertEqual(Tag.objects.using(alias).get(pk=self.tag.pk).name, 'matembezi')
+        self.tag.delete()
+        for alias in SHARDS:
+            self.assertFalse(Tag.objects.using(alias).exists())
+
+    def populate(self):
+        with pin(shard_for_user(self.user.pk)):
+            return self._populate()
+
+    def _populate(self):
+        entry = Entry.objects.create(owner=self.user, title='Safari ya Mikumi', content='Tembo na twiga.')
+        entry.tags.add(self.tag)
+        MoodHealthMatrix.objects.create(entry=entry, mood_intensity=7)
+        bill = RecurringExpense.objects.create(owner=self.user, title='Kodi', amount=100, frequency='Monthly',
+                                               next_due_date=datetime.date(2026, 1, 31))
+        Expense.objects.create(owner=self.user, title='Kodi', amount=100, recurring_expense=bill)
+        Income.objects.create(owner=self.user, source='Mshahara', amount=500)
+        AccessLog.objects.create(user=self.user, action='Viewed Entry List', timestamp=timezone.now())
+        save_draft(self.user, f'entry-{entry.pk}', 1, {'title': 'Safari ya Mikumi', 'content': 'Rasimu.'}, flush=True)
+        return entry
+
+    def test_move_user_copies_every_row_and_clears_the_source(self):
+        self.assign('shard_0')
+        old_entry = self.populate()
+        counts = {model: self.count(model, 'shard_0', **{lookup: self.user.pk}) for model, lookup in sharded_models()}
+
+        self.assertEqual(move_user(self.user, 'shard_1'), sum(counts.values()))
+
+        self.assertEqual(shard_for_user(self.user.pk), 'shard_1')
+        for model, lookup in sharded_models():
+            with self.subTest(model=model._meta.model_name):
+                self.assertEqual(self.count(model, 'shard_0', **{lookup: self.user.pk}), 0)
+                self.assertEqual(self.count(model, 'shard_1', **{lookup: self.user.pk}), counts[model])
+        entry = Entry.objects.using('shard_1').get(owner=self.user)
+        self.assertEqual([tag.name for tag in entry.tags.all()], ['safari'])
+        self.assertEqual(entry.health_matrix.mood_intensity, 7)
+        expense = Expense.objects.using('shard_1').get(owner=self.user)
+        self.assertEqual(expense.recurring_expense, RecurringExpense.objects.using('shard_1').get(owner=self.user))
+        draft = EntryDraft.objects.using('shard_1').get(user=self.user)
+        self.assertEqual((draft.key, draft.entry_id), (f'entry-{entry.pk}', entry.pk))
+        with pin('shard_1'):
+            self.assertEqual(load_draft(self.user, draft.key)['content'], 'Rasimu.')
+        self.assertEqual([hit.entry_id for hit in search_entries(self.user, 'mikumi')], [entry.pk])
+        with pin('shard_0'):
+            self.assertFalse(Entry.objects.filter(pk=old_entry.pk).exists())
+
+    def test_deleting_a_user_clears_their_shard(self):
+        alias = self.assign('shard_1')
+        self.populate()
+        self.user.delete()
+        for model, lookup in sharded_models():
+            with self.subTest(model=model._meta.model_name):
+                self.assertEqual(model.objects.using(alias).filter(**{lookup: self.user.pk}).count(), 0)
+
+    def test_move_user_shard_command(self):
+        self.assign('shard_0')
+        self.populate()
+        out = io.StringIO()
+        call_command('move_user_shard', 'mhamaji', 'shard_1', stdout=out)
+        self.assertIn('from shard_0 to shard_1', out.getvalue())
+        self.assertEqual(self.count(Entry, 'shard_1'), 1)
+        # Without a target the user goes to the shard with the fewest users
+        call_command('move_user_shard', 'mhamaji', stdout=out)
+        self.assertEqual(shard_for_user(self.user.pk), 'shard_0')
+        with self.assertRaisesMessage(CommandError, "Unknown database 'shard_7'"):
+            call_command('move_user_shard', 'mhamaji', 'shard_7')
+
+    def test_migrate_shards_keeps_existing_users_in_default(self):
+        with self.settings(SHARD_COUNT=0):
+            Entry.objects.create(owner=self.user, title='Zamani', content='Kabla ya shards.')
+        Tag.objects.using('shard_0').all().delete()
+        call_command('migrate_shards', verbosity=0, stdout=io.StringIO())
+        self.assertEqual(shard_for_user(self.user.pk), 'default')
+        self.assertEqual(Tag.objects.using('shard_0').get().name, 'safari')
+
+
+class SearchTests(TestCase):
+    """Full-text search through FTS5; PythonSearchTests repeats them on SearchTerm rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('msomaji')
+        cls.other = User.objects.create_user('mgeni')
+        cls.safari = Entry.objects.create(owner=cls.user, title='Safari ya Serengeti', content='Tuliona simba wengi.')
+        cls.note = Entry.objects.create(owner=cls.user, title='Kumbukumbu',
+                                        content='Nilikumbuka safari yetu na café ya Arusha.')
+        Entry.objects.create(owner=cls.other, title='Safari yangu', content='Siri.')
+
+    def ids(self, query):
+        return [hit.entry_id for hit in search_entries(self.user, query)]
+
+    def test_backend(self):
+        self.assertTrue(use_fts())
+
+    def test_title_matches_rank_first_and_other_users_are_excluded(self):
+        self.assertEqual(self.ids('safari'), [self.safari.pk, self.note.pk])
+
+    def test_prefix_accent_and_all_terms(self):
+        self.assertEqual(self.ids('Seren'), [self.safari.pk])
+        self.assertEqual(self.ids('CAFE'), [self.note.pk])
+        self.assertEqual(self.ids('safari simba'), [self.safari.pk])
+        self.assertEqual(self.ids('   '), [])
+
+    def test_snippet_highlights_escaped_text(self):
+        entry = Entry.objects.create(owner=self.user, title='Html', content='<b>tembo</b> mkubwa')
+        [hit] = search_entries(self.user, 'tembo')
+        self.assertEqual(hit.entry_id, entry.pk)
+        self.assertNotIn('<b>', hit.snippet)
+        self.assertIn('<mark>', hit.snippet)
+
+    def test_index_follows_edits_tags_and_deletes(self):
+        self.safari.title = 'Mbuga'
+        self.safari.content = 'Tembo.'
+        self.safari.save()
+        self.assertEqual(self.ids('serengeti'), [])
+        tag = Tag.objects.create(name='wanyamapori')
+        self.safari.tags.add(tag)
+        self.assertEqual(self.ids('wanyama'), [self.safari.pk])
+        tag.name = 'porini'
+        tag.save()
+        self.assertEqual(self.ids('porini'), [self.safari.pk])
+        self.safari.delete()
+        self.assertEqual(self.ids('tembo'), [])
+
+    def test_rebuild_restores_a_cleared_index(self):
+        clear_index(self.user)
+        self.assertEqual(self.ids('safari'), [])
+        call_command('rebuild_search_index', user='msomaji', stdout=io.StringIO())
+        self.assertEqual(self.ids('safari'), [self.safari.pk, self.note.pk])
+        self.assertEqual(len(search_entries(self.other, 'safari')), 1)
+
+    def test_entry_list_shows_ranked_matches(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/entries/', {'q': 'safari'})
+        self.assertEqual([entry.pk for entry in response.context['entries']], [self.safari.pk, self.note.pk])
+        self.assertContains(response, '<mark>')
+        self.assertEqual(list(self.client.get('/entries/', {'q': 'ndege'}).context['entries']), [])
+
+
+@override_settings(ENTRY_SEARCH_BACKEND='python')
+class PythonSearchTests(SearchTests):
+    def test_backend(self):
+        self.assertFalse(use_fts())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhariri')
+        created = timezone.now()
+        entries = Entry.objects.bulk_create(
+            Entry(owner=cls.user, title=f'Siku {n}', content='...') for n in range(7)
+        )
+        # Pairs share a creation time, so the id breaks ties
+        for index, entry in enumerate(entries):
+            Entry.objects.filter(pk=entry.pk).update(date_created=created - datetime.timedelta(minutes=index // 2))
+        cls.expected = list(Entry.objects.order_by('-date_created', '-id').values_list('pk', flat=True))
+
+    def test_pages_cover_every_entry_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Entry.objects.filter(owner=self.user), cursor, 3)
+            seen.extend(entry.pk for entry in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_cursor_round_trip_and_bad_cursors(self):
+        created = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created, 42)), (created, 42))
+        for cursor in ('not-a-cursor', encode_cursor(created, 1)[:-4], 'eHx5'):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_json_feed(self):
+        self.client.force_login(self.user)
+        first = self.client.get('/api/entries/', {'limit': 4}).json()
+        self.assertEqual([row['id'] for row in first['results']], self.expected[:4])
+        second = self.client.get('/api/entries/', {'limit': 4, 'cursor': first['next']}).json()
+        self.assertEqual([row['id'] for row in second['results']], self.expected[4:])
+        self.assertIsNone(second['next'])
+
+    def test_json_feed_rejects_bad_parameters(self):
+        self.client.force_login(self.user)
+        for params in ({'cursor': 'garbage'}, {'limit': 'many'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/entries/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['status'], 'error')
+
+    def test_entry_list_pages_and_ignores_bad_cursors(self):
+        self.client.force_login(self.user)
+        with mock.patch('learning_logs.views.EntryListView.page_size', 5):
+            response = self.client.get('/entries/')
+            self.assertEqual([entry.pk for entry in response.context['entries']], self.expected[:5])
+            response = self.client.get('/entries/', {'cursor': response.context['next_cursor']})
+            self.assertEqual([entry.pk for entry in response.context['entries']], self.expected[5:])
+            response = self.client.get('/entries/', {'cursor': 'garbage'})
+            self.assertEqual([entry.pk for entry in response.context['entries']], self.expected[:5])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhifadhi')
+        cls.entry = Entry.objects.create(owner=cls.user, title='Ziwa', content='Victoria, "kubwa"')
+        cls.entry.tags.add(Tag.objects.create(name='maji'), Tag.objects.create(name='safari'))
+        Expense.objects.create(owner=cls.user, title='Boti', amount=5000, category='Usafiri')
+
+    def test_records_are_read_in_chunks(self):
+        Entry.objects.bulk_create(Entry(owner=self.user, title=f'E{n}', content='') for n in range(4))
+        with self.assertNumQueries(3):
+            # One cursor read in two chunks, and one tag prefetch per chunk
+            records = list(iter_records(self.user, ['entries'], chunk_size=3))
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['fields']['tags'], ['maji', 'safari'])
+
+    def test_csv_quotes_values_and_joins_tags(self):
+        body = b''.join(stream_export(self.user, 'csv', ['entries', 'expenses'])).decode()
+        header, entry, expense = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(header[:3], ['model', 'pk', 'title'])
+        row = dict(zip(header, entry))
+        self.assertEqual((row['content'], row['tags']), ('Victoria, "kubwa"', 'maji;safari'))
+        self.assertEqual(dict(zip(header, expense))['amount'], '5000.00')
+
+    def test_since_filters_by_date(self):
+        Expense.objects.update(date_added=parse_since('2024-01-01'))
+        self.assertEqual(parse_since('2024-01-02T08:30').hour, 8)
+        with self.assertRaises(ValueError):
+            parse_since('jana')
+        records = list(iter_records(self.user, ['expenses'], since=parse_since('2024-01-02')))
+        self.assertEqual(records, [])
+
+    def test_blocks_are_buffered_and_gzip_is_valid(self):
+        self.assertEqual(list(buffered(['ab', 'cd', 'ef'], size=4)), [b'abcd', b'ef'])
+        body = gzip.decompress(b''.join(stream_export(self.user, 'json', ['entries'], compress=True)))
+        self.assertEqual(json.loads(body)[0]['fields']['title'], 'Ziwa')
+
+
+@override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_EVENTS': 3, 'MAX_AGE': 60})
+class AccessLogBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mkaguzi')
+
+    def setUp(self):
+        self.buffer = AccessLogBuffer()
+
+    def event(self, action='Viewed Entry List'):
+        return AccessLog(user=self.user, action=action, ip_address='127.0.0.1', timestamp=timezone.now())
+
+    def test_events_are_written_in_one_batch_when_full(self):
+        for _ in range(2):
+            self.buffer.add(self.event())
+        self.assertFalse(self.buffer.due())
+        self.assertFalse(AccessLog.objects.exists())
+        self.buffer.add(self.event())
+        self.assertTrue(self.buffer.due())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(AccessLog.objects.count(), 3)
+        self.assertEqual(len(self.buffer), 0)
+
+    @override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_AGE': 0})
+    def test_old_events_are_due(self):
+        self.assertFalse(self.buffer.due())
+        self.buffer.add(self.event())
+        self.assertTrue(self.buffer.due())
+
+    @override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_PENDING': 2})
+    def test_pending_events_are_capped(self):
+        self.buffer.add(self.event('a'))
+        self.buffer.add(self.event('b'))
+        with self.assertLogs('learning_logs.audit', 'WARNING') as logs:
+            self.buffer.add(self.event('c'))
+        self.assertIn('dropped 1 oldest', logs.output[0])
+        self.buffer.flush()
+        self.assertEqual(sorted(AccessLog.objects.values_list('action', flat=True)), ['b', 'c'])
+
+    @override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_PENDING': 2})
+    def test_requeue_keeps_the_newest_events(self):
+        self.buffer.add(self.event('a'))
+        self.buffer.add(self.event('b'))
+
+        def fail_and_log_more(*args, **kwargs):
+            self.buffer.add(self.event('c'))
+            raise DatabaseError
+
+        with mock.patch('django.db.models.QuerySet.bulk_create', side_effect=fail_and_log_more), \
+                self.assertLogs('learning_logs.audit', 'WARNING') as logs:
+            self.buffer.flush()
+        self.assertIn('dropped 1 oldest', logs.output[-1])
+        self.buffer.flush()
+        self.assertEqual(sorted(AccessLog.objects.values_list('action', flat=True)), ['b', 'c'])
+
+    @override_settings(ACCESS_LOG_BUFFER={'ENABLED': False})
+    def test_disabled_buffer_writes_right_away(self):
+        self.buffer.add(self.event())
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(AccessLog.objects.count(), 1)
+
+    def test_failed_flush_requeues(self):
+        self.buffer.add(self.event())
+        with mock.patch('django.db.models.QuerySet.bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('learning_logs.audit', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_events_for_a_swapped_database_are_dropped(self):
+        with mock.patch('learning_logs.audit._database', return_value=('default', 'elsewhere.sqlite3')):
+            self.buffer.add(self.event())
+        with self.assertLogs('learning_logs.audit', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertFalse(AccessLog.objects.exists())
+
+    @override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_EVENTS': 1})
+    def test_buffer_is_flushed_when_a_request_finishes(self):
+        self.client.force_login(self.user)
+        self.addCleanup(access_log_buffer.flush)
+        self.client.get('/entries/')
+        self.assertEqual(list(AccessLog.objects.values_list('action', flat=True)), ['Viewed Entry List'])
+
+
+@override_settings(ACCESS_LOG_BUFFER={'ENABLED': True, 'MAX_EVENTS': 100, 'MAX_AGE': 60})
+class AccessLogExitFlushTests(TransactionTestCase):
+    def test_events_still_queued_are_written_at_exit(self):
+        user = User.objects.create_user('mlango')
+        access_log_buffer.add(AccessLog(user=user, action='Viewed Entry List', timestamp=timezone.now()))
+        self.assertFalse(AccessLog.objects.exists())
+        flush_at_exit()
+        self.assertEqual(len(access_log_buffer), 0)
+        self.assertEqual(AccessLog.objects.count(), 1)
+
+
+class AccessLogRetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mlinzi')
+        now = timezone.now()
+        old = now - datetime.timedelta(days=120)
+        AccessLog.objects.bulk_create(
+            [AccessLog(user=cls.user, action='Viewed Entry List', timestamp=old) for _ in range(3)]
+            + [AccessLog(user=cls.user, action='Exported data', timestamp=old),
+               AccessLog(user=cls.user, action='Viewed Entry List', timestamp=now)]
+        )
+        cls.old, cls.old_day = old, timezone.localdate(old)
+
+    def setUp(self):
+        self.archive_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def prune(self, *args):
+        call_command('prune_access_logs', '--days=90', '--batch-size=2', f'--archive-dir={self.archive_dir}',
+                     *args, stdout=io.StringIO())
+
+    def rollups(self):
+        return set(AccessLogRollup.objects.values_list('day', 'action', 'count'))
+
+    def archived(self):
+        rows = []
+        for archive in sorted(self.archive_dir.iterdir()):
+            with gzip.open(archive, 'rt') as lines:
+                rows += [json.loads(line) for line in lines]
+        return rows
+
+    def test_old_rows_are_rolled_up_archived_and_deleted(self):
+        ids = list(AccessLog.objects.order_by('id').values_list('id', flat=True))
+        self.prune()
+        self.assertEqual(AccessLog.objects.count(), 1)
+        self.assertEqual(self.rollups(), {(self.old_day, 'Viewed Entry List', 3), (self.old_day, 'Exported data', 1)})
+        # One file per batch of two, named after the database, month and id range
+        self.assertEqual(sorted(path.name for path in self.archive_dir.iterdir()), [
+            f"accesslog-default-{self.old:%Y-%m}-{ids[0]:010d}-{ids[1]:010d}.ndjson.gz",
+            f"accesslog-default-{self.old:%Y-%m}-{ids[2]:010d}-{ids[3]:010d}.ndjson.gz",
+        ])
+        rows = self.archived()
+        self.assertEqual([row['id'] for row in rows], ids[:4])
+        self.assertEqual({row['user_id'] for row in rows}, {self.user.pk})
+
+    def test_rerun_after_a_failed_delete_archives_each_row_once(self):
+        with mock.patch('django.db.models.QuerySet.delete', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.prune()
+        # The batch was archived, then rolled back with its rollups
+        self.assertEqual(AccessLog.objects.count(), 5)
+        self.assertFalse(AccessLogRollup.objects.exists())
+        self.prune()
+        self.assertEqual(len(self.archived()), 4)
+        self.assertEqual(len({row['id'] for row in self.archived()}), 4)
+
+    def test_rerun_adds_to_existing_rollups(self):
+        self.prune('--no-archive')
+        AccessLog.objects.create(user=self.user, action='Exported data', timestamp=self.old)
+        self.prune('--no-archive')
+        self.assertIn((self.old_day, 'Exported data', 2), self.rollups())
+        self.assertEqual(list(self.archive_dir.iterdir()), [])
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhesabu')
+
+    def stats(self):
+        return UserStats.objects.values('entry_count', 'topic_count', 'expense_count', 'income_count').get(user=self.user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        first = Entry.objects.create(owner=self.user, title='Moja', content='')
+        latest = Entry.objects.create(owner=self.user, title='Mbili', content='')
+        Topic.objects.create(owner=self.user, text='Python')
+        expense = Expense.objects.create(owner=self.user, title='Chai', amount=500, category='Chakula')
+        Income.objects.create(owner=self.user, source='Mauzo', amount=1000)
+        self.assertEqual(self.stats(), {'entry_count': 2, 'topic_count': 1, 'expense_count': 1, 'income_count': 1})
+        self.assertEqual(UserStats.objects.get(user=self.user).last_entry_at, latest.date_created)
+
+        latest.delete()
+        expense.delete()
+        self.assertEqual(self.stats(), {'entry_count': 1, 'topic_count': 1, 'expense_count': 0, 'income_count': 1})
+        self.assertEqual(UserStats.objects.get(user=self.user).last_entry_at, first.date_created)
+
+    def test_missing_row_is_built_from_source_tables(self):
+        Entry.objects.create(owner=self.user, title='Moja', content='')
+        topic = Topic.objects.create(owner=self.user, text='Django')
+        UserStats.objects.filter(user=self.user).delete()
+        # A delete never creates the row...
+        topic.delete()
+        self.assertFalse(UserStats.objects.filter(user=self.user).exists())
+        self.assertEqual(UserStats.for_user(self.user).entry_count, 1)
+        # ...and a creation counts everything, itself included
+        Topic.objects.create(owner=self.user, text='Python')
+        self.assertEqual(self.stats(), {'entry_count': 1, 'topic_count': 1, 'expense_count': 0, 'income_count': 0})
+
+    def test_reconcile_repairs_drift(self):
+        Entry.objects.create(owner=self.user, title='Moja', content='')
+        # Bulk paths skip the signals
+        Income.objects.bulk_create([Income(owner=self.user, source='Zawadi', amount=10)] * 2)
+        out = io.StringIO()
+        call_command('reconcile_user_stats', user='mhesabu', stdout=out)
+        self.assertIn('fixed income_count', out.getvalue())
+        self.assertEqual(self.stats()['income_count'], 2)
+        out = io.StringIO()
+        call_command('reconcile_user_stats', stdout=out)
+        self.assertIn('repaired 0', out.getvalue())
+
+
+class MoodRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhisia')
+
+    def rollups(self):
+        return sorted(MoodDailyRollup.objects.filter(user=self.user, entry_count__gt=0)
+                      .values_list('mood', 'entry_count', 'intensity_sum', 'intensity_count'))
+
+    def assertNoDrift(self):
+        incremental = self.rollups()
+        rebuild_mood_rollups(self.user)
+        self.assertEqual(incremental, self.rollups())
+
+    def test_rollups_follow_entries_moods_and_intensity(self):
+        happy = Entry.objects.create(owner=self.user, title='A', content='', mood='Happy')
+        sad = Entry.objects.create(owner=self.user, title='B', content='', mood='Sad')
+        Entry.objects.create(owner=self.user, title='C', content='')
+        matrix = MoodHealthMatrix.objects.create(entry=happy, mood_intensity=8)
+        self.assertEqual(self.rollups(), [('Happy', 1, 8, 1), ('Sad', 1, 0, 0)])
+        self.assertNoDrift()
+
+        matrix.mood_intensity = 6
+        matrix.save()
+        happy.mood = 'Sad'
+        happy.save()
+        self.assertEqual(self.rollups(), [('Sad', 2, 6, 1)])
+        self.assertNoDrift()
+
+        happy.delete()
+        sad.mood = ''
+        sad.save()
+        self.assertEqual(self.rollups(), [])
+        self.assertNoDrift()
+
+    def test_trend_scores_each_day(self):
+        Entry.objects.create(owner=self.user, title='A', content='', mood='Happy')
+        entry = Entry.objects.create(owner=self.user, title='B', content='', mood='Sad')
+        MoodHealthMatrix.objects.create(entry=entry, mood_intensity=4)
+        [point] = mood_trend(self.user)
+        self.assertEqual(point, {'date': timezone.localdate().isoformat(), 'score': 5.5, 'count': 2, 'intensity': 4.0})
+        self.assertEqual(mood_trend(User.objects.create_user('mwingine')), [])
+
+
+class SpendLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mtumiaji')
+
+    def ledger(self):
+        return sorted(DailySpend.objects.filter(user=self.user, count__gt=0).values_list('category', 'total', 'count'))
+
+    def assertNoDrift(self):
+        incremental = self.ledger()
+        rebuild_spend_ledger(self.user)
+        self.assertEqual(incremental, self.ledger())
+
+    def test_ledger_follows_expense_changes(self):
+        lunch = Expense.objects.create(owner=self.user, title='Chakula', amount=Decimal('4500.50'), category='Chakula')
+        Expense.objects.create(owner=self.user, title='Daladala', amount=800, category='Usafiri')
+        self.assertEqual(self.ledger(), [('Chakula', Decimal('4500.50'), 1), ('Usafiri', Decimal('800'), 1)])
+        self.assertNoDrift()
+
+        lunch = Expense.objects.get(pk=lunch.pk)
+        lunch.amount, lunch.category = 1200, 'Usafiri'
+        lunch.save()
+        self.assertEqual(self.ledger(), [('Usafiri', Decimal('2000'), 2)])
+        self.assertNoDrift()
+
+        lunch.delete()
+        self.assertEqual(self.ledger(), [('Usafiri', Decimal('800'), 1)])
+        self.assertNoDrift()
+
+    def test_summary_reads_the_ledger_in_one_query(self):
+        today = datetime.date(2026, 3, 15)
+        for day, amount, category in ((15, 1000, 'Chakula'), (15, 500, 'Usafiri'), (13, 3000, 'Chakula'), (-27, 9000, 'Burudani')):
+            expense = Expense.objects.create(owner=self.user, title='x', amount=amount, category=category)
+            booked = today + datetime.timedelta(days=day - 15)
+            Expense.objects.filter(pk=expense.pk).update(
+                date_added=timezone.make_aware(datetime.datetime.combine(booked, datetime.time(12))))
+        rebuild_spend_ledger(self.user)
+        with self.assertNumQueries(1):
+            summary = spending_summary(self.user, today=today)
+        self.assertEqual((summary['today_total'], summary['today_count']), (1500, 2))
+        self.assertEqual(len(summary['chart']), 7)
+        self.assertEqual(summary['chart'][-1], (today, Decimal('1500')))
+        self.assertEqual(summary['chart'][-3], (datetime.date(2026, 3, 13), Decimal('3000')))
+        # February's expense is outside both the chart and the month
+        self.assertEqual(summary['by_category'], [('Chakula', Decimal('4000')), ('Usafiri', Decimal('500'))])
+        self.assertEqual(summary['month_total'], 4500)
+
+
+class FinancialSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mhasibu')
+        cls.other = User.objects.create_user('jirani')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_summary_is_cached_until_a_committed_change(self):
+        Income.objects.create(owner=self.user, source='Mshahara', amount=1000)
+        self.assertEqual(financial_summary(self.user)['income_sum'], 1000)
+        with self.assertNumQueries(0):
+            financial_summary(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.user, title='Chai', amount=300, category='Chakula')
+        summary = financial_summary(self.user)
+        self.assertEqual((summary['income_sum'], summary['expense_total']), (1000, 300))
+
+    def test_change_is_only_visible_after_commit(self):
+        financial_summary(self.user)
+        version = finance_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Income.objects.create(owner=self.user, source='Mauzo', amount=50)
+            self.assertEqual(finance_version(self.user.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(finance_version(self.user.pk), version)
+        self.assertEqual(financial_summary(self.user)['income_sum'], 50)
+
+    def test_versions_are_per_user_and_survive_eviction(self):
+        version = finance_version(self.user.pk)
+        other = finance_version(self.other.pk)
+        bump_finance_version(self.user.pk)
+        self.assertEqual(finance_version(self.user.pk), version + 1)
+        self.assertEqual(finance_version(self.other.pk), other)
+        cache.delete(f"finance:version:{self.user.pk}")
+        # A lost version restarts from the clock, never below an earlier one
+        with mock.patch('learning_logs.finance.time.time', return_value=version / 1000 + 60):
+            bump_finance_version(self.user.pk)
+        self.assertEqual(finance_version(self.user.pk), version + 60000)
+
+
+class SeedAndBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', users=1, entries=30, tags=5, expenses=40, incomes=5, recurring=3,
+                     days=20, stdout=io.StringIO())
+        cls.user = User.objects.get(username='seed_0')
+
+    def test_seeded_derived_tables_match_their_sources(self):
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual({name: getattr(stats, name) for name in UserStats.computed(self.user.pk)},
+                         UserStats.computed(self.user.pk))
+        self.assertEqual(stats.entry_count, 30)
+        ledger = DailySpend.objects.filter(user=self.user).aggregate(total=Sum('total'), count=Sum('count'))
+        self.assertEqual(ledger['count'], 40)
+        self.assertEqual(ledger['total'], Expense.objects.filter(owner=self.user).aggregate(Sum('amount'))['amount__sum'])
+        self.assertEqual(MoodDailyRollup.objects.filter(user=self.user).aggregate(Sum('entry_count'))['entry_count__sum'],
+                         Entry.objects.filter(owner=self.user).exclude(mood='').count())
+        title = Entry.objects.filter(owner=self.user).values_list('title', flat=True).first()
+        self.assertTrue(search_entries(self.user, title))
+
+    def test_existing_users_are_not_reseeded(self):
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            call_command('seed_data', users=1, stdout=io.StringIO())
+
+    def test_benchmark_runs_every_view_and_compares_baselines(self):
+        baseline = Path(tempfile.mkdtemp()) / 'baseline.json'
+        self.addCleanup(shutil.rmtree, baseline.parent)
+        out = io.StringIO()
+        call_command('benchmark_views', runs=2, warmup=0, save_baseline=str(baseline), stdout=out)
+        results = json.loads(baseline.read_text())
+        self.assertEqual(set(results), {'dashboard', 'index', 'expenses', 'entry_list', 'calendar',
+                                        'calendar_data', 'export_data'})
+        # Any query beyond the baseline's count is a regression
+        results['index']['queries'] = 0
+        baseline.write_text(json.dumps(results))
+        with self.assertRaisesMessage(CommandError, 'index: queries'):
+            call_command('benchmark_views', runs=1, warmup=0, views='index', compare=str(baseline), stdout=out)
+
+    def test_api_benchmark_reports_stale_saves_apart_from_successes(self):
+        out = io.StringIO()
+        BenchmarkApi(stdout=out).report('autosave', 'asgi', [1.0] * 4, [200, 409, 409, 500], elapsed=2.0)
+        self.assertIn('ok_rps=     0.5', out.getvalue())
+        self.assertIn('ok=1 stale=2 failed=1', out.getvalue())
+
+
+@override_settings(PERFORMANCE_MONITORING={'ENABLED': True, 'DUPLICATE_QUERY_THRESHOLD': 3, 'SLOW_REQUEST_MS': 10000})
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        stats = mock.patch('learning_logs.middleware.request_stats', PerformanceStats())
+        self.stats = stats.start()
+        self.addCleanup(stats.stop)
+
+    def view(self, queries):
+        def get_response(request):
+            for _ in range(queries):
+                list(User.objects.filter(pk=1))
+            return HttpResponse(Template('{% for n in items %}{{ n }}{% endfor %}').render(Context({'items': [1, 2]})))
+        return PerformanceMiddleware(get_response)
+
+    def test_disabled_by_default(self):
+        with override_settings(PERFORMANCE_MONITORING={}), self.assertRaises(MiddlewareNotUsed):
+            PerformanceMiddleware(lambda request: HttpResponse())
+
+    def test_server_timing_and_stats(self):
+        response = self.view(2)(RequestFactory().get('/about/'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="2 queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertNotIn('X-Duplicate-Queries', response)
+        report = self.stats.snapshot()['/about/']
+        self.assertEqual((report['requests'], report['avg_queries']), (1, 2))
+
+    def test_template_render_is_only_wrapped_during_monitored_requests(self):
+        original = Template.render
+        seen = []
+
+        def get_response(request):
+            seen.append(Template.render)
+            return HttpResponse()
+        PerformanceMiddleware(get_response)(RequestFactory().get('/about/'))
+        self.assertIsNot(seen[0], original)
+        self.assertIs(Template.render, original)
+
+    def test_repeated_queries_are_flagged_and_logged(self):
+        with self.assertLogs('learning_logs.performance', 'WARNING') as logs:
+            response = self.view(3)(RequestFactory().get('/about/'))
+        self.assertEqual(response['X-Duplicate-Queries'], '3')
+        self.assertIn('possible N+1 (3x)', logs.output[0])
+
+    @override_settings(PERFORMANCE_MONITORING={'ENABLED': True, 'SAMPLES_PER_URL': 2})
+    def test_samples_are_bounded_per_url(self):
+        middleware = self.view(0)
+        for _ in range(3):
+            middleware(RequestFactory().get('/about/'))
+        report = self.stats.snapshot()['/about/']
+        self.assertEqual((report['requests'], report['sampled']), (3, 2))
+
+    def test_stats_view_is_staff_only(self):
+        user = User.objects.create_user('mtazamaji')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/performance/').status_code, 302)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.client.get('/api/performance/').json(), {'enabled': True, 'views': {}})
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.user = User.objects.create_user('mlipaji', last_login=timezone.now())
+        cls.bill = RecurringExpense.objects.create(owner=cls.user, title='Kodi', amount=100000, frequency='Monthly',
+                                                   next_due_date=cls.today + datetime.timedelta(days=2))
+        RecurringExpense.objects.create(owner=cls.user, title='Netflix', amount=20000, frequency='Monthly',
+                                        next_due_date=cls.today + datetime.timedelta(days=10))
+        # Away for too long to be nudged
+        User.objects.create_user('msafiri', last_login=timezone.now() - datetime.timedelta(days=60))
+
+    def inbox(self):
+        return sorted(Notification.inbox(self.user).values_list('kind', 'message'))
+
+    def test_reruns_insert_and_publish_nothing_new(self):
+        with mock.patch('learning_logs.notifications.publish') as publish:
+            generate_notifications(self.today)
+            self.assertEqual(publish.call_count, 2)
+            publish.reset_mock()
+            generate_notifications(self.today)
+            publish.assert_not_called()
+        self.assertEqual(self.inbox(), [
+            ('bill', 'Kikumbusho: Kodi inatakiwa kulipwa baada ya siku 2'),
+            ('no_expense', 'Leo bado hujaweka matumizi yako. Kumbuka kurekodi!'),
+        ])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_bill_reminder_changes_daily_and_expires(self):
+        generate_notifications(self.today)
+        generate_notifications(self.today + datetime.timedelta(days=2))
+        messages = Notification.objects.filter(kind='bill').order_by('expires_on').values_list('message', flat=True)
+        self.assertEqual(list(messages), ['Kikumbusho: Kodi inatakiwa kulipwa baada ya siku 2',
+                                          'Kikumbusho: Kodi inatakiwa kulipwa leo (TZS 100000.00)'])
+        # Yesterday's copies have expired
+        with mock.patch('django.utils.timezone.localdate', return_value=self.today + datetime.timedelta(days=2)):
+            self.assertEqual(len(self.inbox()), 2)
+        self.assertEqual(prune_notifications(self.today + datetime.timedelta(days=40), keep_days=30), 4)
+
+    def test_recording_an_expense_answers_the_nudge(self):
+        generate_notifications(self.today)
+        Expense.objects.create(owner=self.user, title='Chai', amount=500, category='Chakula')
+        self.assertEqual([kind for kind, _ in self.inbox()], ['bill'])
+        Notification.objects.all().delete()
+        generate_notifications(self.today)
+        self.assertEqual([kind for kind, _ in self.inbox()], ['bill'])
+
+    def test_inbox_can_be_dismissed(self):
+        generate_notifications(self.today)
+        self.client.force_login(self.user)
+        bill = Notification.objects.get(kind='bill')
+        self.assertEqual(self.client.post('/notifications/read/', {'id': 'x'}).status_code, 400)
+        self.client.post('/notifications/read/', {'id': bill.pk})
+        self.assertEqual([kind for kind, _ in self.inbox()], ['no_expense'])
+        self.client.post('/notifications/read/')
+        self.assertEqual(self.inbox(), [])
+
+
+@override_settings(TIME_ZONE='Africa/Dar_es_Salaam')
+class BulkMoveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mpangaji')
+        cls.other = User.objects.create_user('jirani')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        start = timezone.make_aware(datetime.datetime(2026, 5, 4, 18, 30))
+        self.entries = [Entry.objects.create(owner=self.user, title=f'Kazi {n}', content='',
+                                             event_date=start + datetime.timedelta(days=n)) for n in range(3)]
+        self.foreign = Entry.objects.create(owner=self.other, title='Siri', content='', event_date=start)
+
+    def post(self, moves, url='/api/move_entries/'):
+        return self.client.post(url, json.dumps(moves), content_type='application/json')
+
+    def event_dates(self):
+        return [timezone.localtime(Entry.objects.get(pk=entry.pk).event_date) for entry in self.entries]
+
+    def test_moves_keep_the_time_of_day_and_return_touched_cells(self):
+        response = self.post({'moves': [{'entry_id': self.entries[0].pk, 'date': '2026-05-20'},
+                                        {'entry_id': self.entries[1].pk, 'date': '2026-06-01'}]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['moved'], 2)
+        self.assertEqual(set(data['cells']), {'2026-05-04', '2026-05-05', '2026-05-20', '2026-06-01'})
+        self.assertIn('Kazi 0', data['cells']['2026-05-20'])
+        moved = self.event_dates()
+        self.assertEqual([(d.date().isoformat(), d.hour, d.minute) for d in moved[:2]],
+                         [('2026-05-20', 18, 30), ('2026-06-01', 18, 30)])
+
+    def test_foreign_or_missing_entries_move_nothing(self):
+        before = self.event_dates()
+        for entry_id in (self.foreign.pk, 999999):
+            with self.subTest(entry_id=entry_id):
+                response = self.post({'moves': [{'entry_id': self.entries[0].pk, 'date': '2026-05-20'},
+                                                {'entry_id': entry_id, 'date': '2026-05-20'}]})
+                self.assertEqual(response.status_code, 404)
+                self.assertIn(str(entry_id), response.json()['message'])
+        self.assertEqual(self.event_dates(), before)
+        self.assertEqual(self.post({'entry_id': self.foreign.pk, 'date': '2026-05-20'},
+                                   url='/api/update_entry_date/').status_code, 404)
+
+    def test_bad_requests(self):
+        entry_id = self.entries[0].pk
+        too_many = [{'entry_id': n, 'date': '2026-05-20'} for n in range(MAX_MOVES + 1)]
+        for body in ([], {'moves': []}, {'moves': too_many},
+                     {'moves': [{'entry_id': entry_id, 'date': '2026-05-20'}] * 2},
+                     {'moves': [{'entry_id': entry_id, 'date': '20/05/2026'}]},
+                     {'moves': [{'entry_id': 'x', 'date': '2026-05-20'}]}):
+            with self.subTest(body=str(body)[:60]):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertEqual(self.client.get('/api/move_entries/').status_code, 405)
+
+    def test_updates_are_chunked(self):
+        moves = {entry.pk: datetime.date(2026, 7, 1) for entry in self.entries}
+        with mock.patch('learning_logs.utils.MAX_MOVES', 2), CaptureQueriesContext(connection) as queries:
+            move_entries(self.user, moves)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "learning_logs_entry"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual({d.date() for d in self.event_dates()}, {datetime.date(2026, 7, 1)})
+
+    def test_single_entry_drag_and_drop(self):
+        response = self.post({'entry_id': self.entries[2].pk, 'date': '2026-05-01'}, url='/api/update_entry_date/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['cells']), {'2026-05-01', '2026-05-06'})
+        self.assertEqual(self.event_dates()[2].date(), datetime.date(2026, 5, 1))
+
+
+@override_settings(MEDIA_DERIVATIVES={'WIDTHS': (50, 100, 400), 'ASYNC': False})
+class DerivativeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mpiga-picha')
+        cls.entry = Entry.objects.create(owner=cls.user, title='Picha', content='')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings = override_settings(MEDIA_VAULT_ROOT=root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def attach(self, data, content_type='image/png', file_type='image', name='photo.png'):
+        content = ContentFile(data, name=name)
+        digest, size = file_digest(content)
+        with self.captureOnCommitCallbacks(execute=True):
+            attachment = attach(self.entry, content, digest, size, content_type, file_type, name)
+        attachment.blob.refresh_from_db()
+        return attachment
+
+    def png(self, size=(300, 200)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'green').save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def test_previews_are_rendered_without_upscaling(self):
+        blob = self.attach(self.png()).blob
+        self.assertEqual(blob.derivatives_status, 'ready')
+        self.assertEqual(sorted(blob.derivatives), ['100', '50'])
+        preview = blob.derivatives['100']
+        self.assertEqual((preview['width'], preview['height'], preview['content_type']), (100, 67, 'image/webp'))
+        self.assertTrue(vault_storage().exists(preview['name']))
+        self.assertEqual(blob.derivative_for(60)['width'], 100)
+        self.assertEqual(blob.derivative_for(1000)['width'], 100)
+
+    def test_download_picks_the_nearest_preview(self):
+        attachment = self.attach(self.png())
+        self.client.force_login(self.user)
+        url = f'/attachments/{attachment.pk}/'
+        response = self.client.get(url, {'w': 60})
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as preview:
+            self.assertEqual(preview.width, 100)
+        self.assertEqual(self.client.get(url)['Content-Type'], 'image/png')
+        self.assertEqual(self.client.get(url, {'w': 'big'}).status_code, 400)
+
+    def test_unrenderable_blobs(self):
+        self.assertEqual(self.attach(b'ID3 sauti', 'audio/mpeg', 'audio', 'clip.mp3').blob.derivatives_status, 'none')
+        with self.assertLogs('learning_logs.derivatives', 'WARNING'):
+            self.assertEqual(self.attach(b'not a png').blob.derivatives_status, 'failed')
+        with mock.patch('learning_logs.imaging.shutil.which', return_value=None):
+            blob = self.attach(b'%PDF-1.4 ...', 'application/pdf', 'pdf', 'notes.pdf').blob
+        self.assertEqual((blob.derivatives_status, blob.derivatives), ('none', {}))
+
+    def test_previews_are_shared_and_deleted_with_the_blob(self):
+        first = self.attach(self.png())
+        # Already rendered, so a duplicate upload renders nothing
+        with mock.patch('learning_logs.derivatives.render_derivatives') as render:
+            second = self.attach(self.png())
+        render.assert_not_called()
+        blob = second.blob
+        self.assertEqual(blob.pk, first.blob_id)
+        names = [item['name'] for item in blob.derivatives.values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.delete()
+        self.assertFalse(any(vault_storage().exists(name) for name in names))
+
+
+class AsyncApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mwepesi')
+        cls.entry = Entry.objects.create(owner=cls.user, title='Mkutano', content='',
+                                         event_date=timezone.make_aware(datetime.datetime(2026, 5, 4, 9)))
+        cls.foreign = Entry.objects.create(owner=User.objects.create_user('jirani'), title='Siri', content='')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertInvalid(self, value, schema, message):
+        with self.assertRaisesMessage(SchemaError, message):
+            validate(value, SCHEMAS[schema])
+
+    def test_validate(self):
+        validate({'entry_id': 3, 'date': '2026-05-04'}, SCHEMAS['entry_date.request'])
+        self.assertInvalid([], 'entry_date.request', '$: expected object')
+        self.assertInvalid({'date': '2026-05-04'}, 'entry_date.request', '$: missing entry_id')
+        self.assertInvalid({'entry_id': True, 'date': '2026-05-04'}, 'entry_date.request', '$.entry_id: expected integer')
+        self.assertInvalid({'entry_id': 0, 'date': '2026-05-04'}, 'entry_date.request', '$.entry_id: less than 1')
+        self.assertInvalid({'entry_id': 3, 'date': '4/5/2026'}, 'entry_date.request', '$.date: does not match')
+        self.assertInvalid({'entry_id': 3, 'date': '2026-05-04', 'x': 1}, 'entry_date.request', 'unexpected property x')
+        self.assertInvalid({'revision': 1, 'changes': {'mood': 'Bored'}}, 'autosave.request', '$.changes.mood: must be one of')
+        self.assertInvalid({'revision': 1, 'changes': {'title': 'x' * 201}}, 'autosave.request',
+                           '$.changes.title: longer than 200 characters')
+        self.assertInvalid({'status': 'success', 'cells': {'2026-05-04': 1}}, 'entry_date.response',
+                           '$.cells.2026-05-04: expected string')
+
+    async def post(self, url, body):
+        await self.async_client.aforce_login(self.user)
+        data = body if isinstance(body, str) else json.dumps(body)
+        return await self.async_client.post(url, data, content_type='application/json')
+
+    async def test_calendar_month(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/v2/calendar/', {'year': 2026, 'month': 5})
+        self.assertEqual(response.status_code, 200)
+        validate(response.json(), SCHEMAS['calendar_month.response'])
+        self.assertIn('Mkutano', response.json()['html'])
+        for params in ({'year': 2026, 'month': 13}, {'year': 2026}, {'year': 'x', 'month': 1}):
+            with self.subTest(params=params):
+                response = await self.async_client.get('/api/v2/calendar/', params)
+                self.assertEqual(response.status_code, 400)
+                validate(response.json(), SCHEMAS['error.response'])
+
+    async def test_entry_date(self):
+        response = await self.post('/api/v2/entry_date/', {'entry_id': self.entry.pk, 'date': '2026-05-06'})
+        self.assertEqual(response.status_code, 200)
+        validate(response.json(), SCHEMAS['entry_date.response'])
+        self.assertEqual(set(response.json()['cells']), {'2026-05-04', '2026-05-06'})
+        moved = await Entry.objects.aget(pk=self.entry.pk)
+        self.assertEqual(timezone.localtime(moved.event_date).date(), datetime.date(2026, 5, 6))
+
+    async def test_entry_date_errors(self):
+        for body, status in (('{', 400), ({'entry_id': self.entry.pk, 'date': '2026-02-30'}, 400),
+                             ({'entry_id': self.entry.pk}, 400),
+                             ({'entry_id': self.foreign.pk, 'date': '2026-05-06'}, 404)):
+            with self.subTest(body=body):
+                response = await self.post('/api/v2/entry_date/', body)
+                self.assertEqual(response.status_code, status)
+                validate(response.json(), SCHEMAS['error.response'])
+        self.assertEqual((await self.async_client.get('/api/v2/entry_date/')).status_code, 405)
+
+    async def test_autosave(self):
+        body = {'draft_key': 'new', 'revision': 1, 'changes': {'title': 'Wazo'}}
+        response = await self.post('/api/v2/autosave/', body)
+        self.assertEqual(response.status_code, 200)
+        validate(response.json(), SCHEMAS['autosave.response'])
+        response = await self.post('/api/v2/autosave/', body)
+        self.assertEqual((response.status_code, response.json()), (409, {'status': 'stale', 'revision': 1}))
+        response = await self.post('/api/v2/autosave/', {**body, 'revision': 2, 'changes': {'mood': 'Bored'}})
+        self.assertEqual(response.status_code, 400)
+        response = await self.post('/api/v2/autosave/', {**body, 'draft_key': f'entry-{self.foreign.pk}'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_schema_endpoint(self):
+        self.assertEqual(self.client.get('/api/v2/schema/').json(), SCHEMAS)
+
+
+class LiveEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('msikilizaji')
+
+    def setUp(self):
+        bus = mock.patch('learning_logs.events.bus', EventBus())
+        self.bus = bus.start()
+        self.addCleanup(bus.stop)
+
+    def test_replay_returns_what_a_client_missed(self):
+        first, second, third = (publish(self.user.pk, 'reminder', {'n': n}) for n in range(3))
+        self.assertLess(first.id, second.id)
+        self.assertEqual(self.bus.replay(self.user.pk, first.id), [second, third])
+        self.assertEqual(self.bus.replay(self.user.pk, str(third.id)), [])
+        self.assertIsNone(self.bus.replay(self.user.pk, 'unknown'))
+        self.assertIsNone(self.bus.replay(0, first.id))
+
+    @override_settings(LIVE_EVENTS={'REPLAY_SIZE': 2, 'REPLAY_USERS': 1})
+    def test_replay_buffers_are_bounded(self):
+        first, *rest = (publish(self.user.pk, 'reminder', {'n': n}) for n in range(3))
+        self.assertIsNone(self.bus.replay(self.user.pk, first.id))
+        self.assertEqual(self.bus.replay(self.user.pk, rest[0].id), rest[1:])
+        # Only the most recently active user keeps a buffer
+        publish(0, 'reminder', {})
+        self.assertIsNone(self.bus.replay(self.user.pk, rest[0].id))
+
+    def test_entry_changes_are_published_after_commit(self):
+        event_date = timezone.make_aware(datetime.datetime(2026, 5, 4, 12))
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = Entry.objects.create(owner=self.user, title='Habari', content='', event_date=event_date)
+            self.assertEqual(self.bus._recent, {})
+        [event] = self.bus._recent[self.user.pk]
+        self.assertEqual((event.kind, event.data['entry_ids']), ('entry', [entry.pk]))
+        self.assertEqual(event.data['days'], [timezone.localdate(event_date).isoformat()])
+
+    async def read(self, stream, count):
+        return [await asyncio.wait_for(anext(stream), 1) for _ in range(count)]
+
+    async def test_stream_replays_then_follows_live_events(self):
+        first, second = publish(self.user.pk, 'reminder', {'n': 1}), publish(self.user.pk, 'reminder', {'n': 2})
+        stream = event_stream(self.user.pk, str(first.id))
+        try:
+            retry, replayed = await self.read(stream, 2)
+            self.assertEqual(retry, 'retry: 3000\n\n')
+            self.assertEqual(replayed, f'id: {second.id}\nevent: reminder\ndata: {{"n":2}}\n\n')
+            live = publish(self.user.pk, 'milestone', {'count': 100})
+            self.assertEqual(await self.read(stream, 1), [f'id: {live.id}\nevent: milestone\ndata: {{"count":100}}\n\n'])
+        finally:
+            await stream.aclose()
+        self.assertEqual(self.bus._subscriptions, {})
+
+    async def test_stream_asks_for_a_resync_when_events_were_lost(self):
+        stream = event_stream(self.user.pk, 'forgotten')
+        try:
+            self.assertEqual((await self.read(stream, 2))[1], 'event: resync\ndata: {}\n\n')
+        finally:
+            await stream.aclose()
+
+    @override_settings(LIVE_EVENTS={'QUEUE_SIZE': 2, 'HEARTBEAT': 0.01})
+    async def test_slow_clients_resync_and_idle_streams_get_heartbeats(self):
+        stream = event_stream(self.user.pk)
+        try:
+            await self.read(stream, 1)
+            self.assertEqual(await self.read(stream, 1), [': heartbeat\n\n'])
+            events = [publish(self.user.pk, 'reminder', {'n': n}) for n in range(3)]
+            await asyncio.sleep(0)
+            resync, *kept = await self.read(stream, 3)
+            self.assertEqual(resync, 'event: resync\ndata: {}\n\n')
+            self.assertEqual([line.split('\n')[0] for line in kept], [f'id: {event.id}' for event in events[1:]])
+        finally:
+            await stream.aclose()
+
+    def test_view_needs_asgi(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/events/').status_code, 501)
+
+    async def test_view_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        event = publish(self.user.pk, 'reminder', {'n': 1})
+        publish(self.user.pk, 'reminder', {'n': 2})
+        response = await self.async_client.get('/events/', headers={'Last-Event-ID': str(event.id)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertIn(b'data: {"n":2}', (await self.read(stream, 2))[1])
+        finally:
+            await stream.aclose()
+
+
+class EventBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.connecting, self.release = threading.Event(), threading.Event()
+        self.delivered = threading.Event()
+        bus = mock.patch('learning_logs.events.bus')
+        self.bus = bus.start()
+        self.bus.deliver.side_effect = lambda *args: self.delivered.set()
+        self.addCleanup(bus.stop)
+        self.addCleanup(self.release.set)
+
+    def unreachable(self, *args, **kwargs):
+        self.connecting.set()
+        self.release.wait(5)
+        raise ConnectionRefusedError
+
+    def test_send_hands_the_event_to_the_publisher_thread(self):
+        client = BrokerClient('127.0.0.1:1', 's3cret', queue_size=1)
+        with mock.patch('learning_logs.events.socket.create_connection', side_effect=self.unreachable):
+            self.assertTrue(client.send(1, Event(1, 'reminder', {})))
+            # The request thread is back while the publisher is still connecting
+            self.assertTrue(self.connecting.wait(5))
+            self.assertFalse(self.delivered.is_set())
+            self.assertTrue(client.send(1, Event(2, 'reminder', {})))
+            # Queue full: publish() delivers this one locally itself
+            self.assertFalse(client.send(1, Event(3, 'reminder', {})))
+            with self.assertLogs('learning_logs.events', 'WARNING'):
+                self.release.set()
+                self.assertTrue(self.delivered.wait(5))
+        self.assertEqual(self.bus.deliver.call_args_list[0].args, (1, Event(1, 'reminder', {})))
+
+    @override_settings(LIVE_EVENTS={'BROKER': '127.0.0.1:8765'})
+    def test_broker_needs_a_secret(self):
+        with self.assertRaises(ImproperlyConfigured):
+            broker()
+        with self.assertRaisesMessage(CommandError, 'BROKER_SECRET'):
+            call_command('run_event_broker')
+
+    def relay(self, handshake):
+        command = RunEventBroker()
+        command.secret, command.subscribers = b's3cret', set()
+        subscriber = asyncio.Queue()
+
+        async def connect():
+            command.subscribers.add(subscriber)
+            reader = asyncio.StreamReader()
+            reader.feed_data(handshake + b'\n{"user_id": 1}\n')
+            reader.feed_eof()
+            await command.connected(reader, mock.Mock())
+        asyncio.run(connect())
+        return subscriber.qsize()
+
+    def test_broker_only_relays_for_clients_with_the_secret(self):
+        self.assertEqual(self.relay(b'PUB s3cret'), 1)
+        self.assertEqual(self.relay(b'PUB guess'), 0)
+        self.assertEqual(self.relay(b'PUB'), 0)
+
+
+class ConditionalResponseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mtazamaji')
+        cls.other = User.objects.create_user('jirani')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params or None, headers={'If-None-Match': response['ETag']})
+
+    def test_unchanged_pages_answer_304_without_queries(self):
+        for url in ('/dashboard/', '/expenses/', '/api/calendar/?year=2026&month=5', '/export/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertIn('private', response['Cache-Control'])
+                # Only the session and user lookups remain
+                with self.assertNumQueries(2):
+                    self.assertEqual(self.revalidate(url, response).status_code, 304)
+                since = self.client.get(url, headers={'If-Modified-Since': response['Last-Modified']})
+                self.assertEqual(since.status_code, 304)
+
+    def test_committed_changes_move_the_watermark(self):
+        response = self.client.get('/dashboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.user, title='Chai', amount=500, category='Chakula')
+        self.assertEqual(self.revalidate('/dashboard/', response).status_code, 200)
+        # Someone else's changes don't
+        response = self.client.get('/dashboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(owner=self.other, title='Chai', amount=500, category='Chakula')
+        self.assertEqual(self.revalidate('/dashboard/', response).status_code, 304)
+
+    def test_etag_depends_on_user_query_string_and_version(self):
+        response = self.client.get('/export/', {'format': 'csv', 'include': 'entries'})
+        self.assertEqual(self.client.get('/export/', {'include': 'entries', 'format': 'csv'})['ETag'], response['ETag'])
+        self.assertEqual(self.revalidate('/export/', response, format='json').status_code, 200)
+        with override_settings(CONDITIONAL_RESPONSES={'VERSION': '2'}):
+            self.assertEqual(self.revalidate('/export/', response, format='csv', include='entries').status_code, 200)
+        self.client.force_login(self.other)
+        self.assertEqual(self.revalidate('/export/', response, format='csv', include='entries').status_code, 200)
+
+    def test_watermarks_only_move_forward(self):
+        start = watermark(self.user.pk)
+        bump_watermark(self.user.pk)
+        bump_watermark(self.user.pk)
+        self.assertGreaterEqual(watermark(self.user.pk), start + 2)
+
+    @override_settings(CONDITIONAL_RESPONSES={'ENABLED': False})
+    def test_can_be_switched_off(self):
+        response = self.client.get('/dashboard/')
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get('/dashboard/', headers={'If-None-Match': '*'}).status_code, 200)
@@ -10,17 +10,31 @@ app_name = 'learning_logs'
 urlpatterns = [
   # Home page
   path('', views.index, name='index'),
+  path('notifications/read/', views.mark_notifications_read, name='mark_notifications_read'),
   # Diary URLs (CBVs)
   path('entries/', views.EntryListView.as_view(), name='entry_list'),
   path('entry/<int:pk>/', views.EntryDetailView.as_view(), name='entry_detail'),
   path('entry/new/', views.EntryCreateView.as_view(), name='entry_create'),
   path('entry/<int:pk>/edit/', views.EntryUpdateView.as_view(), name='entry_update'),
   path('entry/<int:pk>/delete/', views.EntryDeleteView.as_view(), name='entry_delete'),
+  path('entry/<int:pk>/media/', views.upload_media, name='upload_media'),
+  path('attachments/<int:media_id>/', views.download_media, name='download_media'),
+  path('attachments/<int:media_id>/delete/', views.delete_media, name='delete_media'),
   path('calendar/', views.CalendarView.as_view(), name='calendar'),
   path('api/calendar/', views.calendar_data, name='calendar_data'),
+  path('api/entries/', views.entries_api, name='entries_api'),
   path('api/autosave/', views.autosave_entry, name='autosave_entry'),
+  path('api/drafts/publish/', views.publish_draft_view, name='publish_draft'),
   path('api/update_entry_date/', views.update_entry_date, name='update_entry_date'),
+  path('api/move_entries/', views.move_entries_view, name='move_entries'),
+  # Async JSON API, schemas at api/v2/schema/
+  path('api/v2/schema/', views.api_schema, name='api_schema'),
+  path('api/v2/calendar/', views.calendar_month_api, name='calendar_month_api'),
+  path('api/v2/entry_date/', views.entry_date_api, name='entry_date_api'),
+  path('api/v2/autosave/', views.autosave_api, name='autosave_api'),
+  path('events/', views.live_events, name='live_events'),
   path('export/', views.export_data, name='export_data'),
+  path('api/performance/', views.performance_stats, name='performance_stats'),
   # About page
   path('about/', views.about, name='about'),
   # Contact page
@@ -1,49 +1,297 @@
 from calendar import HTMLCalendar
+from collections import defaultdict
+import base64
+import datetime
 from .models import Entry
-from django.utils.html import format_html
+from . import sharding
+from .events import entries_changed, publish
+from .watermarks import abump_watermark, bump_watermark_on_commit
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.utils import timezone
+from django.utils.html import escape
+
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def calendar_cache_key(user_id, year, month):
+    """Cache key for a user's rendered month grid."""
+    return f"calendar:{user_id}:{int(year)}:{int(month)}"
+
+
+def invalidate_calendar_month(user_id, year, month):
+    """Drop the cached month grid so the next request re-renders it."""
+    cache.delete(calendar_cache_key(user_id, year, month))
+
+
+# Date windows as half-open [start, end) datetime ranges. Filtering with
+# field__gte=start, field__lt=end keeps the column bare so composite
+# (owner, <datetime>) indexes apply, unlike __year/__month/__date lookups.
+
+def month_bounds(year, month):
+    """Return aware [start, end) datetimes for a month in the current timezone."""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime(year, month, 1)
+    if month == 12:
+        end = datetime.datetime(year + 1, 1, 1)
+    else:
+        end = datetime.datetime(year, month + 1, 1)
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def day_bounds(day):
+    """Return aware [start, end) datetimes for a date in the current timezone."""
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(day, datetime.time.min)
+    end = start + datetime.timedelta(days=1)
+    return timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def current_month_bounds():
+    """[start, end) of the current month in the current timezone."""
+    today = timezone.localdate()
+    return month_bounds(today.year, today.month)
+
+
+def bulk_insert(model, objs, using=None, batch_size=500):
+    """
+    INSERT objects as they are, keeping the dates assigned to auto_now(_add) fields.
+
+    Like bulk_create(), except that fields' pre_save() hooks are skipped the
+    way loading a fixture skips them, instead of switching auto_now off on
+    the field objects every thread shares. Sets each object's new pk.
+    """
+    queryset = model._base_manager.using(using) if using else model._base_manager.all()
+    using = queryset.db
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if field is not meta.auto_field]
+    batch_size = max(min(batch_size, connections[using].ops.bulk_batch_size(fields, objs)), 1)
+    with transaction.atomic(using=using, savepoint=False):
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            rows = queryset._insert(batch, fields=fields, returning_fields=[meta.pk], raw=True, using=using)
+            for obj, (pk,) in zip(batch, rows):
+                obj.pk = pk
+                obj._state.adding, obj._state.db = False, using
+    return objs
+
+
+def encode_cursor(created, pk):
+    """Encode a (date_created, id) keyset position as an opaque URL-safe token."""
+    raw = f"{created.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor token, raising ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created, pk = raw.split('|')
+        return datetime.datetime.fromisoformat(created), int(pk)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def keyset_page(queryset, cursor=None, page_size=20):
+    """
+    Return one newest-first page of entries and the cursor for the next page.
+
+    Pages seek past the last seen (date_created, id) instead of using OFFSET,
+    so deep pages cost the same as the first one and no COUNT(*) is needed.
+    """
+    queryset = queryset.order_by('-date_created', '-id')
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date_created__lt=created) | Q(date_created=created, id__lt=pk))
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(last.date_created, last.pk)
+    return items, next_cursor
+
 
 class XCalendar(HTMLCalendar):
     def __init__(self, year=None, month=None, user=None):
         self.year = year
         self.month = month
         self.user = user
+        self.entries_by_day = {}
         super(XCalendar, self).__init__()
         self.cssclass_month = "calendar"
 
+    def month_entries(self):
+        start, end = month_bounds(self.year, self.month)
+        return Entry.objects.filter(
+            owner=self.user,
+            event_date__gte=start,
+            event_date__lt=end,
+        ).only('id', 'title', 'mood', 'event_date').order_by('event_date', 'id')
+
+    def load_entries(self):
+        """Fetch the whole month in one range query and bucket entries by day."""
+        entries_by_day = defaultdict(list)
+        for entry in self.month_entries():
+            entries_by_day[timezone.localtime(entry.event_date).day].append(entry)
+        self.entries_by_day = entries_by_day
+
+    async def aload_entries(self):
+        """load_entries() through the async ORM."""
+        entries_by_day = defaultdict(list)
+        async for entry in self.month_entries():
+            entries_by_day[timezone.localtime(entry.event_date).day].append(entry)
+        self.entries_by_day = entries_by_day
+
     def formatday(self, day, weekday):
         """
         Return a day as a table cell.
         """
         if day == 0:
             return '<td class="calendar__day calendar__day--empty">&nbsp;</td>'
-        
-        entries = Entry.objects.filter(
-            owner=self.user, 
-            event_date__year=self.year, 
-            event_date__month=self.month, 
-            event_date__day=day
-        )
-        
+
+        entries = self.entries_by_day.get(day, [])
+
         css_class = "calendar__day"
         events_html = ""
-        
+
         # Format date string for data attribute (YYYY-MM-DD)
         date_str = f"{self.year}-{self.month:02d}-{day:02d}"
-        
-        if entries.exists():
+
+        if entries:
             css_class += " calendar__day--active"
             events_html = '<div class="calendar__events">'
             for entry in entries:
                 # Mood color mapping could be done here or via CSS classes
                 mood_class = f"event--{entry.mood.lower()}" if entry.mood else "event--default"
-                events_html += f'<div class="event-pill {mood_class}" title="{entry.title}" draggable="true" data-entry-id="{entry.id}">{entry.title}</div>'
+                title = escape(entry.title)
+                events_html += f'<div class="event-pill {mood_class}" title="{title}" draggable="true" data-entry-id="{entry.id}">{title}</div>'
             events_html += '</div>'
-            
+
         return f'<td class="{css_class}" data-date="{date_str}"><div class="day-wrapper"><span class="calendar__date">{day}</span>{events_html}</div></td>'
 
     def formatmonth(self, withyear=True):
         """
-        Return a formatted month as a table.
+        Return a formatted month as a table, served from cache when possible.
+        """
+        self.year, self.month = int(self.year), int(self.month)
+        key = calendar_cache_key(self.user.pk, self.year, self.month)
+        html = cache.get(key)
+        if html is None:
+            self.load_entries()
+            html = super(XCalendar, self).formatmonth(self.year, self.month)
+            cache.set(key, html, CALENDAR_CACHE_TIMEOUT)
+        return html
+
+    async def aformatmonth(self, withyear=True):
+        """formatmonth() for async views; only the cache and the query wait on I/O."""
+        self.year, self.month = int(self.year), int(self.month)
+        key = calendar_cache_key(self.user.pk, self.year, self.month)
+        html = await cache.aget(key)
+        if html is None:
+            await self.aload_entries()
+            html = super(XCalendar, self).formatmonth(self.year, self.month)
+            await cache.aset(key, html, CALENDAR_CACHE_TIMEOUT)
+        return html
+
+    def refresh(self, days):
+        """
+        Re-render and re-cache the month, returning the cells for `days`.
+
+        Used after entries were moved with queryset updates, which skip the
+        signals that normally invalidate the cached grid.
         """
         self.year, self.month = int(self.year), int(self.month)
-        return super(XCalendar, self).formatmonth(self.year, self.month)
\ No newline at end of file
+        self.load_entries()
+        html = super(XCalendar, self).formatmonth(self.year, self.month)
+        cache.set(calendar_cache_key(self.user.pk, self.year, self.month), html, CALENDAR_CACHE_TIMEOUT)
+        return self.cells(days)
+
+    async def arefresh(self, days):
+        """refresh() for async views."""
+        self.year, self.month = int(self.year), int(self.month)
+        await self.aload_entries()
+        html = super(XCalendar, self).formatmonth(self.year, self.month)
+        await cache.aset(calendar_cache_key(self.user.pk, self.year, self.month), html, CALENDAR_CACHE_TIMEOUT)
+        return self.cells(days)
+
+    def cells(self, days):
+        """The loaded month's cells for those of `days` that fall in it, keyed by ISO date."""
+        return {
+            day.isoformat(): self.formatday(day.day, day.weekday())
+            for day in days if (day.year, day.month) == (self.year, self.month)
+        }
+
+
+MAX_MOVES = 500
+
+
+def moved_event_date(event_date, day):
+    """`event_date` moved to the local date `day`, keeping its local time of day."""
+    old = timezone.localtime(event_date)
+    return timezone.make_aware(datetime.datetime.combine(day, old.time().replace(tzinfo=None)),
+                               timezone.get_current_timezone())
+
+
+def move_entries(user, moves):
+    """
+    Move entries to new local dates, keeping each entry's time of day.
+
+    `moves` maps entry id to a date. Ownership is checked with one query and
+    all event dates are written by one CASE UPDATE per 500 entries inside a
+    single transaction; Entry.save() and its signals are skipped. Returns the
+    re-rendered calendar cells of every day an entry left or landed on, keyed
+    by ISO date. Raises Entry.DoesNotExist if any id is not the user's.
+    """
+    current = dict(Entry.objects.filter(owner=user, pk__in=moves).values_list('pk', 'event_date'))
+    missing = set(moves) - set(current)
+    if missing:
+        raise Entry.DoesNotExist(f"Entries not found: {', '.join(map(str, sorted(missing)))}")
+
+    targets, touched = {}, set()
+    for pk, day in moves.items():
+        targets[pk] = moved_event_date(current[pk], day)
+        touched.update((timezone.localdate(current[pk]), day))
+
+    ids = sorted(targets)
+    now = timezone.now()
+    using = sharding.shard_for_user(user.pk)
+    with sharding.atomic(using):
+        for start in range(0, len(ids), MAX_MOVES):
+            chunk = ids[start:start + MAX_MOVES]
+            Entry.objects.filter(owner=user, pk__in=chunk).update(
+                event_date=Case(*[When(pk=pk, then=Value(targets[pk])) for pk in chunk],
+                                output_field=DateTimeField()),
+                last_modified=now,
+            )
+        entries_changed(user.pk, ids, touched, using=using)
+        bump_watermark_on_commit(user.pk, using=using)
+
+    cells = {}
+    for year, month in sorted({(day.year, day.month) for day in touched}):
+        cells.update(XCalendar(year, month, user=user).refresh(touched))
+    return cells
+
+
+async def amove_entry(user, entry_id, day):
+    """
+    Move one entry to a new local date from an async view.
+
+    A single UPDATE needs no transaction, so this runs on the async ORM
+    alone. Returns the re-rendered cells of the old and new day, like
+    move_entries(); raises Entry.DoesNotExist if the entry is not the user's.
+    """
+    entries = Entry.objects.filter(owner=user, pk=entry_id)
+    event_date = await entries.values_list('event_date', flat=True).afirst()
+    if event_date is None:
+        raise Entry.DoesNotExist(f"Entries not found: {entry_id}")
+    await entries.aupdate(event_date=moved_event_date(event_date, day), last_modified=timezone.now())
+    await abump_watermark(user.pk)
+
+    touched = {timezone.localdate(event_date), day}
+    publish(user.pk, 'entry', {'entry_ids': [entry_id], 'days': sorted(date.isoformat() for date in touched)})
+    cells = {}
+    for year, month in sorted({(date.year, date.month) for date in touched}):
+        cells.update(await XCalendar(year, month, user=user).arefresh(touched))
+    return cells
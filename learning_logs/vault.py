@@ -0,0 +1,276 @@
+"""Content-addressed MediaVault attachments.
+
+Uploads are hashed while Django streams the request body to disk
+(HashingUploadHandler), so the file is never read a second time. Identical
+bytes are stored once as a MediaBlob named after their SHA-256 digest, and
+each attachment holds a counted reference to it; the blob and its file are
+removed when the last attachment goes. Storing a blob and deleting an
+unused file both happen under the database's write lock, so an upload of
+the same bytes racing the deletion either keeps the file or writes it again.
+A file written for an upload whose transaction rolls back is deleted by
+attach(), or later by the clean_media_vault command.
+
+serve_attachment() streams a file with FileResponse, answers conditional GETs
+from the digest-based ETag and serves single byte ranges with 206 responses,
+so audio and PDFs can be seeked without loading the file into memory.
+Under ASGI the file is read through db.async_stream(), since Django would
+otherwise read a sync file body into memory before sending it.
+"""
+import hashlib
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .db import async_stream
+from .models import MediaBlob, MediaVault
+from . import sharding
+from .storage import blob_name, vault_storage
+
+CHUNK_SIZE = 64 * 1024
+CACHE_MAX_AGE = 60 * 60 * 24
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def attachment_type(content_type, name):
+    """The MediaVault file_type for an upload, or None if it is not accepted."""
+    if not content_type or content_type == 'application/octet-stream':
+        content_type = mimetypes.guess_type(name or '')[0] or ''
+    if content_type.startswith('image/'):
+        return 'image'
+    if content_type.startswith('audio/'):
+        return 'audio'
+    if content_type == 'application/pdf':
+        return 'pdf'
+    return None
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Hash uploaded files chunk by chunk as they arrive and enforce a size cap.
+
+    Install it first in request.upload_handlers; it passes every chunk on
+    unchanged to the handlers that actually store the upload.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.MEDIA_VAULT_MAX_UPLOAD_SIZE
+        self.digests = {}
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.too_large = True
+            raise SkipFile
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = (self.hasher.hexdigest(), self.size)
+        return None
+
+
+def file_digest(fileobj):
+    """SHA-256 and size of a Django File, read in chunks."""
+    hasher, size = hashlib.sha256(), 0
+    for chunk in fileobj.chunks(CHUNK_SIZE):
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def store_blob(content, digest, size, content_type):
+    """Return the blob for these bytes with one more reference, storing the file if new."""
+    blobs = MediaBlob.objects.filter(sha256=digest)
+    # The UPDATE takes the write lock for the whole transaction; see _delete_unused_file()
+    with transaction.atomic():
+        if blobs.update(ref_count=F('ref_count') + 1):
+            return blobs.get()
+        blob = MediaBlob(sha256=digest, size=size, content_type=content_type, ref_count=1)
+        # The storage keeps an existing file of the same name, which by construction has these bytes
+        blob.file.save(blob_name(digest), content, save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # A concurrent upload of the same bytes created the row first
+            blobs.update(ref_count=F('ref_count') + 1)
+            blob = blobs.get()
+        return blob
+
+
+def attach(entry, content, digest, size, content_type, file_type, name=''):
+    """Create a MediaVault row for an upload, deduplicating its bytes."""
+    from .derivatives import schedule_derivatives
+    # The blob is counted in 'default', the attachment row goes next to its entry
+    try:
+        with sharding.atomic(entry._state.db or sharding.shard_for_user(entry.owner_id)):
+            blob = store_blob(content, digest, size, content_type)
+            if blob.ref_count == 1:
+                # First copy of these bytes: render previews once it is committed
+                transaction.on_commit(lambda: schedule_derivatives(blob.pk))
+            return MediaVault.objects.create(entry=entry, blob=blob, file_type=file_type, original_name=name[:255])
+    except Exception:
+        # The file was written before the rolled-back blob row; drop it unless another
+        # upload's committed row now refers to it. Rollbacks further out are left to
+        # the clean_media_vault command.
+        discard_unreferenced_file(digest)
+        raise
+
+
+def _delete_unused_file(digest, name, derivatives):
+    from .derivatives import delete_derivatives
+    with transaction.atomic():
+        # A write, even one matching no row, waits for and then holds the write lock, so a
+        # store_blob() of the same bytes has either committed its row by now or runs after
+        # the file is gone and writes it again
+        if MediaBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count')):
+            return
+        storage = vault_storage()
+        storage.delete(name)
+        delete_derivatives(storage, derivatives)
+
+
+def discard_unreferenced_file(digest):
+    """Delete the vault file for digest if no MediaBlob row refers to it."""
+    _delete_unused_file(digest, blob_name(digest), {})
+
+
+def release_blob(blob_id):
+    """Drop one reference; delete the blob (and, after commit, its file) at zero."""
+    with transaction.atomic():
+        MediaBlob.objects.filter(pk=blob_id).update(ref_count=Greatest(F('ref_count') - 1, 0))
+        unused = MediaBlob.objects.filter(pk=blob_id, ref_count=0).values_list('sha256', 'file', 'derivatives').first()
+        if unused is None:
+            return
+        MediaBlob.objects.filter(pk=blob_id, ref_count=0).delete()
+        transaction.on_commit(lambda: _delete_unused_file(*unused))
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent (no header, a
+    multi-range or unparseable header); raises RangeNotSatisfiable when the
+    range lies outside the file.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class RangeReader:
+    """Read-only view of `length` bytes of a file starting at `start`."""
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def serve_attachment(request, attachment, width=None):
+    """
+    Stream an attachment with conditional GET and byte-range support.
+
+    With `width`, the smallest preview at least that wide is sent instead of
+    the original when one exists.
+    """
+    blob = attachment.blob
+    filename = attachment.original_name or attachment.file.name.rsplit('/', 1)[-1]
+    derivative = blob.derivative_for(width) if blob is not None and width else None
+    if derivative is not None:
+        storage = blob.file.storage
+        opener = lambda: storage.open(derivative['name'], 'rb')
+        size, content_type = derivative['size'], derivative['content_type']
+        etag, modified = quote_etag(f"{blob.sha256}-w{derivative['width']}"), blob.created_at
+        filename = derivative['name'].rsplit('/', 1)[-1]
+    elif blob is not None:
+        opener, size, content_type = lambda: blob.file.open('rb'), blob.size, blob.content_type
+        etag, modified = quote_etag(blob.sha256), blob.created_at
+    else:
+        opener, etag, modified = lambda: attachment.file.open('rb'), None, attachment.uploaded_at
+        size = attachment.file.size
+        content_type = mimetypes.guess_type(attachment.file.name)[0] or 'application/octet-stream'
+    last_modified = int(modified.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    fileobj = opener()
+    if byte_range is None:
+        reader = RangeReader(fileobj, 0, size)
+        response = FileResponse(reader, content_type=content_type, filename=filename)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        reader = RangeReader(fileobj, start, end - start + 1)
+        response = FileResponse(reader, status=206, content_type=content_type, filename=filename)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = CHUNK_SIZE
+    if isinstance(request, ASGIRequest):
+        # The reader stays registered to be closed with the response
+        response.streaming_content = async_stream(iter(lambda: reader.read(CHUNK_SIZE), b''))
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = f'private, max-age={CACHE_MAX_AGE}'
+    return response
@@ -1,20 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse, reverse_lazy
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from django.core.serializers import serialize
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import Topic, Entry, Expense, Income, FinancialGoal, RecurringExpense, AccessLog, Profile
+from .models import Topic, Entry, Expense, Income, FinancialGoal, RecurringExpense, Profile, UserStats, Notification, MediaVault
 from . forms import TopicForm, EntryForm, ExpenseForm, IncomeForm, FinancialGoalForm, RecurringExpenseForm, ProfileForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_http_methods
 from django.http import Http404
 from django.utils import timezone
-from django.db.models import Q
-from .utils import XCalendar
+from django.db.models import Case, When
+from .utils import MAX_MOVES, XCalendar, amove_entry, keyset_page, current_month_bounds, move_entries
+from .search import search_entries
+from .audit import log_access
+from .rollups import TREND_RANGES, mood_trend
+from .ledger import spending_summary
+from .finance import financial_summary
+from .drafts import FIELDS as DRAFT_FIELDS, StaleRevision, asave_draft, discard_draft, draft_key, load_draft, publish_draft, save_draft
+from .middleware import monitoring_settings, request_stats
+from .vault import HashingUploadHandler, attach, attachment_type, serve_attachment
+from .db import analytics_reads, async_stream
+from .watermarks import conditional_on_watermark
+from .export import EXPORTS, FORMATS as EXPORT_FORMATS, parse_since, stream_export
+from .api import SCHEMAS, parse_body
+from .events import event_stream
+from django.core.handlers.asgi import ASGIRequest
 import datetime
 import json
+import mimetypes
 from decimal import Decimal
 from datetime import timedelta
 
@@ -22,36 +39,31 @@ from django.db.models import Count, Sum, Max
 # ... existing imports ...
 
 @login_required
+@conditional_on_watermark
+@analytics_reads
 def dashboard(request):
     """Show statistics and recent activity."""
-    # Statistics
-    topic_count = Topic.objects.filter(owner=request.user).count()
-    entry_count = Entry.objects.filter(owner=request.user).count()
+    # Statistics (denormalized counters, see UserStats)
+    stats = UserStats.for_user(request.user)
+    topic_count = stats.topic_count
+    entry_count = stats.entry_count
     
     # Recent entries (last 5)
     recent_entries = Entry.objects.filter(owner=request.user).order_by('-date_created')[:5]
     
-    # Analytics: Sentiment Trends (Last 30 Days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    entries_last_30 = Entry.objects.filter(
-        owner=request.user,
-        date_created__gte=thirty_days_ago
-    ).exclude(mood='').order_by('date_created')
-    
-    mood_map = {'Happy': 10, 'Excited': 8, 'Neutral': 5, 'Anxious': 3, 'Sad': 1}
-    sentiment_trend = []
-    
-    for entry in entries_last_30:
-        sentiment_trend.append({
-            'date': entry.date_created.strftime('%Y-%m-%d'),
-            'score': mood_map.get(entry.mood, 5)
-        })
+    # Analytics: Sentiment Trends, served from the daily mood rollups
+    trend_range = request.GET.get('range', '30')
+    if trend_range not in TREND_RANGES:
+        trend_range = '30'
+    sentiment_trend = mood_trend(request.user, TREND_RANGES[trend_range])
 
     context = {
         'topic_count': topic_count,
         'entry_count': entry_count,
         'recent_entries': recent_entries,
         'sentiment_trend': sentiment_trend,
+        'mood_entry_count': sum(point['count'] for point in sentiment_trend),
+        'trend_range': trend_range,
     }
     return render(request, 'learning_logs/dashboard.html', context)
 
@@ -62,46 +74,14 @@ def index(request):
     """The home page for Personal Management."""
     context = {}
     if request.user.is_authenticated:
-        now = timezone.now()
-        
-        # --- 1. Financial Summary ---
-        goals, _ = FinancialGoal.objects.get_or_create(owner=request.user)
-        
-        # Income
-        monthly_income = Income.objects.filter(
-            owner=request.user, 
-            date_added__year=now.year, 
-            date_added__month=now.month
-        ).aggregate(Sum('amount'))['amount__sum'] or 0
-        total_income = goals.monthly_salary + monthly_income
-        
-        # Expenses
-        expenses = Expense.objects.filter(
-            owner=request.user, 
-            date_added__year=now.year, 
-            date_added__month=now.month
-        )
-        total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+        # --- 1. Financial Summary (cached per user and month) ---
+        summary = financial_summary(request.user)
+        total_income = summary['goals']['monthly_salary'] + summary['income_sum']
+        total_expenses = summary['expense_total']
         balance = total_income - total_expenses
         
-        # --- 2. Notifications (Daily Expenses) ---
-        has_expenses_today = expenses.filter(date_added__date=now.date()).exists()
-        notifications = []
-        if not has_expenses_today:
-            notifications.append("Leo bado hujaweka matumizi yako. Kumbuka kurekodi!")
-        
-        # Bill Reminders
-        upcoming_bills = RecurringExpense.objects.filter(
-            owner=request.user,
-            reminder_active=True,
-            next_due_date__range=[now.date(), now.date() + timedelta(days=3)]
-        )
-        for bill in upcoming_bills:
-            days_left = (bill.next_due_date - now.date()).days
-            if days_left == 0:
-                notifications.append(f"Kikumbusho: {bill.title} inatakiwa kulipwa leo (TZS {bill.amount})")
-            else:
-                notifications.append(f"Kikumbusho: {bill.title} inatakiwa kulipwa baada ya siku {days_left}")
+        # --- 2. Notifications (precomputed by generate_notifications) ---
+        notifications = list(Notification.inbox(request.user))
             
         # --- 3. Recent Diary Entries ---
         recent_entries = Entry.objects.filter(owner=request.user).order_by('-date_created')[:3]
@@ -110,13 +90,25 @@ def index(request):
         
     return render(request, 'learning_logs/index.html', context)
 
+@login_required
+def mark_notifications_read(request):
+    """Dismiss one notification, or all of them, with a single UPDATE."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    ids = request.POST.getlist('id') or None
+    if ids and not all(pk.isdigit() for pk in ids):
+        return JsonResponse({'error': 'Invalid notification id'}, status=400)
+    Notification.mark_read(request.user, ids)
+    return redirect('learning_logs:index')
+
 # --- Diary Class-Based Views ---
 
 class EntryListView(LoginRequiredMixin, ListView):
     model = Entry
     template_name = 'learning_logs/entry_list.html'
     context_object_name = 'entries'
-    ordering = ['-date_created']
+    ordering = ['-date_created', '-id']
+    page_size = 24
 
     def get_queryset(self):
         # Enterprise Optimization: Prefetch related tags and health matrix to reduce DB queries
@@ -124,21 +116,36 @@ class EntryListView(LoginRequiredMixin, ListView):
             .prefetch_related('tags', 'health_matrix')\
             .order_by('-date_created')
         
-        # Search Engine Logic
+        # Search Engine Logic: ranked full-text index lookup
+        self.search_snippets = {}
+        self.next_cursor = None
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(tags__name__icontains=query) |
-                Q(mood__icontains=query)
-            ).distinct()
-            
-        return queryset
+            hits = search_entries(self.request.user, query)
+            self.search_snippets = {hit.entry_id: hit.snippet for hit in hits}
+            rank = Case(*[When(pk=hit.entry_id, then=position) for position, hit in enumerate(hits)])
+            queryset = queryset.filter(pk__in=self.search_snippets).order_by(rank) if hits else queryset.none()
+            return queryset
+
+        # Keyset pagination: only the requested page is ever loaded
+        try:
+            entries, self.next_cursor = keyset_page(queryset, self.request.GET.get('cursor'), self.page_size)
+        except ValueError:
+            entries, self.next_cursor = keyset_page(queryset, None, self.page_size)
+        return entries
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        context['next_cursor'] = self.next_cursor
+        context['is_first_page'] = not self.request.GET.get('cursor')
+        for entry in context['entries']:
+            entry.search_snippet = self.search_snippets.get(entry.pk)
+        return context
 
     def get(self, request, *args, **kwargs):
         # Security Log
-        AccessLog.objects.create(user=self.request.user, action="Viewed Entry List", ip_address=self.request.META.get('REMOTE_ADDR'))
+        log_access(self.request, "Viewed Entry List")
         return super().get(request, *args, **kwargs)
 
 class EntryDetailView(LoginRequiredMixin, DetailView):
@@ -147,9 +154,85 @@ class EntryDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'entry'
 
     def get_queryset(self):
-        return Entry.objects.filter(owner=self.request.user)
+        return Entry.objects.filter(owner=self.request.user).prefetch_related('media__blob')
+
+@login_required
+@csrf_exempt
+def upload_media(request, pk):
+    """Attach an uploaded file to an entry, hashing it while the body streams in."""
+    # Upload handlers must be in place before anything reads request.POST,
+    # so CSRF is checked in the inner view instead of by the middleware
+    request.upload_handlers.insert(0, HashingUploadHandler(request))
+    return _upload_media(request, pk)
+
+@csrf_protect
+def _upload_media(request, pk):
+    if request.method != 'POST':
+        return HttpResponse('POST required', status=405)
+    entry = get_object_or_404(Entry, pk=pk, owner=request.user)
+    hashing = request.upload_handlers[0]
+    upload = request.FILES.get('file')
+    if hashing.too_large:
+        return HttpResponse('File too large', status=413)
+    if upload is None or 'file' not in hashing.digests:
+        return HttpResponse('No file uploaded', status=400)
+    file_type = attachment_type(upload.content_type, upload.name)
+    if file_type is None:
+        return HttpResponse('Only images, audio and PDF files can be attached', status=400)
+
+    digest, size = hashing.digests['file']
+    content_type = upload.content_type or mimetypes.guess_type(upload.name)[0] or 'application/octet-stream'
+    attach(entry, upload, digest, size, content_type, file_type, upload.name)
+    return redirect('learning_logs:entry_detail', pk=entry.pk)
 
-class EntryCreateView(LoginRequiredMixin, CreateView):
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+def download_media(request, media_id):
+    """Serve an attachment (or, with ?w=<px>, its nearest preview) to its owner."""
+    attachment = get_object_or_404(MediaVault.objects.select_related('blob'), pk=media_id,
+                                   entry__owner=request.user)
+    try:
+        width = int(request.GET.get('w', 0))
+    except ValueError:
+        return HttpResponse('Invalid width', status=400)
+    return serve_attachment(request, attachment, width)
+
+@login_required
+def delete_media(request, media_id):
+    """Remove an attachment; its bytes are deleted once no other attachment shares them."""
+    attachment = get_object_or_404(MediaVault, pk=media_id, entry__owner=request.user)
+    if request.method != 'POST':
+        return HttpResponse('POST required', status=405)
+    entry_id = attachment.entry_id
+    attachment.delete()
+    return redirect('learning_logs:entry_detail', pk=entry_id)
+
+class DraftMixin:
+    """Resume an autosaved draft in the entry form and drop it once the entry is saved."""
+
+    def get_draft_key(self):
+        return draft_key(getattr(self, 'object', None))
+
+    def get_initial(self):
+        initial = super().get_initial()
+        self.draft = load_draft(self.request.user, self.get_draft_key())
+        if self.draft['revision']:
+            initial.update({field: self.draft[field] for field in DRAFT_FIELDS})
+        return initial
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['draft_key'] = self.get_draft_key()
+        context['draft_revision'] = self.draft['revision'] if hasattr(self, 'draft') else 0
+        return context
+
+    def form_valid(self, form):
+        key = self.get_draft_key()
+        response = super().form_valid(form)
+        discard_draft(self.request.user, key)
+        return response
+
+class EntryCreateView(LoginRequiredMixin, DraftMixin, CreateView):
     model = Entry
     fields = ['title', 'content', 'mood']
     template_name = 'learning_logs/entry_form.html'
@@ -159,7 +242,7 @@ class EntryCreateView(LoginRequiredMixin, CreateView):
         form.instance.owner = self.request.user
         return super().form_valid(form)
 
-class EntryUpdateView(LoginRequiredMixin, UpdateView):
+class EntryUpdateView(LoginRequiredMixin, DraftMixin, UpdateView):
     model = Entry
     fields = ['title', 'content', 'mood']
     template_name = 'learning_logs/entry_form.html'
@@ -194,6 +277,7 @@ class CalendarView(LoginRequiredMixin, TemplateView):
         return context
 
 @login_required
+@conditional_on_watermark
 def calendar_data(request):
     """API to fetch calendar HTML for AJAX navigation."""
     year = request.GET.get('year')
@@ -205,21 +289,112 @@ def calendar_data(request):
     return HttpResponse('Invalid parameters', status=400)
 
 @login_required
+def entries_api(request):
+    """JSON feed of the user's entries, paginated with a keyset cursor."""
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid limit'}, status=400)
+
+    queryset = Entry.objects.filter(owner=request.user)\
+        .only('id', 'title', 'mood', 'date_created', 'event_date')\
+        .prefetch_related('tags')
+    try:
+        entries, next_cursor = keyset_page(queryset, request.GET.get('cursor'), limit)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    results = [{
+        'id': entry.id,
+        'title': entry.title,
+        'mood': entry.mood,
+        'date_created': entry.date_created.isoformat(),
+        'event_date': entry.event_date.isoformat(),
+        'tags': [tag.name for tag in entry.tags.all()],
+        'url': entry.get_absolute_url(),
+    } for entry in entries]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+@login_required
+@conditional_on_watermark
+@analytics_reads
 def export_data(request):
-    """Export diary entries to JSON for data portability."""
-    entries = Entry.objects.filter(owner=request.user).prefetch_related('tags')
-    data = serialize('json', entries, use_natural_foreign_keys=True)
-    response = HttpResponse(data, content_type='application/json')
-    response['Content-Disposition'] = 'attachment; filename="diary_export.json"'
+    """Stream the user's data as JSON, NDJSON or CSV for data portability."""
+    fmt = request.GET.get('format', 'json')
+    include = [name for name in request.GET.get('include', 'entries').split(',') if name]
+    if fmt not in EXPORT_FORMATS or not include or any(name not in EXPORTS for name in include):
+        return HttpResponse('Invalid parameters', status=400)
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_since(request.GET['since'])
+        except ValueError:
+            return HttpResponse('Invalid parameters', status=400)
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    content_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"diary_export.{extension}"
+    if compress:
+        content_type, filename = 'application/gzip', filename + '.gz'
+    body = stream_export(request.user, fmt, include, since, compress)
+    if isinstance(request, ASGIRequest):
+        body = async_stream(body)
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
 @login_required
 def autosave_entry(request):
-    """API endpoint for auto-saving drafts via fetch."""
-    if request.method == 'POST':
-        # Logic to handle draft saving would go here
-        return JsonResponse({'status': 'success', 'message': 'Draft saved securely'})
-    return JsonResponse({'status': 'error'}, status=400)
+    """API endpoint for auto-saving drafts via fetch.
+
+    Expects draft_key, a revision higher than the last one saved, and only the
+    fields (title, content, mood) that changed. Writes are coalesced; pass
+    flush=1 to persist immediately.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=400)
+    try:
+        revision = int(request.POST.get('revision', ''))
+        changes = {field: request.POST[field] for field in DRAFT_FIELDS if field in request.POST}
+        state, persisted = save_draft(request.user, request.POST.get('draft_key', draft_key()), revision,
+                                      changes, flush=request.POST.get('flush') in ('1', 'true'))
+    except StaleRevision as e:
+        return JsonResponse({'status': 'stale', 'revision': e.state['revision']}, status=409)
+    except Entry.DoesNotExist:
+        raise Http404("Entry not found")
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'revision': state['revision'], 'persisted': persisted})
+
+@login_required
+def publish_draft_view(request):
+    """Promote the user's draft to an Entry."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=400)
+    try:
+        entry = publish_draft(request.user, request.POST.get('draft_key', draft_key()))
+    except Entry.DoesNotExist:
+        raise Http404("Entry not found")
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'entry_id': entry.pk,
+                         'url': reverse('learning_logs:entry_detail', args=[entry.pk])})
+
+def parse_moves(items):
+    """Turn [{entry_id, date}, ...] into {entry_id: date}, raising ValueError on bad input."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("Expected a non-empty list of moves")
+    if len(items) > MAX_MOVES:
+        raise ValueError(f"At most {MAX_MOVES} moves per request")
+    moves = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each move needs an entry_id and a date")
+        entry_id = int(item.get('entry_id'))
+        if entry_id in moves:
+            raise ValueError(f"Entry {entry_id} is moved twice")
+        moves[entry_id] = datetime.datetime.strptime(str(item.get('date')), '%Y-%m-%d').date()
+    return moves
 
 @login_required
 def update_entry_date(request):
@@ -227,21 +402,102 @@ def update_entry_date(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            entry_id = data.get('entry_id')
-            date_str = data.get('date')
-            
-            entry = Entry.objects.get(id=entry_id, owner=request.user)
-            new_date = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            # Update date while preserving time
-            entry.event_date = entry.event_date.replace(year=new_date.year, month=new_date.month, day=new_date.day)
-            entry.save()
-            
-            return JsonResponse({'status': 'success'})
-        except Exception as e:
+            moves = parse_moves([{'entry_id': data.get('entry_id'), 'date': data.get('date')}])
+            cells = move_entries(request.user, moves)
+            return JsonResponse({'status': 'success', 'cells': cells})
+        except Entry.DoesNotExist as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+        except (TypeError, ValueError) as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     return JsonResponse({'status': 'error'}, status=405)
 
+@login_required
+def move_entries_view(request):
+    """API to move many entries at once, e.g. a multi-selection or a week shift.
+
+    Expects {"moves": [{"entry_id": 1, "date": "YYYY-MM-DD"}, ...]} and returns
+    the re-rendered calendar cells of every affected day.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error'}, status=405)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        moves = parse_moves(data.get('moves'))
+        cells = move_entries(request.user, moves)
+    except Entry.DoesNotExist as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'moved': len(moves), 'cells': cells})
+
+# Async JSON API (see learning_logs.api): the same operations without holding a worker thread under ASGI
+
+def api_schema(request):
+    """JSON Schemas of the api/v2/ request and response bodies."""
+    return JsonResponse(SCHEMAS)
+
+@login_required
+async def calendar_month_api(request):
+    """A month grid as JSON, rendered from the cache or one async range query."""
+    try:
+        year, month = int(request.GET['year']), int(request.GET['month'])
+        datetime.date(year, month, 1)
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Expected a valid year and month'}, status=400)
+    html = await XCalendar(year, month, user=await request.auser()).aformatmonth()
+    return JsonResponse({'year': year, 'month': month, 'html': html})
+
+@login_required
+@require_http_methods(['POST'])
+async def entry_date_api(request):
+    """Move one entry to another day (drag-and-drop); returns the two affected cells."""
+    try:
+        data = parse_body(request, 'entry_date.request')
+        day = datetime.date.fromisoformat(data['date'])
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    try:
+        cells = await amove_entry(await request.auser(), data['entry_id'], day)
+    except Entry.DoesNotExist as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=404)
+    return JsonResponse({'status': 'success', 'cells': cells})
+
+@login_required
+@require_http_methods(['POST'])
+async def autosave_api(request):
+    """Save a draft revision; same coalescing and revision rules as autosave_entry."""
+    try:
+        data = parse_body(request, 'autosave.request')
+        state, persisted = await asave_draft(await request.auser(), data.get('draft_key', draft_key()),
+                                             data['revision'], data['changes'], flush=data.get('flush', False))
+    except StaleRevision as e:
+        return JsonResponse({'status': 'stale', 'revision': e.state['revision']}, status=409)
+    except Entry.DoesNotExist:
+        raise Http404("Entry not found")
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'revision': state['revision'], 'persisted': persisted})
+
+@login_required
+async def live_events(request):
+    """Server-Sent Events stream of the user's reminders and calendar changes (see learning_logs.events)."""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole life of the connection
+        return HttpResponse("Live events need the ASGI server.", status=501, content_type='text/plain')
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    user = await request.auser()
+    response = StreamingHttpResponse(event_stream(user.pk, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@staff_member_required
+def performance_stats(request):
+    """Aggregated per-URL request timings collected by PerformanceMiddleware."""
+    return JsonResponse({'enabled': monitoring_settings()['ENABLED'], 'views': request_stats.snapshot()})
+
 def get_date(req_day):
     if req_day:
         year, month = (int(x) for x in req_day.split('-'))
@@ -270,43 +526,47 @@ def contact(request):
     return render(request, 'learning_logs/contact.html')
 
 @login_required
+@conditional_on_watermark
+@analytics_reads
 def expenses(request):
     """Show financial dashboard with income, expenses, and goal analysis."""
     now = timezone.now()
     
-    # Get or create user's financial goals/settings
-    goals, created = FinancialGoal.objects.get_or_create(owner=request.user) #FinancialGoal is kept as this model and form is not meant to be changed
+    # User's financial goals/settings and month totals, from the cached summary
+    summary = financial_summary(request.user)
+    goals = summary['goals']
     
     # 1. Calculate Income
     # Actual income entries for this month
-    monthly_income_entries = Income.objects.filter(owner=request.user, date_added__year=now.year, date_added__month=now.month)
-    actual_income_sum = monthly_income_entries.aggregate(Sum('amount'))['amount__sum'] or 0
+    actual_income_sum = summary['income_sum']
     
     # Projected income (Salary + Daily Estimate * 30)
-    projected_income = goals.monthly_salary + (goals.daily_income_estimate * 30)
+    projected_income = goals['monthly_salary'] + (goals['daily_income_estimate'] * 30)
     
     # Total Income to use (Base salary + any extra added income)
     # If they have a salary, we assume it's part of the plan, plus any extra 'Income' entries
     # If they rely on daily income, 'actual_income_sum' tracks what they've actually logged.
-    total_income_so_far = goals.monthly_salary + actual_income_sum
+    total_income_so_far = goals['monthly_salary'] + actual_income_sum
 
-    # 2. Calculate Expenses
-    expenses = Expense.objects.filter(owner=request.user, date_added__year=now.year, date_added__month=now.month).order_by('-date_added')
-    total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
+    # 2. Calculate Expenses (chart, pie and totals all come from the daily spend ledger)
+    month_start, month_end = current_month_bounds()
+    expenses = Expense.objects.filter(owner=request.user, date_added__gte=month_start, date_added__lt=month_end).order_by('-date_added')
+    spending = spending_summary(request.user)
+    total_expenses = summary['expense_total']
     
     # 3. Analysis
     balance = total_income_so_far - total_expenses
     
     # Savings Progress Calculation
     savings_progress = 0
-    if goals.savings_goal > 0:
-        savings_progress = (balance / goals.savings_goal) * 100
+    if goals['savings_goal'] > 0:
+        savings_progress = (balance / goals['savings_goal']) * 100
         savings_progress = min(max(savings_progress, 0), 100) # Clamp between 0 and 100
     
     # Daily Analysis
-    today_expenses = expenses.filter(date_added__date=now.date()).aggregate(Sum('amount'))['amount__sum'] or 0
+    today_expenses = spending['today_total']
     daily_limit_status = "Good"
-    if goals.daily_spending_limit > 0 and today_expenses > goals.daily_spending_limit:
+    if goals['daily_spending_limit'] > 0 and today_expenses > goals['daily_spending_limit']:
         daily_limit_status = "Exceeded"
         
     # 4. Recurring Expenses
@@ -324,30 +584,20 @@ def expenses(request):
     if daily_limit_status == "Exceeded":
         suggestions.append({"type": "danger", "icon": "fa-hand-holding-usd", "text": "Umezidi bajeti yako ya siku. Punguza matumizi yasiyo ya lazima leo."})
     
-    recurring_total = recurring_expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-    if goals.monthly_salary > 0 and recurring_total > (goals.monthly_salary * Decimal('0.5')):
+    recurring_total = summary['recurring_total']
+    if goals['monthly_salary'] > 0 and recurring_total > (goals['monthly_salary'] * Decimal('0.5')):
          suggestions.append({"type": "warning", "icon": "fa-file-invoice-dollar", "text": "Matumizi ya kudumu (kodi, vifurushi) yanachukua zaidi ya 50% ya mshahara wako."})
 
     if not suggestions:
         suggestions.append({"type": "info", "icon": "fa-robot", "text": "Mfumo unaendelea kujifunza kutokana na matumizi yako. Endelea kurekodi!"})
 
     # 6. Chart Data (Last 7 Days)
-    last_7_days = [now.date() - timezone.timedelta(days=i) for i in range(6, -1, -1)]
-    chart_labels = [day.strftime('%a %d') for day in last_7_days]
-    chart_data = []
-    for day in last_7_days:
-        day_expenses = Expense.objects.filter(owner=request.user, date_added__date=day).aggregate(Sum('amount'))['amount__sum'] or 0
-        chart_data.append(float(day_expenses))
+    chart_labels = [day.strftime('%a %d') for day, _ in spending['chart']]
+    chart_data = [float(total) for _, total in spending['chart']]
 
     # 7. Pie Chart Data (Expenses by Category)
-    expenses_by_category = Expense.objects.filter(
-        owner=request.user, 
-        date_added__year=now.year, 
-        date_added__month=now.month
-    ).values('category').annotate(total=Sum('amount')).order_by('-total')
-    
-    pie_labels = [item['category'] for item in expenses_by_category]
-    pie_data = [float(item['total']) for item in expenses_by_category]
+    pie_labels = [category for category, _ in spending['by_category']]
+    pie_data = [float(total) for _, total in spending['by_category']]
 
     context = {
         'expenses': expenses,
@@ -0,0 +1,117 @@
+"""Per-user data watermarks and conditional GET responses.
+
+A user's watermark is a number of seconds kept in the cache. The signals in
+models.py bump it after every committed change to the user's topics,
+entries, money rows or profile; bulk paths that skip those signals
+(move_entries, recurring expenses, moving a user between shards) bump it
+themselves. Each bump moves it forward by at least a second, so it also
+serves as a Last-Modified time with HTTP's one-second resolution.
+
+Views wrapped in @conditional_on_watermark get an ETag and Last-Modified
+derived from it, and answer a matching If-None-Match or If-Modified-Since
+with 304 Not Modified after one cache read, before the view runs any query.
+Like finance versions, watermarks must live in a cache shared by every
+server process (see checks.py).
+"""
+import datetime
+from functools import wraps
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Change it when a deploy alters the pages, so browsers drop their copies
+    'VERSION': '1',
+}
+
+
+def conditional_settings():
+    return {**DEFAULTS, **getattr(settings, 'CONDITIONAL_RESPONSES', {})}
+
+
+def _watermark_key(user_id):
+    return f"watermark:{user_id}"
+
+
+def _next_watermark(current):
+    # Time-based, so a watermark lost to eviction never restarts at an old value
+    now = int(time.time())
+    return now if current is None else max(now, current + 1)
+
+
+def watermark(user_id):
+    """Return the user's current watermark, initialising it if needed."""
+    key = _watermark_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _next_watermark(None), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_watermark(user_id):
+    """Change the ETag and Last-Modified of every conditional page of the user."""
+    key = _watermark_key(user_id)
+    cache.set(key, _next_watermark(cache.get(key)), None)
+
+
+async def abump_watermark(user_id):
+    key = _watermark_key(user_id)
+    await cache.aset(key, _next_watermark(await cache.aget(key)), None)
+
+
+def bump_watermark_on_commit(user_id, using=None):
+    """bump_watermark() once the current transaction on `using` commits (right away outside one)."""
+    transaction.on_commit(lambda: bump_watermark(user_id), using=using)
+
+
+def _day_start():
+    return timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+
+
+def _request_watermark(request):
+    # Read once for both validators
+    if not hasattr(request, '_watermark'):
+        request._watermark = watermark(request.user.pk)
+    return request._watermark
+
+
+def watermark_etag(request, *args, **kwargs):
+    # Pages also depend on their query string and on today's date (month totals, trends)
+    if not request.user.is_authenticated:
+        return None
+    parts = [
+        conditional_settings()['VERSION'], str(request.user.pk), str(_request_watermark(request)),
+        request.path, '&'.join(sorted(request.GET.urlencode().split('&'))), timezone.localdate().isoformat(),
+    ]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def watermark_last_modified(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    changed = datetime.datetime.fromtimestamp(_request_watermark(request), datetime.timezone.utc)
+    # A new day changes the page even when the data did not
+    return max(changed, _day_start())
+
+
+def conditional_on_watermark(view):
+    """Answer repeat GETs of a per-user page with 304 while the user's watermark is unchanged."""
+    conditional_view = condition(etag_func=watermark_etag, last_modified_func=watermark_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not conditional_settings()['ENABLED']:
+            return view(request, *args, **kwargs)
+        response = conditional_view(request, *args, **kwargs)
+        # Keep browsers from reusing the page without asking first
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper